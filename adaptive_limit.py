@@ -0,0 +1,149 @@
+"""
+按主机的自适应并发控制（AIMD）
+响应正常时每次成功把并发上限加 1/上限（约每轮加1），遇到限流信号
+（429/5xx/403、超时、反爬验证页）时上限减半，并按指数退避加随机抖动暂停该主机的新请求。
+令牌桶限制每秒请求数，这里限制同时在途的请求数，两者同时生效
+"""
+
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+# 主机 -> (初始并发, 最大并发)
+DEFAULT_ADAPTIVE_LIMITS = {
+    'mp.weixin.qq.com': (2, 8),
+    'mmbiz.qpic.cn': (8, 32),
+}
+
+# 请求结果信号
+SIGNAL_OK = 'ok'                # 正常，可以提高并发
+SIGNAL_THROTTLED = 'throttled'  # 服务端过载或反爬，降低并发并退避后重试
+SIGNAL_FATAL = 'fatal'          # 页面不存在等，不重试也不影响并发
+
+# 反爬验证页的特征：页面文字和跳转地址
+VERIFICATION_MARKERS = ('环境异常', '完成验证后即可继续访问', 'wappoc_appmsgcaptcha', 'secitptpage/verify')
+
+# 已被主动拒绝访问的状态码；其余4xx视为请求本身的问题
+THROTTLE_STATUS = {403, 408, 429}
+
+
+def is_verification_page(html, final_url=''):
+    """是否为反爬验证页（正常文章不会出现这些标记，页面过大时只看开头）"""
+    if any(marker in final_url for marker in VERIFICATION_MARKERS):
+        return True
+    if not html:
+        return False
+    head = html[:20000]
+    return 'js_content' not in head and any(marker in head for marker in VERIFICATION_MARKERS)
+
+
+def classify_status(status_code):
+    """按状态码判断请求结果信号"""
+    if status_code == 200:
+        return SIGNAL_OK
+    if status_code in THROTTLE_STATUS or status_code >= 500:
+        return SIGNAL_THROTTLED
+    return SIGNAL_FATAL
+
+
+def backoff_delay(failures, base_delay=1.0, max_delay=60.0):
+    """第failures次连续失败后的等待秒数：指数增长，取 [一半, 全部] 之间的随机值避免同时重试"""
+    delay = min(max_delay, base_delay * (2 ** max(failures - 1, 0)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class AdaptiveConcurrency:
+    """单个主机的AIMD并发控制器，线程和协程可共用"""
+
+    def __init__(self, initial=2, maximum=8, minimum=1, decrease=0.5, base_delay=1.0, max_delay=60.0):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease = decrease
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.in_flight = 0
+        self.failures = 0  # 连续限流次数，决定退避时长
+        self._resume_at = 0.0
+        self._counts = {SIGNAL_OK: 0, SIGNAL_THROTTLED: 0, SIGNAL_FATAL: 0}
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """尝试占用一个并发名额：成功返回0，否则返回建议等待的秒数"""
+        with self._lock:
+            wait = self._resume_at - time.monotonic()
+            if wait > 0:
+                return wait
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return 0.0
+            return 0.05
+
+    def acquire(self):
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, signal):
+        """归还名额并按请求结果调整并发上限"""
+        with self._lock:
+            self.in_flight = max(self.in_flight - 1, 0)
+            self._counts[signal] = self._counts.get(signal, 0) + 1
+            if signal == SIGNAL_OK:
+                self.failures = 0
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            elif signal == SIGNAL_THROTTLED:
+                now = time.monotonic()
+                # 退避期间陆续返回的失败属于同一次过载，只减一次
+                if now >= self._resume_at:
+                    self.failures += 1
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._resume_at = now + backoff_delay(self.failures, self.base_delay, self.max_delay)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'backoff_remaining': round(max(self._resume_at - time.monotonic(), 0.0), 2),
+                'consecutive_throttles': self.failures,
+                'ok': self._counts[SIGNAL_OK],
+                'throttled': self._counts[SIGNAL_THROTTLED],
+                'fatal': self._counts[SIGNAL_FATAL],
+            }
+
+
+class HostAdaptiveLimits:
+    """按URL主机选择并发控制器，未配置的主机不限制并发"""
+
+    def __init__(self, limits=None, base_delay=1.0, max_delay=60.0):
+        limits = DEFAULT_ADAPTIVE_LIMITS if limits is None else limits
+        self.controllers = {
+            host: AdaptiveConcurrency(initial, maximum, base_delay=base_delay, max_delay=max_delay)
+            for host, (initial, maximum) in limits.items()
+        }
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def controller_for(self, url):
+        host = urlsplit(url).hostname or ''
+        for controller_host, controller in self.controllers.items():
+            if host == controller_host or host.endswith('.' + controller_host):
+                return controller
+        return None
+
+    def get_stats(self):
+        """各主机当前的并发上限和请求结果计数"""
+        return {host: controller.get_stats() for host, controller in self.controllers.items()}
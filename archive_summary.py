@@ -0,0 +1,188 @@
+"""
+全库汇总统计
+每写出一篇文章即更新累计值：文章总数、字数、词数、图片数、各公众号和各发布日期的文章数，
+生成汇总报告时直接读取累计值，耗时与文章总数无关；文章列表按页读取，十万篇以上也不必全部载入。
+同一篇文章重新抓取时先减去旧记录再累加，统计不会重复；可随时从全部元数据完整重建
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from article_identity import article_key_from_metadata
+
+TOTAL_FIELDS = ('articles', 'chars', 'words', 'images')
+
+
+def _article_row(metadata):
+    """元数据中参与统计的字段"""
+    analysis = metadata.get('keyword_analysis') or {}
+    return {
+        'nickname': metadata.get('nickname') or '未知公众号',
+        'title': metadata.get('title') or '',
+        'publish_time': str(metadata.get('publish_time') or ''),
+        'publish_date': str(metadata.get('publish_date') or ''),
+        'chars': int(metadata.get('content_length') or 0),
+        'words': int(analysis.get('total_words') or 0),
+        'images': int(metadata.get('image_count') or 0),
+    }
+
+
+class ArchiveSummary:
+    """线程安全的累计统计，SQLite持久化"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.created = not os.path.exists(path)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summary_articles ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " article_key TEXT UNIQUE NOT NULL,"
+            " url TEXT, nickname TEXT, title TEXT, publish_time TEXT, publish_date TEXT,"
+            " chars INTEGER, words INTEGER, images INTEGER,"
+            " article_dir TEXT, written_at TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS nickname_counts (nickname TEXT PRIMARY KEY, articles INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS date_counts (publish_date TEXT PRIMARY KEY, articles INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    # ---- 累计 ----
+
+    def _bump(self, row, sign):
+        """把一篇文章的数值按 sign(+1/-1) 计入各项累计"""
+        deltas = {'articles': 1, 'chars': row['chars'], 'words': row['words'], 'images': row['images']}
+        for name, value in deltas.items():
+            self._conn.execute(
+                "INSERT INTO totals (name, value) VALUES (?, ?)"
+                " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, sign * value)
+            )
+        for table, column, key in (('nickname_counts', 'nickname', row['nickname']),
+                                   ('date_counts', 'publish_date', row['publish_date'])):
+            self._conn.execute(
+                f"INSERT INTO {table} ({column}, articles) VALUES (?, ?)"
+                f" ON CONFLICT({column}) DO UPDATE SET articles = articles + excluded.articles",
+                (key, sign)
+            )
+            self._conn.execute(f"DELETE FROM {table} WHERE articles <= 0")
+
+    def _record(self, metadata, article_dir):
+        article_key = article_key_from_metadata(metadata, metadata['url'])
+        row = _article_row(metadata)
+        old = self._conn.execute(
+            "SELECT nickname, publish_date, chars, words, images FROM summary_articles WHERE article_key = ?",
+            (article_key,)
+        ).fetchone()
+        if old:
+            self._bump(dict(zip(('nickname', 'publish_date', 'chars', 'words', 'images'), old)), -1)
+            self._conn.execute("DELETE FROM summary_articles WHERE article_key = ?", (article_key,))
+        self._bump(row, 1)
+        self._conn.execute(
+            "INSERT INTO summary_articles (article_key, url, nickname, title, publish_time, publish_date,"
+            " chars, words, images, article_dir, written_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (article_key, metadata['url'], row['nickname'], row['title'], row['publish_time'],
+             row['publish_date'], row['chars'], row['words'], row['images'], article_dir,
+             metadata.get('crawl_time') or datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+
+    def record(self, metadata, article_dir=None):
+        """登记一篇刚写出的文章；重复登记时替换旧记录"""
+        with self._lock:
+            with self._conn:
+                self._record(metadata, article_dir)
+
+    def rebuild(self, records):
+        """清空后由 [(元数据, 文章目录)] 重新累计，返回文章数"""
+        with self._lock:
+            with self._conn:
+                for table in ('summary_articles', 'totals', 'nickname_counts', 'date_counts'):
+                    self._conn.execute(f"DELETE FROM {table}")
+                for metadata, article_dir in records:
+                    self._record(metadata, article_dir)
+            return self._totals()['articles']
+
+    # ---- 查询 ----
+
+    def _totals(self):
+        totals = dict.fromkeys(TOTAL_FIELDS, 0)
+        totals.update(self._conn.execute("SELECT name, value FROM totals"))
+        return totals
+
+    def totals(self):
+        """文章总数、总字数、总词数、总图片数"""
+        with self._lock:
+            return self._totals()
+
+    def top_nicknames(self, limit=20):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT nickname, articles FROM nickname_counts ORDER BY articles DESC, nickname LIMIT ?",
+                (limit,)
+            ).fetchall()
+
+    def recent_dates(self, limit=30):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT publish_date, articles FROM date_counts ORDER BY publish_date DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+
+    def articles_page(self, page=1, page_size=100):
+        """第page页文章（最新写入的在前），返回 (文章列表, 总页数)"""
+        page = max(1, int(page))
+        page_size = max(1, int(page_size))
+        with self._lock:
+            total = self._totals()['articles']
+            rows = self._conn.execute(
+                "SELECT seq, url, nickname, title, publish_time, chars, words, images, article_dir"
+                " FROM summary_articles ORDER BY seq DESC LIMIT ? OFFSET ?",
+                (page_size, (page - 1) * page_size)
+            ).fetchall()
+        columns = ('seq', 'url', 'nickname', 'title', 'publish_time', 'chars', 'words', 'images', 'article_dir')
+        pages = max(1, (total + page_size - 1) // page_size)
+        return [dict(zip(columns, row)) for row in rows], pages
+
+    def iter_report_sections(self, page=1, page_size=100, run_count=None):
+        """逐段生成Markdown汇总报告：全库统计 + 公众号/日期分布 + 第page页文章列表"""
+        totals = self.totals()
+        articles, pages = self.articles_page(page, page_size)
+        yield "# 微信文章抓取汇总报告\n\n"
+        yield f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        if run_count is not None:
+            yield f"本次抓取文章数: {run_count}\n\n"
+        yield f"总计抓取文章数: {totals['articles']}\n\n"
+        yield f"总字数: {totals['chars']}，总词数: {totals['words']}，总图片数: {totals['images']}\n\n"
+
+        yield f"## 文章列表 (第 {page}/{pages} 页，最新在前)\n\n"
+        yield "| 序号 | 公众号 | 标题 | 发布时间 | 词数 | 图片数 |\n"
+        yield "|------|--------|------|----------|------|--------|\n"
+        for item in articles:
+            title = item['title']
+            yield (f"| {item['seq']} | {item['nickname']} | {title[:30]}{'...' if len(title) > 30 else ''} | "
+                   f"{item['publish_time']} | {item['chars']} | {item['images']} |\n")
+
+        yield "\n## 公众号统计\n\n"
+        yield "| 公众号 | 文章数 |\n"
+        yield "|--------|--------|\n"
+        for nickname, count in self.top_nicknames(50):
+            yield f"| {nickname} | {count} |\n"
+
+        yield "\n## 发布日期分布 (最近30个发布日期)\n\n"
+        yield "| 日期 | 文章数 |\n"
+        yield "|------|--------|\n"
+        for publish_date, count in self.recent_dates(30):
+            yield f"| {publish_date} | {count} |\n"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
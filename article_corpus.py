@@ -0,0 +1,188 @@
+"""
+合并存储的文章语料库
+每篇文章序列化为一行JSON（元数据、Markdown、纯文本），单独压缩成一个gzip成员追加到分段文件
+segment-00001.jsonl.gz 末尾；分段文件超过上限后开始新分段。
+整个分段仍是合法的gzip文件，可直接用 zcat / gzip.open 顺序读取全部文章；
+SQLite偏移索引记录每篇文章所在的分段、偏移和长度，按文章键或URL随机读取单篇时只解压这一段。
+几百万篇文章只产生少量大文件，备份、列目录和同步都不再受小文件数量拖累
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from article_identity import article_key_from_metadata, canonical_article_key, safe_title
+from atomic_write import write_json_atomic, write_text_atomic
+
+SEGMENT_PATTERN = 'segment-{:05d}.jsonl.gz'
+
+
+class ArticleCorpus:
+    """线程安全的追加写语料库"""
+
+    def __init__(self, root, segment_max_bytes=64 * 1024 * 1024, compresslevel=6):
+        self.root = root
+        self.segment_max_bytes = segment_max_bytes
+        self.compresslevel = compresslevel
+        os.makedirs(self.root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.root, 'index.sqlite3'), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " article_key TEXT PRIMARY KEY,"
+            " url TEXT NOT NULL,"
+            " title TEXT,"
+            " segment INTEGER NOT NULL,"
+            " offset INTEGER NOT NULL,"
+            " length INTEGER NOT NULL,"
+            " written_at TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_url ON records (url)")
+        self._conn.commit()
+        self._segment = self._recover_last_segment()
+
+    def segment_path(self, segment):
+        return os.path.join(self.root, SEGMENT_PATTERN.format(segment))
+
+    def _recover_last_segment(self):
+        """截掉最后一个分段中未登记到索引的尾部（写到一半时退出），返回当前分段号"""
+        row = self._conn.execute(
+            "SELECT segment, MAX(offset + length) FROM records"
+            " WHERE segment = (SELECT MAX(segment) FROM records)"
+        ).fetchone()
+        segment, end = (row[0], row[1]) if row and row[0] is not None else (1, 0)
+        path = self.segment_path(segment)
+        if os.path.exists(path) and os.path.getsize(path) > end:
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+        # 刚开始新分段就退出时，新分段里没有已登记的记录
+        next_path = self.segment_path(segment + 1)
+        if os.path.exists(next_path):
+            os.remove(next_path)
+        return segment
+
+    def append(self, metadata, markdown_content, text_content):
+        """
+        追加一篇文章，返回其文章键。同一篇文章再次写入时索引指向新记录，
+        旧记录仍留在分段中（顺序读取时以后写入的为准）
+        """
+        article_key = article_key_from_metadata(metadata, metadata['url'])
+        record = {
+            'article_key': article_key,
+            'metadata': metadata,
+            'markdown': markdown_content,
+            'text': text_content,
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        member = gzip.compress(line.encode('utf-8'), compresslevel=self.compresslevel)
+        written_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        with self._lock:
+            path = self.segment_path(self._segment)
+            if os.path.exists(path) and os.path.getsize(path) >= self.segment_max_bytes:
+                self._segment += 1
+                path = self.segment_path(self._segment)
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                f.write(member)
+            # 数据写完后才登记索引，读取方只会看到完整的记录
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO records"
+                    " (article_key, url, title, segment, offset, length, written_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (article_key, metadata['url'], metadata.get('title'),
+                     self._segment, offset, len(member), written_at)
+                )
+        return article_key
+
+    def _locate(self, key_or_url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT segment, offset, length FROM records WHERE article_key = ?", (key_or_url,)
+            ).fetchone()
+            if row is None:
+                row = self._conn.execute(
+                    "SELECT segment, offset, length FROM records WHERE url = ? OR article_key = ?",
+                    (key_or_url, canonical_article_key(key_or_url))
+                ).fetchone()
+            return row
+
+    def get(self, key_or_url):
+        """按文章键或URL读取单篇文章 {'article_key', 'metadata', 'markdown', 'text'}，不存在返回None"""
+        location = self._locate(key_or_url)
+        if location is None:
+            return None
+        segment, offset, length = location
+        with open(self.segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            member = f.read(length)
+        return json.loads(gzip.decompress(member))
+
+    def __contains__(self, key_or_url):
+        return self._locate(key_or_url) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def keys(self):
+        """全部文章键，按写入顺序"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT article_key FROM records ORDER BY segment, offset"
+            )]
+
+    def iter_records(self):
+        """按写入顺序逐篇读取索引中的文章（每个分段只打开一次）"""
+        with self._lock:
+            locations = self._conn.execute(
+                "SELECT segment, offset, length FROM records ORDER BY segment, offset"
+            ).fetchall()
+        current, f = None, None
+        try:
+            for segment, offset, length in locations:
+                if segment != current:
+                    if f:
+                        f.close()
+                    f = open(self.segment_path(segment), 'rb')
+                    current = segment
+                f.seek(offset)
+                yield json.loads(gzip.decompress(f.read(length)))
+        finally:
+            if f:
+                f.close()
+
+    def export(self, key_or_url, dest_dir):
+        """把单篇文章还原为 .md / _content.txt / _metadata.json 文件，返回写出的Markdown路径"""
+        record = self.get(key_or_url)
+        if record is None:
+            return None
+        metadata = record['metadata']
+        # 与逐文件模式的文件名相同
+        name = safe_title(metadata.get('title') or '') or safe_title(record['article_key'])
+        os.makedirs(dest_dir, exist_ok=True)
+        markdown_path = os.path.join(dest_dir, f"{name}.md")
+        write_text_atomic(markdown_path, record['markdown'])
+        write_text_atomic(os.path.join(dest_dir, f"{name}_content.txt"), record['text'])
+        write_json_atomic(os.path.join(dest_dir, f"{name}_metadata.json"), metadata)
+        return markdown_path
+
+    def get_stats(self):
+        with self._lock:
+            count, segments = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT segment) FROM records"
+            ).fetchone()
+        size = sum(
+            os.path.getsize(os.path.join(self.root, name))
+            for name in os.listdir(self.root) if name.endswith('.jsonl.gz')
+        )
+        return {'articles': count, 'segments': segments, 'bytes': size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,96 @@
+"""
+文章身份
+同一篇文章可能以多种URL形式出现（带跟踪参数的长链接、短链接 /s/<id>），
+这里把URL归一为稳定的文章键；短链接抓取后才能知道对应的长链接参数，
+其映射由已处理文章索引保存
+"""
+
+import re
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+ARTICLE_PARAMS = ('__biz', 'mid', 'idx', 'sn')
+
+
+def parse_article_params(url):
+    """从长链接中解析 __biz/mid/idx/sn 参数"""
+    parts = urlsplit(url.replace('&amp;', '&'))
+    query = parse_qs(parts.query)
+    return {
+        name: query[name][0]
+        for name in ARTICLE_PARAMS
+        if query.get(name)
+    }
+
+
+def canonical_article_key(url):
+    """
+    返回文章的规范键
+    长链接：biz:<__biz>:<mid>:<idx>:<sn>
+    短链接：s:<短链ID>
+    其他：去掉片段后的URL
+    """
+    url = url.strip()
+    parts = urlsplit(url.replace('&amp;', '&'))
+    params = parse_article_params(url)
+    if all(name in params for name in ('__biz', 'mid', 'sn')):
+        return f"biz:{params['__biz']}:{params['mid']}:{params.get('idx', '1')}:{params['sn']}"
+
+    path = parts.path.rstrip('/')
+    if path.startswith('/s/'):
+        return 's:' + path[len('/s/'):]
+
+    return url.split('#', 1)[0]
+
+
+def canonical_article_url(url):
+    """
+    规范化文章URL：长链接只保留 __biz/mid/idx/sn，去掉 chksm、scene 等跟踪参数；
+    短链接去掉查询参数和片段；其他URL原样返回
+    """
+    url = url.strip()
+    parts = urlsplit(url.replace('&amp;', '&'))
+    if parts.hostname != 'mp.weixin.qq.com':
+        return url
+    params = parse_article_params(url)
+    if all(name in params for name in ('__biz', 'mid', 'sn')):
+        query = urlencode([(name, params[name]) for name in ARTICLE_PARAMS if name in params], safe='=')
+        return f"https://mp.weixin.qq.com/s?{query}"
+
+    path = parts.path.rstrip('/')
+    if path.startswith('/s/'):
+        return f"https://mp.weixin.qq.com{path}"
+    return url
+
+
+def article_key_from_metadata(metadata, url):
+    """
+    文章的规范键：长链接以URL参数为准；短链接等其他形式在页面中解析出
+    biz/mid/sn 时按其生成（由此得到长链接身份），否则按URL
+    """
+    url_key = canonical_article_key(url)
+    if url_key.startswith('biz:'):
+        return url_key
+    if all(metadata.get(name) for name in ('biz', 'mid', 'sn')):
+        # 脚本里的 __biz 可能取自完整链接，截到参数分隔符为止
+        biz, mid, sn = (unquote(str(metadata[name])).split('&')[0].split('#')[0]
+                        for name in ('biz', 'mid', 'sn'))
+        idx = unquote(str(metadata.get('idx') or '1'))
+        return f"biz:{biz}:{mid}:{idx}:{sn}"
+    return url_key
+
+
+def dedupe_article_urls(urls, resolve_key=canonical_article_key):
+    """按文章键去重，保留每篇文章第一次出现的URL"""
+    seen = set()
+    unique = []
+    for url in urls:
+        key = resolve_key(url)
+        if key not in seen:
+            seen.add(key)
+            unique.append(url)
+    return unique
+
+
+def safe_title(title):
+    """文章目录和文件名使用的标题：去掉文件名中不允许的字符，最多50个字符"""
+    return re.sub(r'[\\/*?:"<>|]', '', title)[:50].strip()
@@ -0,0 +1,172 @@
+"""
+已处理文章索引
+SQLite持久化 + 内存集合：写完一篇文章即登记，判断URL是否已处理为O(1)，
+不再每批都遍历全部文章目录读取元数据JSON。
+按文章规范键判断是否已处理，同时保存 短链接键 -> 规范键 的映射，
+同一篇文章换一种URL形式再次提交时不会重复抓取。
+索引缺失或损坏时可用 rebuild() 从现有目录重建
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from article_identity import article_key_from_metadata, canonical_article_key
+
+
+def iter_archive_metadata(output_dir):
+    """逐个读取文章目录下的 *_metadata.json，产出 (元数据, 文章目录名)；跳过 . 和 _ 开头的目录"""
+    if not os.path.exists(output_dir):
+        return
+    for item in sorted(os.listdir(output_dir)):
+        item_path = os.path.join(output_dir, item)
+        if item.startswith(('.', '_')) or not os.path.isdir(item_path):
+            continue
+        for name in os.listdir(item_path):
+            if not name.endswith('_metadata.json'):
+                continue
+            try:
+                with open(os.path.join(item_path, name), 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if 'url' in metadata:
+                yield metadata, item
+
+
+class ArticleIndex:
+    """线程安全的已处理文章索引"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.created = not os.path.exists(path)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            " url TEXT PRIMARY KEY,"
+            " article_key TEXT NOT NULL,"
+            " title TEXT,"
+            " article_dir TEXT,"
+            " processed_at TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_key ON articles (article_key)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS aliases ("
+            " alias TEXT PRIMARY KEY,"
+            " article_key TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._urls = set()
+        self._keys = set()
+        for url, article_key in self._conn.execute("SELECT url, article_key FROM articles"):
+            self._urls.add(url)
+            self._keys.add(article_key)
+        self._aliases = dict(self._conn.execute("SELECT alias, article_key FROM aliases"))
+
+    def resolve_key(self, url):
+        """URL对应的文章规范键；已知的短链接映射到其长链接身份"""
+        key = canonical_article_key(url)
+        with self._lock:
+            return self._aliases.get(key, key)
+
+    def __contains__(self, url):
+        key = self.resolve_key(url)
+        with self._lock:
+            return url in self._urls or key in self._keys
+
+    def __len__(self):
+        with self._lock:
+            return len(self._urls)
+
+    def urls(self):
+        """全部已处理URL的副本"""
+        with self._lock:
+            return set(self._urls)
+
+    def add(self, url, article_key=None, title=None, article_dir=None, processed_at=None):
+        """
+        登记一篇已写出的文章，重复登记时更新记录
+        article_key 为页面解析出的规范键，与URL自身的键不同时（短链接）记录映射
+        """
+        url_key = canonical_article_key(url)
+        article_key = article_key or url_key
+        processed_at = processed_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO articles (url, article_key, title, article_dir, processed_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (url, article_key, title, article_dir, processed_at)
+                )
+                if url_key != article_key:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO aliases (alias, article_key) VALUES (?, ?)",
+                        (url_key, article_key)
+                    )
+            self._urls.add(url)
+            self._keys.add(article_key)
+            if url_key != article_key:
+                self._aliases[url_key] = article_key
+
+    def add_alias(self, alias, article_key):
+        """登记另一个文章键指向同一篇文章（如转载文章自身的键指向原文）"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO aliases (alias, article_key) VALUES (?, ?)",
+                    (alias, article_key)
+                )
+            self._aliases[alias] = article_key
+
+    def rebuild(self, output_dir, extra_metadata=(), duplicates=()):
+        """
+        扫描文章目录下的 *_metadata.json 重建索引，返回登记的文章数
+        extra_metadata 为其他来源（如语料库）的元数据，一并登记；
+        duplicates 为识别出的转载 [(URL, 转载自身的键, 原文的键, 识别时间)]，没有元数据文件，重新登记为原文的别名
+        """
+        rows = []
+        records = list(iter_archive_metadata(output_dir))
+        records += [(metadata, None) for metadata in extra_metadata if 'url' in metadata]
+        for metadata, article_dir in records:
+            rows.append((metadata['url'], article_key_from_metadata(metadata, metadata['url']),
+                         metadata.get('title'), article_dir, metadata.get('crawl_time')))
+        aliases = {}
+        # 后来又作为原文写出的文章以元数据文件为准
+        written_urls = {row[0] for row in rows}
+        written_keys = {row[1] for row in rows}
+        for url, own_key, original_key, detected_at in duplicates:
+            if url not in written_urls:
+                rows.append((url, original_key, None, None, detected_at))
+            if own_key and own_key != original_key and own_key not in written_keys:
+                aliases[own_key] = original_key
+        for url, article_key, _, _, _ in rows:
+            url_key = canonical_article_key(url)
+            if url_key != article_key:
+                aliases[url_key] = article_key
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM articles")
+                self._conn.execute("DELETE FROM aliases")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO articles (url, article_key, title, article_dir, processed_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO aliases (alias, article_key) VALUES (?, ?)",
+                    aliases.items()
+                )
+            self._urls = {row[0] for row in rows}
+            self._keys = {row[1] for row in rows}
+            self._aliases = aliases
+            return len(self._urls)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,51 @@
+"""
+原子写文件
+内容先流式写入同目录下的临时文件，写完后 os.replace 为目标文件名：
+读取方要么看到旧文件，要么看到完整的新文件，不会读到写了一半的内容；
+写入中途出错时删除临时文件，不留下残缺文件
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+
+def _temp_path(path):
+    # 进程号+线程号区分并发写同一目标的临时文件；以.开头，不会被当作文章文件
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+@contextmanager
+def atomic_open(path, encoding='utf-8'):
+    """以文本方式打开临时文件，正常退出时原子替换为path"""
+    tmp_path = _temp_path(path)
+    f = open(tmp_path, 'w', encoding=encoding)
+    try:
+        with f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_text_atomic(path, chunks):
+    """把字符串或字符串迭代器逐段写入path，不在内存中拼接整个文件"""
+    with atomic_open(path) as f:
+        if isinstance(chunks, str):
+            f.write(chunks)
+        else:
+            for chunk in chunks:
+                f.write(chunk)
+
+
+def write_json_atomic(path, data, **kwargs):
+    """json.dump 直接写入临时文件，无法序列化的值转为字符串"""
+    kwargs.setdefault('ensure_ascii', False)
+    kwargs.setdefault('indent', 2)
+    kwargs.setdefault('default', str)
+    with atomic_open(path) as f:
+        json.dump(data, f, **kwargs)
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+性能基准测试
+离线读取保存的页面，不访问网络
+
+用法:
+    python3 benchmark.py parsers                      # 使用 fixtures/*.html
+    python3 benchmark.py parsers --pages 'dir/*.html' --repeat 20
+    python3 benchmark.py parsers --html-cache wechat_articles/.cache/html
+    python3 benchmark.py parsers --partial            # 加测只建所需区域的部分解析
+    python3 benchmark.py analysis                     # 关键词分析: 两次分词 vs 单次分词
+    python3 benchmark.py stages --json before.json    # 单篇文章各处理阶段耗时，使用 fixtures/bench/*.html
+    python3 benchmark.py stages --json after.json --compare before.json   # 与上次结果对比
+"""
+
+import argparse
+import contextlib
+import glob
+import gzip
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from html_parsers import available_backends, parse_article_html
+from wechat_crawler import WeChatArticleAdvancedCrawler
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+# 各阶段基准用的页面：短文、长文、多图、大量内联脚本
+BENCH_FIXTURE_DIR = os.path.join(FIXTURE_DIR, 'bench')
+STAGES = ('parse', 'extract_all_metadata', 'fetch_article_content', 'tokenize', 'analyze_keywords',
+          'html2text', 'generate_full_markdown', 'write_article')
+BENCH_URL = 'https://mp.weixin.qq.com/s/benchmark'
+
+
+def load_pages(patterns=None, html_cache=None, fixture_dir=FIXTURE_DIR):
+    """读取待测页面，返回 [(名称, html)]"""
+    pages = []
+    if html_cache:
+        for path in sorted(glob.glob(os.path.join(html_cache, '*.html.gz'))):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                pages.append((os.path.basename(path)[:12], f.read()))
+    for pattern in patterns or ([] if html_cache else [os.path.join(fixture_dir, '*.html')]):
+        for path in sorted(glob.glob(pattern)):
+            with open(path, 'r', encoding='utf-8') as f:
+                pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def _best_time(func, repeat):
+    """多次运行取最短耗时（秒），减少调度抖动影响"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _measure_memory(func):
+    """返回 (执行期间内存峰值, 执行结束时结果仍占用的内存)，单位字节"""
+    tracemalloc.start()
+    try:
+        result = func()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak, retained
+
+
+def bench_parsers(pages, backends=None, repeat=5, partial=False):
+    """比较各解析后端的解析耗时、解析后提取耗时和内存峰值；partial=True 时加测部分解析"""
+    crawler = WeChatArticleAdvancedCrawler(output_dir=tempfile.mkdtemp(prefix='wechat_bench_'))
+    backends = backends or available_backends()
+    modes = [False, True] if partial else [False]
+    results = []
+    for name, html in pages:
+        for backend, mode in [(b, m) for b in backends for m in modes]:
+            # selectolax 后端本身就只保留所需区域
+            if mode and backend == 'selectolax':
+                continue
+            parse_time, soup = _best_time(lambda: parse_article_html(html, backend, mode), repeat)
+            extract_time, _ = _best_time(
+                lambda: (crawler.extract_all_metadata(soup, html, BENCH_URL),
+                         crawler.fetch_article_content(soup)),
+                repeat
+            )
+            peak, retained = _measure_memory(lambda: parse_article_html(html, backend, mode))
+            results.append({
+                'page': name,
+                'size_kb': round(len(html.encode('utf-8')) / 1024, 1),
+                'backend': backend,
+                'mode': 'partial' if mode or backend == 'selectolax' else 'full',
+                'parse_ms': round(parse_time * 1000, 3),
+                'extract_ms': round(extract_time * 1000, 3),
+                'peak_kb': round(peak / 1024, 1),
+                'tree_kb': round(retained / 1024, 1),
+            })
+    return results
+
+
+def _two_pass_analysis(crawler, text_content, structured_content):
+    """改造前的做法：词频用一次jieba.cut，TF-IDF再由extract_tags对全文分词一次"""
+    import jieba.analyse
+    result = crawler.analyze_keywords(text_content, structured_content)
+    jieba.analyse.extract_tags(text_content, topK=20, withWeight=True)
+    return result
+
+
+def bench_analysis(pages, repeat=5):
+    """比较每篇文章关键词分析的耗时：两次分词 vs 单次分词"""
+    crawler = WeChatArticleAdvancedCrawler(output_dir=tempfile.mkdtemp(prefix='wechat_bench_'))
+    crawler.warm_up()  # 加载jieba词典和IDF表，不计入耗时
+    results = []
+    for name, html in pages:
+        text_content, structured_content = crawler.fetch_article_content(parse_article_html(html))
+        if not text_content:
+            continue
+        # 每页先各跑一次不计时，首次调用的开销不落在任何一方
+        _two_pass_analysis(crawler, text_content, structured_content)
+        tokenize_time, _ = _best_time(lambda: crawler.tokenize(text_content), repeat)
+        single_time, _ = _best_time(
+            lambda: crawler.analyze_keywords(text_content, structured_content), repeat
+        )
+        two_pass_time, _ = _best_time(
+            lambda: _two_pass_analysis(crawler, text_content, structured_content), repeat
+        )
+        results.append({
+            'page': name,
+            'chars': len(text_content),
+            'tokenize_ms': round(tokenize_time * 1000, 3),
+            'two_pass_ms': round(two_pass_time * 1000, 3),
+            'single_pass_ms': round(single_time * 1000, 3),
+            'saved_pct': round((1 - single_time / two_pass_time) * 100, 1) if two_pass_time else 0.0,
+        })
+    return results
+
+
+def _run_stages(crawler, html, url, timings=None, backend='html.parser'):
+    """依次执行单篇文章的各处理阶段（不下载图片），timings 不为None时记录各阶段耗时（秒）"""
+    def timed(stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        if timings is not None:
+            timings[stage] = time.perf_counter() - start
+        return result
+
+    soup = timed('parse', parse_article_html, html, backend)
+    metadata = timed('extract_all_metadata', crawler.extract_all_metadata, soup, html, url)
+    text_content, structured_content = timed('fetch_article_content', crawler.fetch_article_content, soup)
+    metadata['content_length'] = len(text_content)
+    # 与 analyze_page 相同：jieba只分一次，结果同时供关键词分析和写出时的检索索引使用
+    tokens = timed('tokenize', crawler.tokenize, text_content)
+    analysis = timed('analyze_keywords', crawler.analyze_keywords, text_content, structured_content, 20, tokens)
+    metadata['keyword_analysis'] = analysis
+    metadata['_search_terms'] = crawler.search_terms(metadata, tokens)
+    metadata['image_count'] = 0
+
+    content_div = soup.find('div', {'id': 'js_content'})
+    markdown_content = timed('html2text', crawler.h.handle, str(content_div)) if content_div else ''
+    timed('generate_full_markdown', crawler.generate_full_markdown, metadata, markdown_content)
+    timed('write_article', crawler.write_article, metadata, markdown_content, text_content)
+    return metadata
+
+
+def bench_stages(pages, repeat=5, backend='html.parser'):
+    """
+    单篇文章各处理阶段的耗时（多次取最短）、合计耗时折算的每秒文章数，
+    以及完整处理一篇文章时的内存峰值；写文件阶段写入临时目录
+    """
+    crawler = WeChatArticleAdvancedCrawler(output_dir=tempfile.mkdtemp(prefix='wechat_bench_'))
+    crawler.warm_up()  # 加载jieba词典和IDF表，不计入耗时
+    results = []
+    for index, (name, html) in enumerate(pages):
+        url = f'{BENCH_URL}{index}'
+        best = dict.fromkeys(STAGES, float('inf'))
+        # 爬虫各阶段的进度输出不计入耗时
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(repeat):
+                timings = {}
+                metadata = _run_stages(crawler, html, url, timings, backend)
+                for stage in STAGES:
+                    best[stage] = min(best[stage], timings.get(stage, 0.0))
+            peak, _ = _measure_memory(lambda: _run_stages(crawler, html, url, backend=backend))
+        total = sum(best.values())
+        row = {
+            'page': name,
+            'size_kb': round(len(html.encode('utf-8')) / 1024, 1),
+            'chars': metadata.get('content_length', 0),
+        }
+        row.update({f'{stage}_ms': round(best[stage] * 1000, 3) for stage in STAGES})
+        row.update({
+            'total_ms': round(total * 1000, 3),
+            'articles_per_sec': round(1 / total, 1) if total else 0.0,
+            'peak_kb': round(peak / 1024, 1),
+        })
+        results.append(row)
+    return results
+
+
+def stages_summary(results):
+    """整组页面的合计吞吐和进程内存峰值"""
+    total_ms = sum(row['total_ms'] for row in results)
+    return {
+        'pages': len(results),
+        'total_ms': round(total_ms, 3),
+        'articles_per_sec': round(len(results) * 1000 / total_ms, 1) if total_ms else 0.0,
+        'peak_kb': max((row['peak_kb'] for row in results), default=0.0),
+        # Linux 下 ru_maxrss 单位为KB
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _row_key(row):
+    """结果行的标识：全部非数值字段（页面、后端、模式）"""
+    return tuple((k, v) for k, v in row.items() if not isinstance(v, (int, float)))
+
+
+def compare_results(baseline, results):
+    """
+    与上次保存的结果逐行对比耗时（*_ms）和吞吐（*_per_sec），
+    返回 [{行标识..., 指标, 之前, 现在, change_pct}]；耗时为负、吞吐为正表示变快
+    """
+    previous = {_row_key(row): row for row in baseline.get('results', [])}
+    changes = []
+    for row in results:
+        old = previous.get(_row_key(row))
+        if old is None:
+            continue
+        for metric, value in row.items():
+            if not (metric.endswith('_ms') or metric.endswith('_per_sec')) or metric not in old:
+                continue
+            before = old[metric]
+            change = {k: v for k, v in _row_key(row)}
+            change.update({
+                'metric': metric,
+                'before': before,
+                'after': value,
+                'change_pct': round((value - before) / before * 100, 1) if before else 0.0,
+            })
+            changes.append(change)
+    return changes
+
+
+def environment_info():
+    return {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def print_table(results, columns):
+    if not results:
+        print("（无结果）")
+        return
+    widths = {col: max(len(col), *(len(str(row[col])) for row in results)) for col in columns}
+    print('  '.join(col.ljust(widths[col]) for col in columns))
+    print('  '.join('-' * widths[col] for col in columns))
+    for row in results:
+        print('  '.join(str(row[col]).ljust(widths[col]) for col in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='微信文章爬虫性能基准')
+    parser.add_argument('suite', choices=['parsers', 'analysis', 'stages'], help='要运行的基准')
+    parser.add_argument('--pages', nargs='*',
+                        help='页面文件glob，默认 fixtures/*.html（stages 默认 fixtures/bench/*.html）')
+    parser.add_argument('--html-cache', help='从HTML缓存目录读取页面')
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复次数，取最短耗时')
+    parser.add_argument('--backends', nargs='*', help='只测试指定的解析后端')
+    parser.add_argument('--partial', action='store_true', help='同时测试部分解析模式')
+    parser.add_argument('--json', help='把结果写入JSON文件')
+    parser.add_argument('--compare', metavar='BASELINE_JSON', help='与之前用 --json 保存的同一基准结果对比')
+    args = parser.parse_args()
+
+    fixture_dir = BENCH_FIXTURE_DIR if args.suite == 'stages' else FIXTURE_DIR
+    pages = load_pages(args.pages, args.html_cache, fixture_dir)
+    if not pages:
+        print("❌ 没有找到待测页面")
+        return 1
+
+    print(f"📄 页面数: {len(pages)}，每项重复 {args.repeat} 次")
+    if args.suite == 'parsers':
+        results = bench_parsers(pages, args.backends, args.repeat, args.partial)
+        print_table(results, ['page', 'size_kb', 'backend', 'mode', 'parse_ms', 'extract_ms', 'peak_kb', 'tree_kb'])
+        print("\n注: peak_kb/tree_kb 为 tracemalloc 统计的解析峰值内存和解析树常驻内存，"
+              "只包含经Python分配器申请的内存")
+    elif args.suite == 'analysis':
+        results = bench_analysis(pages, args.repeat)
+        print_table(results, ['page', 'chars', 'tokenize_ms', 'two_pass_ms', 'single_pass_ms', 'saved_pct'])
+    else:
+        backend = (args.backends or ['html.parser'])[0]
+        results = bench_stages(pages, args.repeat, backend)
+        print_table(results, ['page', 'size_kb', 'chars'] + [f'{stage}_ms' for stage in STAGES])
+        print()
+        print_table(results, ['page', 'total_ms', 'articles_per_sec', 'peak_kb'])
+        summary = stages_summary(results)
+        print(f"\n合计: {summary['pages']} 篇 {summary['total_ms']} ms，{summary['articles_per_sec']} 篇/秒，"
+              f"单篇内存峰值 {summary['peak_kb']} KB，进程RSS峰值 {summary['max_rss_kb']} KB")
+
+    output = {'suite': args.suite, 'environment': environment_info(), 'results': results}
+    if args.suite == 'stages':
+        output['summary'] = summary
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('suite') != args.suite:
+            print(f"\n❌ {args.compare} 是 {baseline.get('suite')} 基准的结果，无法对比")
+            return 1
+        changes = compare_results(baseline, results)
+        print(f"\n与 {args.compare} 对比 (耗时为负、吞吐为正表示变快):")
+        if changes:
+            print_table(changes, list(changes[0].keys()))
+        else:
+            print("（没有可对比的相同页面）")
+        output['compared_to'] = args.compare
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
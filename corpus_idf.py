@@ -0,0 +1,215 @@
+"""
+语料库文档频率表（DF）与IDF
+词表 vocab.txt 每行一个词，行号即词ID，只追加；df.bin 开头为文章数和重建次数，之后是按词ID排列的uint32文档频率数组，
+通过mmap读写。每写出一篇文章只对其出现过的词加一，不需要重新统计全部文章；
+解析工作进程以只读方式映射同一个文件，主进程写入的计数立即可见。
+TF-IDF直接查此表，公众号文章里到处都有的“点击关注”“阅读原文”等词IDF很低，不再排在前面；
+文章数不足时仍使用jieba自带的IDF表
+"""
+
+import math
+import mmap
+import os
+import struct
+import threading
+
+_HEADER = struct.Struct('<QQ')
+_ITEM_SIZE = 4
+_INITIAL_CAPACITY = 1 << 16
+
+
+class CorpusIDF:
+    """增量维护的文档频率表；readonly为True时只读（解析工作进程使用）"""
+
+    def __init__(self, root, readonly=False):
+        self.root = root
+        self.readonly = readonly
+        self.vocab_path = os.path.join(root, 'vocab.txt')
+        self.df_path = os.path.join(root, 'df.bin')
+        self.keys_path = os.path.join(root, 'documents.txt')
+
+        self._lock = threading.Lock()
+        self._vocab = {}
+        self._vocab_offset = 0
+        self._generation = 0
+        self._file = None
+        self._mmap = None
+        self._counts = None
+        self._keys = set()
+        self.created = False
+
+        if not readonly:
+            os.makedirs(root, exist_ok=True)
+            self.created = not os.path.exists(self.df_path)
+            if self.created:
+                # 词表先于df.bin存在，df.bin整体改名出现，只读方不会打开到空文件
+                open(self.vocab_path, 'a', encoding='utf-8').close()
+                temp_path = f"{self.df_path}.{os.getpid()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.truncate(_HEADER.size + _INITIAL_CAPACITY * _ITEM_SIZE)
+                os.replace(temp_path, self.df_path)
+            if os.path.exists(self.keys_path):
+                with open(self.keys_path, 'r', encoding='utf-8') as f:
+                    self._keys = set(f.read().splitlines())
+        self._map()
+        self._generation = self.generation
+        self._load_vocab()
+
+    @classmethod
+    def open_existing(cls, root):
+        """只读打开，表不存在时返回None"""
+        if not os.path.exists(os.path.join(root, 'df.bin')):
+            return None
+        return cls(root, readonly=True)
+
+    # ---- 映射与词表 ----
+
+    def _unmap(self):
+        if self._counts is not None:
+            self._counts.release()
+            self._mmap.close()
+            self._file.close()
+            self._counts = None
+
+    def _map(self):
+        self._unmap()
+        self._file = open(self.df_path, 'rb' if self.readonly else 'r+b')
+        access = mmap.ACCESS_READ if self.readonly else mmap.ACCESS_WRITE
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=access)
+        self._counts = memoryview(self._mmap)[_HEADER.size:].cast('I')
+
+    def _load_vocab(self):
+        """读取词表中上次之后新追加的词"""
+        with open(self.vocab_path, 'rb') as f:
+            f.seek(self._vocab_offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        for term in data[:end].decode('utf-8').splitlines():
+            self._vocab[term] = len(self._vocab)
+        self._vocab_offset += end
+
+    def _ensure_capacity(self, size):
+        if size <= len(self._counts):
+            return
+        capacity = len(self._counts)
+        while capacity < size:
+            capacity *= 2
+        # 只增不减，只读方映射的旧长度始终有效
+        self._unmap()
+        with open(self.df_path, 'r+b') as f:
+            f.truncate(_HEADER.size + capacity * _ITEM_SIZE)
+        self._map()
+
+    def refresh(self):
+        """只读方：加载主进程新追加的词，文件扩容后重新映射"""
+        with self._lock:
+            if os.path.getsize(self.df_path) != len(self._mmap):
+                self._map()
+            if self.generation != self._generation:
+                # 主进程重建过，词ID已重新分配，词表从头读
+                self._generation = self.generation
+                self._vocab = {}
+                self._vocab_offset = 0
+            if os.path.getsize(self.vocab_path) > self._vocab_offset:
+                self._load_vocab()
+
+    # ---- 读写 ----
+
+    @property
+    def documents(self):
+        return _HEADER.unpack_from(self._mmap, 0)[0]
+
+    @property
+    def generation(self):
+        return _HEADER.unpack_from(self._mmap, 0)[1]
+
+    def __contains__(self, article_key):
+        with self._lock:
+            return article_key in self._keys
+
+    def add_document(self, article_key, terms):
+        """计入一篇文章出现过的词（去重后各加一）；同一篇文章只计一次"""
+        if self.readonly:
+            raise RuntimeError("只读的文档频率表不能写入")
+        with self._lock:
+            if article_key in self._keys:
+                return False
+            new_terms = [term for term in set(terms) if term not in self._vocab and '\n' not in term]
+            if new_terms:
+                with open(self.vocab_path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(term + '\n' for term in new_terms))
+                for term in new_terms:
+                    self._vocab[term] = len(self._vocab)
+                self._vocab_offset = os.path.getsize(self.vocab_path)
+                self._ensure_capacity(len(self._vocab))
+            counts = self._counts
+            for term in set(terms):
+                term_id = self._vocab.get(term)
+                if term_id is not None:
+                    counts[term_id] += 1
+            _HEADER.pack_into(self._mmap, 0, self.documents + 1, self.generation)
+            with open(self.keys_path, 'a', encoding='utf-8') as f:
+                f.write(article_key + '\n')
+            self._keys.add(article_key)
+            return True
+
+    def rebuild(self, documents):
+        """清空后由 [(文章键, 词集合)] 重新统计，返回文章数"""
+        with self._lock:
+            # 原地清零而不截短文件，只读方的映射不会越界
+            generation = self.generation + 1
+            self._mmap[:] = bytes(len(self._mmap))
+            _HEADER.pack_into(self._mmap, 0, 0, generation)
+            self._generation = generation
+            for path in (self.vocab_path, self.keys_path):
+                open(path, 'w', encoding='utf-8').close()
+            self._vocab = {}
+            self._vocab_offset = 0
+            self._keys = set()
+        for article_key, terms in documents:
+            self.add_document(article_key, terms)
+        self.flush()
+        return self.documents
+
+    def document_frequency(self, term):
+        term_id = self._vocab.get(term)
+        if term_id is None or term_id >= len(self._counts):
+            return 0
+        return self._counts[term_id]
+
+    def idf(self, term):
+        """平滑IDF：log((文章数+1) / (文档频率+1))，未出现过的词IDF最高"""
+        return math.log((self.documents + 1) / (self.document_frequency(term) + 1))
+
+    def get_stats(self):
+        return {'documents': self.documents, 'terms': len(self._vocab)}
+
+    def flush(self):
+        with self._lock:
+            if not self.readonly:
+                self._mmap.flush()
+
+    def close(self):
+        with self._lock:
+            if self._counts is not None and not self.readonly:
+                self._mmap.flush()
+            self._unmap()
+
+
+class _IDFLookup:
+    """提供 dict.get 接口的IDF查询，供 tfidf_keywords 使用"""
+
+    def __init__(self, corpus_idf):
+        self._corpus_idf = corpus_idf
+
+    def get(self, word, default=None):
+        return self._corpus_idf.idf(word.lower())
+
+
+class CorpusTFIDF:
+    """与 jieba.analyse.default_tfidf 接口相同（idf_freq / median_idf / stop_words）的IDF来源"""
+
+    def __init__(self, corpus_idf, stop_words):
+        self.idf_freq = _IDFLookup(corpus_idf)
+        self.median_idf = math.log(corpus_idf.documents + 1)
+        self.stop_words = stop_words
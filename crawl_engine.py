@@ -0,0 +1,59 @@
+"""
+异步批量抓取引擎
+同时保持N篇文章在途，文章页按主机令牌桶取号后再发请求，
+抓取到的页面交给crawler.process_article完成解析、图片下载和写文件
+"""
+
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncCrawlEngine:
+    """基于asyncio的批量抓取引擎，阻塞的requests/解析步骤在线程池中执行"""
+
+    def __init__(self, crawler, concurrency=4):
+        self.crawler = crawler
+        self.concurrency = max(1, int(concurrency))
+
+    async def _crawl_one(self, url, semaphore, executor):
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            # 在协程中等待令牌，不占用工作线程；缓存命中或离线时无需请求。
+            # 缓存里的是验证页（或已被淘汰）时仍会联网，由 fetch_article_html 在线程中取令牌
+            cached = self.crawler.offline or self.crawler.has_cached_html(url)
+            if not cached:
+                await self.crawler.rate_limiter.acquire_async(url)
+            fetch_start = time.perf_counter()
+            try:
+                html = await loop.run_in_executor(
+                    executor, functools.partial(self.crawler.fetch_article_html, url, throttle=cached)
+                )
+            except Exception as e:
+                print(f"获取文章失败: {url}, 错误: {str(e)[:100]}")
+                html = None
+
+            if html is None:
+                self.crawler.metrics.inc('articles_failed')
+                return None
+            return await loop.run_in_executor(
+                executor, self.crawler.process_article, url, html, time.perf_counter() - fetch_start
+            )
+
+    async def crawl_async(self, urls, on_result=None):
+        """抓取一批URL，返回与输入顺序一致的 [(url, metadata或None)]"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='crawl') as executor:
+            async def run(url):
+                metadata = await self._crawl_one(url, semaphore, executor)
+                if on_result:
+                    on_result(url, metadata)
+                return metadata
+
+            results = await asyncio.gather(*(run(url) for url in urls))
+        return list(zip(urls, results))
+
+    def crawl(self, urls, on_result=None):
+        """同步入口，供脚本和服务线程调用"""
+        return asyncio.run(self.crawl_async(list(urls), on_result))
@@ -0,0 +1,220 @@
+"""
+分阶段流水线抓取
+抓取线程 -> 解析/分析进程池 -> 图片下载线程 -> Markdown转换进程池 -> 写文件线程
+各阶段之间用有界队列连接：下游处理不过来时上游阻塞，在途文章数和内存占用保持有界。
+CPU密集的解析、jieba分析和html2text转换在独立进程中执行，不受GIL限制，可用满多核；
+网络请求和写文件仍在主进程的线程中完成，共用连接池、令牌桶、HTML缓存和图片库
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from html_parsers import release_tree
+
+_DONE = object()
+
+# 工作进程内的爬虫实例，由 _init_worker 创建，只用于解析和转换，不访问网络
+_worker_crawler = None
+
+
+def _init_worker(crawler_options):
+    global _worker_crawler
+    from wechat_crawler import WeChatArticleAdvancedCrawler
+    _worker_crawler = WeChatArticleAdvancedCrawler(**crawler_options)
+    # 进程启动时即加载分词词典，第一篇文章不再等待
+    _worker_crawler.warm_up()
+
+
+def _analyze_in_worker(url, html):
+    """工作进程：解析页面、提取元数据和正文、分析关键词"""
+    metadata, text_content, content_div = _worker_crawler.analyze_page(url, html)
+    if content_div is None:
+        return metadata, text_content, None, []
+    image_urls = _worker_crawler.content_image_urls(content_div)
+    content_html = str(content_div)
+    release_tree(content_div)
+    return metadata, text_content, content_html, image_urls
+
+
+def _render_in_worker(content_html, image_refs):
+    """工作进程：回写图片引用并转换为Markdown，返回 (Markdown, 耗时秒数)"""
+    start = time.perf_counter()
+    markdown_content = _worker_crawler.render_content_markdown(content_html, image_refs)
+    return markdown_content, time.perf_counter() - start
+
+
+class PipelineCrawlEngine:
+    """
+    多进程流水线抓取引擎，接口与 AsyncCrawlEngine 相同
+    进程池在首次抓取时创建并跨批次复用，服务退出时调用 close()
+    """
+
+    def __init__(self, crawler, fetch_workers=4, cpu_workers=None, image_workers=2, queue_size=8):
+        self.crawler = crawler
+        self.fetch_workers = max(1, int(fetch_workers))
+        self.cpu_workers = max(1, int(cpu_workers or os.cpu_count() or 1))
+        self.image_workers = max(1, int(image_workers))
+        self.queue_size = max(1, int(queue_size))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _worker_options(self):
+        return {
+            'output_dir': self.crawler.output_dir,
+            'parser_backend': self.crawler.parser_backend,
+            'partial_parse': self.crawler.partial_parse,
+            'idf_min_documents': self.crawler.idf_min_documents,
+            'detect_duplicates': self.crawler.detect_duplicates,
+            'html_cache_max_bytes': 0,
+            'offline': True,
+        }
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn：服务进程里有Web和检查线程，fork 可能复制到被占用的锁
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.cpu_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self._worker_options(),),
+                )
+            return self._pool
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    # ---- 各阶段处理函数：返回False表示该文章失败，直接交给写文件阶段记录结果 ----
+
+    def _fetch(self, job):
+        print(f"\n{'='*50}")
+        print(f"开始处理文章: {job['url']}")
+        print(f"{'='*50}")
+        start = time.perf_counter()
+        job['html'] = self.crawler.fetch_article_html(job['url'])
+        job['fetch_seconds'] = time.perf_counter() - start
+        return job['html'] is not None
+
+    def _analyze(self, job):
+        pool = self._get_pool()
+        html = job.pop('html')
+        result = pool.submit(_analyze_in_worker, job['url'], html).result()
+        job['metadata'], job['text_content'], job['content_html'], job['image_urls'] = result
+        # 工作进程记录的各阶段耗时之前补上抓取耗时
+        metadata = job['metadata']
+        metadata['timings'] = {'fetch': round(job['fetch_seconds'], 4), **metadata['timings']}
+        return True
+
+    def _download_images(self, job):
+        metadata = job['metadata']
+        if job['content_html'] is None:
+            # 没有正文或是转载文章，不建目录也不下载图片
+            metadata['image_count'] = 0
+            return True
+        article_dir = self.crawler.get_article_dir(metadata)
+
+        download_start = time.perf_counter()
+        image_timings = self.crawler.download_image_urls(job['image_urls'], article_dir)
+        img_count = sum(1 for item in image_timings if item['file'])
+        download_seconds = time.perf_counter() - download_start
+        print(f"\n共处理 {img_count} 张图片，耗时 {download_seconds:.2f} 秒")
+        metadata['image_count'] = img_count
+        metadata['image_timings'] = image_timings
+        metadata['timings']['images'] = round(download_seconds, 4)
+        return True
+
+    def _render(self, job):
+        content_html = job.pop('content_html')
+        if content_html is None:
+            job['markdown_content'] = "未找到文章内容"
+            return True
+        image_refs = [item['file'] for item in job['metadata']['image_timings']]
+        job['markdown_content'], render_seconds = self._get_pool().submit(
+            _render_in_worker, content_html, image_refs
+        ).result()
+        job['metadata']['timings']['html2text'] = round(render_seconds, 4)
+        return True
+
+    def _write(self, job):
+        self.crawler.write_article(job['metadata'], job['markdown_content'], job['text_content'])
+        print(f"\n文章处理完成: {job['url']}")
+        return True
+
+    # ---- 阶段调度 ----
+
+    def _run_stage(self, handler, in_queue, out_queue, workers):
+        """启动一个阶段的工作线程；全部线程结束后向下游发送结束标记"""
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                job = in_queue.get()
+                if job is _DONE:
+                    in_queue.put(_DONE)  # 让同阶段的其他线程也能退出
+                    break
+                if not job.get('failed'):
+                    try:
+                        if not handler(job):
+                            job['failed'] = True
+                    except Exception as e:
+                        print(f"\n处理文章 {job['url']} 时出错: {e}")
+                        job['failed'] = True
+                out_queue.put(job)
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    out_queue.put(_DONE)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def crawl(self, urls, on_result=None):
+        """抓取一批URL，返回与输入顺序一致的 [(url, metadata或None)]"""
+        urls = list(urls)
+        results = [None] * len(urls)
+        if not urls:
+            return []
+
+        url_queue = queue.Queue()
+        fetched = queue.Queue(maxsize=self.queue_size)
+        analyzed = queue.Queue(maxsize=self.queue_size)
+        downloaded = queue.Queue(maxsize=self.queue_size)
+        rendered = queue.Queue(maxsize=self.queue_size)
+        finished = queue.Queue()
+
+        for index, url in enumerate(urls):
+            url_queue.put({'index': index, 'url': url})
+        url_queue.put(_DONE)
+
+        threads = []
+        threads += self._run_stage(self._fetch, url_queue, fetched, self.fetch_workers)
+        threads += self._run_stage(self._analyze, fetched, analyzed, self.cpu_workers)
+        threads += self._run_stage(self._download_images, analyzed, downloaded, self.image_workers)
+        threads += self._run_stage(self._render, downloaded, rendered, self.cpu_workers)
+        threads += self._run_stage(self._write, rendered, finished, 1)
+
+        # 结果在调用线程中依次回调
+        while True:
+            job = finished.get()
+            if job is _DONE:
+                break
+            metadata = None if job.get('failed') else job['metadata']
+            if metadata is None:
+                self.crawler.metrics.inc('articles_failed')
+            results[job['index']] = metadata
+            if on_result:
+                on_result(job['url'], metadata)
+
+        for thread in threads:
+            thread.join()
+        return list(zip(urls, results))
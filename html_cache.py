@@ -0,0 +1,105 @@
+"""
+原始HTML磁盘缓存
+按文章规范键保存gzip压缩的页面，总大小超限时按最近最少使用淘汰，
+修改解析或Markdown逻辑后可以离线重新处理已抓取的文章
+"""
+
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class HTMLCache:
+    """线程安全、按总字节数限制的LRU页面缓存"""
+
+    def __init__(self, root, max_bytes=512 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # 文件名 -> 压缩后大小，按最近访问时间排序（最旧在前）
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._load_entries()
+
+    def _load_entries(self):
+        """启动时按修改时间重建LRU顺序（命中时会更新文件时间）"""
+        files = []
+        for name in os.listdir(self.root):
+            if name.endswith('.html.gz'):
+                stat = os.stat(os.path.join(self.root, name))
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def _filename(key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest() + '.html.gz'
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._filename(key) in self._entries
+
+    def get(self, key):
+        """读取缓存页面，未命中返回None"""
+        name = self._filename(key)
+        path = os.path.join(self.root, name)
+        with self._lock:
+            if name not in self._entries:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(name)
+            self.stats['hits'] += 1
+
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                html = f.read()
+            os.utime(path)
+            return html
+        except OSError:
+            # 文件被外部删除或损坏，当作未命中
+            with self._lock:
+                self._forget(name)
+                self.stats['hits'] -= 1
+                self.stats['misses'] += 1
+            return None
+
+    def put(self, key, html):
+        """写入页面（先写临时文件再原子替换），并按需淘汰旧条目"""
+        data = gzip.compress(html.encode('utf-8'), compresslevel=6)
+        name = self._filename(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.root, name))
+
+        with self._lock:
+            self._forget(name)
+            self._entries[name] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _forget(self, name):
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.stats['evictions'] += 1
+            try:
+                os.remove(os.path.join(self.root, name))
+            except OSError:
+                pass
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._total_bytes)
@@ -0,0 +1,154 @@
+"""
+HTML解析后端
+html.parser：标准库实现，最慢但无额外依赖（默认）
+lxml：基于libxml2的BeautifulSoup后端
+selectolax：先用C实现的lexbor解析整页，只把爬虫用到的区域（元数据标签、标题、
+           公众号名称、发布时间、正文）交给BeautifulSoup，后续提取逻辑保持不变
+
+partial=True 时 html.parser/lxml 后端只为同样的区域创建节点，推荐阅读、页脚、
+脚本等其余标记只经过分词不进入解析树。部分解析树不含<script>，元数据必须
+走原始HTML的快速路径（process_article 总是如此）
+"""
+
+from bs4 import BeautifulSoup
+from bs4.filter import ElementFilter
+
+PARSER_BACKENDS = ('html.parser', 'lxml', 'selectolax')
+
+# selectolax后端需要保留的元素，覆盖元数据提取和正文提取用到的全部DOM查找
+_REGION_SELECTOR = ', '.join([
+    'meta',
+    'h1#activity-name',
+    'h1.rich_media_title',
+    'span.rich_media_meta_nickname',
+    'a#js_name',
+    'strong.profile_nickname',
+    'em#publish_time',
+    'div#js_content',
+])
+
+
+# 部分解析保留的区域：标签名 -> 命中任一即保留的 id / class
+_PARTIAL_REGIONS = {
+    'meta': None,
+    'h1': ({'activity-name'}, {'rich_media_title'}),
+    'span': (set(), {'rich_media_meta_nickname'}),
+    'a': ({'js_name'}, set()),
+    'strong': (set(), {'profile_nickname'}),
+    'em': ({'publish_time'}, set()),
+    'div': ({'js_content'}, set()),
+}
+
+
+class ArticleRegionFilter(ElementFilter):
+    """
+    解析期过滤器：只在顶层判断，命中的元素连同全部后代按原样建树，
+    其余标签和文本直接丢弃，保留区域的子树与完整解析时完全相同
+    """
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        if name not in _PARTIAL_REGIONS:
+            return False
+        rule = _PARTIAL_REGIONS[name]
+        if rule is None:
+            return True
+        ids, classes = rule
+        attrs = attrs or {}
+        if attrs.get('id') in ids:
+            return True
+        class_value = attrs.get('class')
+        if classes and class_value:
+            if isinstance(class_value, str):
+                class_value = class_value.split()
+            return any(cls in classes for cls in class_value)
+        return False
+
+    def allow_string_creation(self, string):
+        return False
+
+
+_REGION_FILTER = ArticleRegionFilter()
+
+
+def _module_available(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+
+def available_backends():
+    """当前环境可用的解析后端"""
+    backends = ['html.parser']
+    if _module_available('lxml'):
+        backends.append('lxml')
+    if _module_available('selectolax'):
+        backends.append('selectolax')
+    return backends
+
+
+def resolve_backend(backend):
+    """校验后端名称；auto 选择可用的最快后端"""
+    available = available_backends()
+    if backend == 'auto':
+        return available[-1]
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"未知的解析后端: {backend}，可选: {', '.join(PARSER_BACKENDS)}, auto")
+    if backend not in available:
+        raise ValueError(f"解析后端 {backend} 未安装")
+    return backend
+
+
+def _soup_features():
+    return 'lxml' if _module_available('lxml') else 'html.parser'
+
+
+def _extract_regions(html):
+    """用lexbor定位所需区域，拼成只含这些区域的精简文档"""
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    head_parts = []
+    body_parts = []
+    kept = []
+    for node in tree.css(_REGION_SELECTOR):
+        # 已保留元素的后代随祖先一起输出，避免重复
+        if any(_is_ancestor(ancestor, node) for ancestor in kept):
+            continue
+        kept.append(node)
+        (head_parts if node.tag == 'meta' else body_parts).append(node.html)
+    return f"<html><head>{''.join(head_parts)}</head><body>{''.join(body_parts)}</body></html>"
+
+
+def _is_ancestor(ancestor, node):
+    parent = node.parent
+    while parent is not None:
+        if parent.mem_id == ancestor.mem_id:
+            return True
+        parent = parent.parent
+    return False
+
+
+def parse_article_html(html, backend='html.parser', partial=False):
+    """
+    按指定后端解析文章页面，返回BeautifulSoup对象
+    partial=True 时只建立爬虫用到的区域；selectolax后端本身即只保留这些区域
+    """
+    parse_only = _REGION_FILTER if partial else None
+    if backend == 'html.parser':
+        return BeautifulSoup(html, 'html.parser', parse_only=parse_only)
+    if backend == 'lxml':
+        return BeautifulSoup(html, 'lxml', parse_only=parse_only)
+    if backend == 'selectolax':
+        return BeautifulSoup(_extract_regions(html), _soup_features())
+    raise ValueError(f"未知的解析后端: {backend}")
+
+
+def release_tree(node):
+    """销毁节点所在的整棵解析树，断开父子引用，尽早释放内存"""
+    if node is None:
+        return
+    while node.parent is not None:
+        node = node.parent
+    node.decompose()
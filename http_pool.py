@@ -0,0 +1,145 @@
+"""
+HTTP连接池
+文章页和图片请求共用keep-alive连接，按主机配置连接池大小，并统计连接复用情况
+"""
+
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# 各主机的连接池大小：文章页并发不高，图片请求并发较多
+DEFAULT_POOL_SIZES = {
+    'mp.weixin.qq.com': 8,
+    'mmbiz.qpic.cn': 32,
+}
+
+
+class ConnectionStats:
+    """线程安全的请求/建连计数器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _host_entry(self, host):
+        return self._hosts.setdefault(host or 'unknown', {'requests': 0, 'handshakes': 0})
+
+    def record_request(self, host):
+        with self._lock:
+            self._host_entry(host)['requests'] += 1
+
+    def record_handshake(self, host):
+        with self._lock:
+            self._host_entry(host)['handshakes'] += 1
+
+    def snapshot(self):
+        """返回当前统计：请求数、新建连接(握手)数、复用次数"""
+        with self._lock:
+            hosts = {}
+            total_requests = total_handshakes = 0
+            for host, entry in self._hosts.items():
+                requests_count = entry['requests']
+                handshakes = entry['handshakes']
+                hosts[host] = {
+                    'requests': requests_count,
+                    'handshakes': handshakes,
+                    'reused': max(requests_count - handshakes, 0)
+                }
+                total_requests += requests_count
+                total_handshakes += handshakes
+
+        reused = max(total_requests - total_handshakes, 0)
+        return {
+            'requests': total_requests,
+            'handshakes': total_handshakes,
+            'reused': reused,
+            'reuse_rate': round(reused / total_requests, 4) if total_requests else 0.0,
+            'hosts': hosts
+        }
+
+
+def _counting_pool_class(base, stats):
+    """生成在新建连接时计数的urllib3连接池类"""
+    class CountingPool(base):
+        def _new_conn(self):
+            stats.record_handshake(self.host)
+            return super()._new_conn()
+
+    CountingPool.__name__ = f'Counting{base.__name__}'
+    return CountingPool
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """记录请求数和建连数的HTTPAdapter，可被多个Session共享"""
+
+    def __init__(self, stats, **kwargs):
+        # HTTPAdapter.__init__会调用init_poolmanager，需先保存stats
+        self._stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool_class(HTTPConnectionPool, self._stats),
+            'https': _counting_pool_class(HTTPSConnectionPool, self._stats),
+        }
+
+    def send(self, request, **kwargs):
+        self._stats.record_request(urlsplit(request.url).hostname)
+        return super().send(request, **kwargs)
+
+
+class PooledSession:
+    """
+    线程安全的共享会话
+    每个线程持有独立的requests.Session（cookie等状态互不干扰），
+    但所有Session挂载同一组Adapter，底层urllib3连接池在线程间共享复用
+    """
+
+    def __init__(self, headers=None, pool_sizes=None, default_pool_size=10, rate_limiter=None):
+        self.headers = dict(headers or {})
+        self.stats = ConnectionStats()
+        self.rate_limiter = rate_limiter
+
+        pool_sizes = DEFAULT_POOL_SIZES if pool_sizes is None else pool_sizes
+        self._default_adapter = CountingHTTPAdapter(
+            self.stats, pool_connections=default_pool_size, pool_maxsize=default_pool_size
+        )
+        self._host_adapters = {}
+        for host, size in pool_sizes.items():
+            adapter = CountingHTTPAdapter(self.stats, pool_connections=1, pool_maxsize=size)
+            self._host_adapters[f'https://{host}/'] = adapter
+            self._host_adapters[f'http://{host}/'] = adapter
+
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.mount('https://', self._default_adapter)
+            session.mount('http://', self._default_adapter)
+            for prefix, adapter in self._host_adapters.items():
+                session.mount(prefix, adapter)
+            self._local.session = session
+        return session
+
+    def get(self, url, throttle=True, **kwargs):
+        """发起GET请求；throttle为False表示调用方已自行取得令牌"""
+        if throttle and self.rate_limiter:
+            self.rate_limiter.acquire(url)
+        return self._session().get(url, **kwargs)
+
+    def get_stats(self):
+        """连接复用统计"""
+        return self.stats.snapshot()
+
+    def close(self):
+        """关闭所有连接池"""
+        self._default_adapter.close()
+        for adapter in set(self._host_adapters.values()):
+            adapter.close()
@@ -0,0 +1,148 @@
+"""
+内容寻址图片库
+所有文章共享一个图片目录，文件按内容SHA-256命名；另维护规范化URL到文件的索引，
+已入库的图片不会重复下载，也不会重复写盘
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# 流式下载时的读写缓冲大小
+CHUNK_SIZE = 256 * 1024
+
+# 这些查询参数只用于防缓存或来源标记，不影响图片身份
+_VOLATILE_PARAMS = {'timestamp', 'tp', 'wxfrom', 'wx_lazy', 'wx_co', 'from'}
+
+
+def normalize_image_url(url):
+    """
+    规范化图片URL作为索引键
+    mmbiz图片只保留主机和路径（/0与/640视为同一张图），其他图片去掉防缓存参数
+    """
+    if url.startswith('//'):
+        url = 'https:' + url
+    elif not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if host.endswith('mmbiz.qpic.cn'):
+        path = re.sub(r'/0$', '/640', parts.path.rstrip('/') or '/')
+        return f'https://{host}{path}'
+
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k not in _VOLATILE_PARAMS]
+    return urlunsplit(('https', host, parts.path, urlencode(sorted(query)), ''))
+
+
+class ImageStore:
+    """线程安全的内容寻址图片库"""
+
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.index_path = os.path.join(root, 'url_index.jsonl')
+        self._tmp_dir = os.path.join(root, '.tmp')
+        os.makedirs(self._tmp_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # 规范化URL -> [锁, 引用计数]，同一URL的并发下载只放行一个
+        self._url_locks = {}
+        self._url_index = {}
+        self.stats = {'url_hits': 0, 'stored': 0, 'content_duplicates': 0}
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # 跳过写入中断的残行
+                if os.path.exists(os.path.join(self.root, entry['file'])):
+                    self._url_index[entry['url']] = entry['file']
+
+    @contextmanager
+    def url_lock(self, url):
+        """持有该URL的下载锁，不同URL互不阻塞"""
+        key = normalize_image_url(url)
+        with self._lock:
+            entry = self._url_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._url_locks[key]
+
+    def lookup(self, url):
+        """按规范化URL查找已入库的图片，返回库内相对路径或None"""
+        with self._lock:
+            return self._url_index.get(normalize_image_url(url))
+
+    def record_hit(self):
+        with self._lock:
+            self.stats['url_hits'] += 1
+
+    def path(self, stored_name):
+        return os.path.join(self.root, stored_name)
+
+    def _stored_name_for(self, hex_digest):
+        """该内容哈希已入库的文件名（任意扩展名），没有时返回None"""
+        directory = self.path(hex_digest[:2])
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return None
+        for name in names:
+            if name.split('.', 1)[0] == hex_digest:
+                return f'{hex_digest[:2]}/{name}'
+        return None
+
+    def store_stream(self, url, chunks, ext):
+        """边下载边计算哈希写入临时文件，按内容哈希落盘并登记URL索引"""
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    if chunk:
+                        digest.update(chunk)
+                        f.write(chunk)
+
+            hex_digest = digest.hexdigest()
+            # 查重和落盘一起加锁：不同URL的相同内容并发下载时也只落盘一份
+            with self._lock:
+                stored_name = self._stored_name_for(hex_digest)
+                duplicate = stored_name is not None
+                if not duplicate:
+                    stored_name = f'{hex_digest[:2]}/{hex_digest}{ext}'
+                    final_path = self.path(stored_name)
+                    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                    os.replace(tmp_path, final_path)
+            if duplicate:
+                # 扩展名以先入库的为准（同一内容可能以不同Content-Type返回）
+                os.remove(tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        key = normalize_image_url(url)
+        with self._lock:
+            self.stats['content_duplicates' if duplicate else 'stored'] += 1
+            self._url_index[key] = stored_name
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'url': key, 'file': stored_name}) + '\n')
+        return stored_name
@@ -0,0 +1,140 @@
+"""
+持久化任务队列
+SQLite（WAL模式）保存每个待抓取URL的状态：queued -> running -> done / failed，并记录尝试次数。
+服务重启后把中断时仍为running的任务放回队列，从中断处继续；
+同一篇文章在排队或处理中时不会重复入队；排队数达到上限时拒绝新任务
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from article_identity import canonical_article_key
+
+JOB_STATES = ('queued', 'running', 'done', 'failed')
+
+
+class JobQueue:
+    """线程安全的SQLite任务队列"""
+
+    def __init__(self, path, max_pending=10000, max_attempts=3):
+        self.path = path
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " url TEXT NOT NULL,"
+            " article_key TEXT NOT NULL,"
+            " state TEXT NOT NULL DEFAULT 'queued',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " last_error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        # 同一篇文章同时只能有一个未完成的任务
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_key ON jobs (article_key)"
+            " WHERE state IN ('queued', 'running')"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, id)")
+        self._conn.commit()
+
+    def recover(self):
+        """把上次退出时仍在处理中的任务放回队列，返回恢复的数量"""
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET state = 'queued', updated_at = ? WHERE state = 'running'",
+                    (time.time(),)
+                )
+            return cursor.rowcount
+
+    def submit(self, urls, resolve_key=canonical_article_key):
+        """
+        提交一批URL，返回 {'accepted': [...], 'duplicates': [...], 'rejected': [...]}
+        duplicates 为已在队列中的文章，rejected 为超出排队上限而被拒绝的URL
+        """
+        result = {'accepted': [], 'duplicates': [], 'rejected': []}
+        keys = [(url, resolve_key(url)) for url in urls]
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                pending = self._count_pending()
+                for url, key in keys:
+                    if pending >= self.max_pending:
+                        result['rejected'].append(url)
+                        continue
+                    try:
+                        self._conn.execute(
+                            "INSERT INTO jobs (url, article_key, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                            (url, key, now, now)
+                        )
+                    except sqlite3.IntegrityError:
+                        result['duplicates'].append(url)
+                        continue
+                    result['accepted'].append(url)
+                    pending += 1
+        return result
+
+    def _count_pending(self):
+        row = self._conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')"
+        ).fetchone()
+        return row[0]
+
+    def claim(self, limit):
+        """取出最多limit个排队任务并标记为running，返回 [(任务ID, url)]"""
+        with self._lock:
+            with self._conn:
+                rows = self._conn.execute(
+                    "SELECT id, url FROM jobs WHERE state = 'queued' ORDER BY id LIMIT ?",
+                    (limit,)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET state = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(time.time(), job_id) for job_id, _ in rows]
+                )
+            return rows
+
+    def complete(self, job_id):
+        self._set_state(job_id, 'done')
+
+    def fail(self, job_id, error=None):
+        """任务失败：未达到最大尝试次数时重新排队，否则标记为failed。返回新状态"""
+        with self._lock:
+            with self._conn:
+                row = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                state = 'queued' if row and row[0] < self.max_attempts else 'failed'
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                    (state, error, time.time(), job_id)
+                )
+            return state
+
+    def _set_state(self, job_id, state):
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+                    (state, time.time(), job_id)
+                )
+
+    def counts(self):
+        """各状态的任务数"""
+        with self._lock:
+            counts = dict.fromkeys(JOB_STATES, 0)
+            for state, count in self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"):
+                counts[state] = count
+            return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,82 @@
+"""
+元数据快速扫描
+单次遍历原始HTML中的<script>区间，用预编译正则找出 msg_title、nickname、ct、mid、
+idx、sn、__biz、comment_id、appmsgid 等变量，结果与对每个script.string做 re.search 完全一致
+"""
+
+import re
+
+# 与 extract_all_metadata 原有规则一一对应的正则
+SCRIPT_PATTERNS = {
+    'nickname': re.compile(r'nickname\s*=\s*["\'](.*?)["\']'),
+    'user_name': re.compile(r'user_name\s*=\s*["\'](.*?)["\']'),
+    'msg_title': re.compile(r'msg_title\s*=\s*["\'](.*?)["\']'),
+    'publish_time': re.compile(r'publish_time\s*=\s*["\'](.*?)["\']'),
+    'ct': re.compile(r'ct\s*=\s*["\'](.*?)["\']'),
+    'createTime': re.compile(r'createTime\s*:\s*["\'](.*?)["\']'),
+    'svr_time': re.compile(r'svr_time\s*=\s*["\'](.*?)["\']'),
+    'ct_timestamp': re.compile(r'ct\s*=\s*(\d{10})'),
+    'mid': re.compile(r'mid\s*=\s*["\']*(\d+)'),
+    'sn': re.compile(r'sn\s*=\s*["\']*([a-zA-Z0-9]+)'),
+    'idx': re.compile(r'idx\s*=\s*["\']*(\d+)'),
+    'biz': re.compile(r'__biz\s*=\s*["\']*([^"\'\s]+)'),
+    'comment_id': re.compile(r'comment_id\s*=\s*["\']*(\d+)'),
+    'appmsgid': re.compile(r'appmsgid\s*=\s*["\']*(\d+)'),
+}
+
+# 与html.parser一致：按标签逐个前进，<script ...> 开始，遇到第一个 </script> 结束，中间内容原样保留；
+# <style> 内容同样不解析，属性值里的 <script> 不是标签；
+# 脚本之外的 <!-- ... --> 是注释，其中的<script>不算（脚本内容里的 <!-- 不是注释）
+_MARKUP_RE = re.compile(r'<!--|<([a-zA-Z][^\t\n\r\f />\x00]*)[^>"\']*(?:(?:"[^"]*"|\'[^\']*\')[^>"\']*)*>')
+_RAW_TEXT_CLOSE_RE = {
+    'script': re.compile(r'</\s*script\s*>', re.I),
+    'style': re.compile(r'</\s*style\s*>', re.I),
+}
+_COMMENT_CLOSE = '-->'
+
+
+def iter_script_spans(html):
+    """依次返回每个<script>内容在原始HTML中的 (起始, 结束) 位置"""
+    pos = 0
+    while True:
+        tag = _MARKUP_RE.search(html, pos)
+        if not tag:
+            return
+        if tag.group() == '<!--':
+            # 跳过注释；未闭合的注释一直到文档末尾
+            pos = html.find(_COMMENT_CLOSE, tag.end())
+            if pos < 0:
+                return
+            pos += len(_COMMENT_CLOSE)
+            continue
+        name = tag.group(1).lower()
+        if name not in _RAW_TEXT_CLOSE_RE:
+            # 其他标签整体跳过，属性值里的内容不会被当作标签
+            pos = tag.end()
+            continue
+        closing = _RAW_TEXT_CLOSE_RE[name].search(html, tag.end())
+        if not closing:
+            return
+        if name == 'script':
+            yield tag.end(), closing.start()
+        pos = closing.end()
+
+
+def scan_script_vars(html):
+    """
+    扫描页面中的脚本变量
+    返回按script出现顺序排列的列表，每项为该script内各规则的首个匹配 {规则名: 值}，
+    没有任何匹配的script不出现在结果中。
+    直接在原始HTML上按位置区间搜索，不建DOM也不复制script文本；每条规则都以
+    变量名字面量开头，re 的前缀快速查找比单个大分支正则逐字符尝试更快
+    """
+    results = []
+    for start, end in iter_script_spans(html):
+        found = {}
+        for rule, pattern in SCRIPT_PATTERNS.items():
+            match = pattern.search(html, start, end)
+            if match:
+                found[rule] = match.group(1)
+        if found:
+            results.append(found)
+    return results
@@ -0,0 +1,141 @@
+"""
+抓取指标
+单篇文章各处理阶段（抓取、解析、元数据、正文、转载检测、分词、关键词、图片、html2text、写文件）的耗时直方图，
+以及下载字节数、图片数、重试和失败次数等计数器，按Prometheus文本格式输出，供 /api/metrics 抓取。
+各阶段耗时由处理文章的进程记录在元数据 timings 中（流水线模式下来自工作进程），写出文章时汇总到这里
+"""
+
+import threading
+
+PREFIX = 'wechat_crawler'
+
+# 直方图分桶上限（秒）：从缓存读页面的毫秒级到慢速网络下几十秒的图片下载
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGES = ('fetch', 'parse', 'metadata', 'content', 'dedup', 'tokenize', 'keywords',
+          'images', 'html2text', 'write')
+
+# 计数器名 -> (Prometheus指标名, 标签, 说明)
+COUNTERS = {
+    'articles_processed': ('articles_total', {'result': 'success'}, '处理完成的文章数'),
+    'articles_duplicate': ('articles_total', {'result': 'duplicate'}, '识别为转载、只登记别名的文章数'),
+    'articles_failed': ('articles_total', {'result': 'failed'}, '处理失败的文章数'),
+    'article_bytes': ('downloaded_bytes_total', {'kind': 'article'}, '从网络下载的字节数'),
+    'image_bytes': ('downloaded_bytes_total', {'kind': 'image'}, '从网络下载的字节数'),
+    'images_downloaded': ('images_total', {'source': 'network'}, '处理的正文图片数'),
+    'images_cached': ('images_total', {'source': 'cache'}, '处理的正文图片数'),
+    'images_failed': ('images_total', {'source': 'failed'}, '处理的正文图片数'),
+    'html_cache_hits': ('html_cache_hits_total', {}, '命中HTML缓存、未访问网络的文章页数'),
+    'retries': ('request_retries_total', {}, '遇到限流信号后的重试次数'),
+    'request_failures': ('request_failures_total', {}, '重试用尽或不可重试的请求数'),
+}
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class Histogram:
+    """累计分桶直方图（非线程安全，由 CrawlMetrics 加锁）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def cumulative(self):
+        """[(上限, 不超过该上限的次数)]，最后一项为 +Inf"""
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((_number(float(bound)), total))
+        result.append(('+Inf', self.count))
+        return result
+
+
+class CrawlMetrics:
+    """线程安全的抓取指标"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self._stages = {stage: Histogram(buckets) for stage in STAGES}
+        self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            if stage not in self._stages:
+                self._stages[stage] = Histogram(self.buckets)
+            self._stages[stage].observe(seconds)
+
+    def observe_timings(self, timings):
+        """记录一篇文章的各阶段耗时 {阶段: 秒}"""
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def get_stats(self):
+        """计数器和各阶段的次数、平均耗时（秒）"""
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'stages': {
+                    stage: {'count': histogram.count,
+                            'avg': round(histogram.sum / histogram.count, 4) if histogram.count else 0.0}
+                    for stage, histogram in self._stages.items()
+                },
+            }
+
+    def render(self, gauges=()):
+        """
+        Prometheus文本格式；gauges 为调用方附加的瞬时值 [(名称, 说明, [(标签字典, 值)])]，
+        如队列长度、运行时长
+        """
+        lines = []
+        with self._lock:
+            name = f'{PREFIX}_stage_seconds'
+            lines.append(f'# HELP {name} 单篇文章各处理阶段耗时（秒）')
+            lines.append(f'# TYPE {name} histogram')
+            for stage, histogram in self._stages.items():
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{name}_bucket{_labels({"stage": stage, "le": bound})} {count}')
+                lines.append(f'{name}_sum{_labels({"stage": stage})} {_number(histogram.sum)}')
+                lines.append(f'{name}_count{_labels({"stage": stage})} {histogram.count}')
+
+            declared = set()
+            for counter, (metric, labels, help_text) in COUNTERS.items():
+                name = f'{PREFIX}_{metric}'
+                if name not in declared:
+                    lines.append(f'# HELP {name} {help_text}')
+                    lines.append(f'# TYPE {name} counter')
+                    declared.add(name)
+                lines.append(f'{name}{_labels(labels)} {self._counters[counter]}')
+
+        for metric, help_text, samples in gauges:
+            name = f'{PREFIX}_{metric}'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in samples:
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,188 @@
+"""
+近似重复文章检测
+不同公众号转载同一篇文章时URL不同、正文几乎相同。正文去掉空白和标点后按字符4-gram计算64位SimHash，
+内容相差不大的文章指纹只差几位；指纹切成4段各16位分别建索引（LSH分段），
+海明距离不超过3的两个指纹至少有一段完全相同，查询时只比较有段相同的候选，文章再多也只查几个桶。
+检测在分词和下载图片之前完成，转载文章只登记为原文的别名，省下的工作量记录在duplicates表中
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime
+
+from article_identity import article_key_from_metadata
+
+SHINGLE_SIZE = 4
+BANDS = 4
+BAND_BITS = 16
+# 4段时能保证找全的最大海明距离
+MAX_DISTANCE = BANDS - 1
+# 正文过短时指纹不稳定，不做检测
+MIN_CHARS = 200
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+# 每位计数占32位的“通道”：一个字节的8位展开到8个通道，整篇文章的按位累加只需大整数加法
+_LANE_BITS = 32
+_SPREAD = [sum(1 << (bit * _LANE_BITS) for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def simhash(text, shingle_size=SHINGLE_SIZE):
+    """正文 -> 64位SimHash，按4-gram出现次数加权；可用字符不足一个4-gram时返回None"""
+    text = _NON_WORD_RE.sub('', text).lower()
+    if len(text) < shingle_size:
+        return None
+    counts = Counter(text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1))
+    lanes = 0
+    total = 0
+    for shingle, weight in counts.items():
+        digest = hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest()
+        spread = 0
+        for index, byte in enumerate(digest):
+            spread |= _SPREAD[byte] << (index * 8 * _LANE_BITS)
+        lanes += weight * spread
+        total += weight
+    # 某一位为1的加权次数超过一半，指纹该位为1
+    mask = (1 << _LANE_BITS) - 1
+    fingerprint = 0
+    for bit in range(64):
+        if 2 * ((lanes >> (bit * _LANE_BITS)) & mask) > total:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+
+def _bands(fingerprint):
+    mask = (1 << BAND_BITS) - 1
+    return [(fingerprint >> (band * BAND_BITS)) & mask for band in range(BANDS)]
+
+
+class NearDuplicateIndex:
+    """SimHash分段索引，SQLite持久化；WAL模式下解析工作进程可同时查询"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.created = not os.path.exists(path)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            " article_key TEXT PRIMARY KEY,"
+            " url TEXT, title TEXT, fingerprint TEXT NOT NULL,"
+            + ', '.join(f"band{band} INTEGER NOT NULL" for band in range(BANDS)) + ")"
+        )
+        for band in range(BANDS):
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_fingerprints_band{band} ON fingerprints (band{band})"
+            )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS duplicates ("
+            " url TEXT PRIMARY KEY,"
+            " article_key TEXT, original_key TEXT NOT NULL, distance INTEGER,"
+            " images_skipped INTEGER, chars_skipped INTEGER, detected_at TEXT)"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def open_existing(cls, path):
+        """打开已有的索引，不存在时返回None（解析工作进程不创建索引）"""
+        if not os.path.exists(path):
+            return None
+        return cls(path)
+
+    # ---- 写入 ----
+
+    def _add(self, metadata, fingerprint):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO fingerprints (article_key, url, title, fingerprint, "
+            + ', '.join(f"band{band}" for band in range(BANDS)) + ") VALUES (?, ?, ?, ?, "
+            + ', '.join('?' * BANDS) + ")",
+            (article_key_from_metadata(metadata, metadata['url']), metadata['url'], metadata.get('title'),
+             format(fingerprint, '016x'), *_bands(fingerprint))
+        )
+
+    def add(self, metadata, fingerprint):
+        """登记一篇已写出文章的指纹；重复登记时替换"""
+        with self._lock:
+            with self._conn:
+                self._add(metadata, fingerprint)
+
+    def rebuild(self, documents):
+        """清空后由 [(元数据, 指纹)] 重新登记，返回文章数；指纹为None的跳过，已识别的转载记录保留"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM fingerprints")
+                for metadata, fingerprint in documents:
+                    if fingerprint is not None:
+                        self._add(metadata, fingerprint)
+            return self._conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+
+    def record_duplicate(self, metadata, original, chars_skipped=0):
+        """记录一篇转载文章及跳过的工作量（图片数、未分词的字数）"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO duplicates (url, article_key, original_key, distance,"
+                    " images_skipped, chars_skipped, detected_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (metadata['url'], article_key_from_metadata(metadata, metadata['url']),
+                     original['article_key'], original['distance'], original.get('images_skipped', 0),
+                     chars_skipped, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                )
+
+    # ---- 查询 ----
+
+    def find(self, fingerprint, exclude_key=None, max_distance=MAX_DISTANCE):
+        """
+        海明距离不超过max_distance的最相近文章 {'article_key', 'url', 'title', 'distance'}，
+        没有时返回None；exclude_key 为文章自身的键（重新处理同一篇文章不算转载）
+        """
+        bands = _bands(fingerprint)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT article_key, url, title, fingerprint FROM fingerprints WHERE "
+                + ' OR '.join(f"band{band} = ?" for band in range(BANDS)),
+                bands
+            ).fetchall()
+        best = None
+        for article_key, url, title, candidate in rows:
+            if article_key == exclude_key:
+                continue
+            distance = hamming_distance(fingerprint, int(candidate, 16))
+            if distance <= max_distance and (best is None or distance < best['distance']):
+                best = {'article_key': article_key, 'url': url, 'title': title, 'distance': distance}
+        return best
+
+    def duplicates(self):
+        """识别出的全部转载 [(URL, 转载自身的键, 原文的键, 识别时间)]，重建文章索引时重新登记别名"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT url, article_key, original_key, detected_at FROM duplicates ORDER BY detected_at"
+            ).fetchall()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+
+    def get_stats(self):
+        """已登记指纹数、识别出的转载数及因此跳过的图片下载和分词字数"""
+        with self._lock:
+            articles = self._conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+            duplicates, images, chars = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(images_skipped), 0), COALESCE(SUM(chars_skipped), 0)"
+                " FROM duplicates"
+            ).fetchone()
+        return {'articles': articles, 'duplicates': duplicates,
+                'images_skipped': images, 'chars_skipped': chars}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
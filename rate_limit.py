@@ -0,0 +1,77 @@
+"""
+按主机的令牌桶限速
+线程内阻塞等待与协程内异步等待共用同一个桶，文章页和图片分别限速
+"""
+
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+
+# 主机 -> (每秒令牌数, 桶容量)
+DEFAULT_RATE_LIMITS = {
+    'mp.weixin.qq.com': (1.0, 3),
+    'mmbiz.qpic.cn': (20.0, 40),
+}
+
+
+class TokenBucket:
+    """线程安全的令牌桶，令牌不足时预约未来的令牌并返回需要等待的秒数"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        # clock 可替换为测试用的假时钟
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """取走一个令牌，返回需要等待的秒数（0表示立即可用）"""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # 允许令牌数为负，排在后面的请求依次顺延，保证整体速率
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class HostRateLimiter:
+    """按URL主机选择令牌桶，未配置的主机不限速"""
+
+    def __init__(self, limits=None):
+        limits = DEFAULT_RATE_LIMITS if limits is None else limits
+        self.buckets = {
+            host: TokenBucket(rate, capacity) for host, (rate, capacity) in limits.items()
+        }
+
+    def bucket_for(self, url):
+        host = urlsplit(url).hostname or ''
+        for bucket_host, bucket in self.buckets.items():
+            if host == bucket_host or host.endswith('.' + bucket_host):
+                return bucket
+        return None
+
+    def acquire(self, url):
+        bucket = self.bucket_for(url)
+        if bucket:
+            bucket.acquire()
+
+    async def acquire_async(self, url):
+        bucket = self.bucket_for(url)
+        if bucket:
+            await bucket.acquire_async()
@@ -0,0 +1,196 @@
+"""
+全文检索倒排索引
+写出文章时用分析阶段已有的jieba分词结果建立索引，不再二次分词：
+分好的词以空格连接后写入SQLite FTS5，只按空白切分，c++、gpt-4 这类词和查询时一样是一个词；
+FTS5以变长整数差值压缩存放倒排列表，按段增量写入并自动合并；标题和正文分两列，排序时用BM25按标题权重加权。
+FTS5表为无内容表，只存倒排列表，不再另存一份展开的词序列；docs表记录每篇文章对应的索引行和压缩后的词频，
+同一篇文章重新写入时按原来的词删除旧行，BM25的文章数、长度和常见词判断不受重抓影响。
+查询时出现在过半文章中的词（几乎不影响BM25得分）在还有其他词时不参与匹配，常见词不拖慢检索
+"""
+
+import json
+import os
+import re
+import sqlite3
+import string
+import threading
+import time
+import zlib
+from collections import Counter
+
+from article_identity import article_key_from_metadata
+
+# 标题列与正文列的BM25权重
+TITLE_WEIGHT = 3.0
+BODY_WEIGHT = 1.0
+# 文档频率超过该比例的查询词视为常见词
+COMMON_TERM_RATIO = 0.5
+
+_PUNCT_RE = re.compile(r'^[^\w]+$')
+
+
+def _tokenizer_option():
+    """ascii分词器把全部ASCII标点都当作词字符：只按空白切分，非ASCII字符本来就是词字符"""
+    chars = "'" + string.punctuation.replace("'", "''") + "'"
+    return '"ascii tokenchars ' + chars.replace('"', '""') + '"'
+
+
+def count_terms(tokens):
+    """分词结果 -> 检索词频：统一小写，去掉空白和纯标点，保留单字"""
+    counts = Counter()
+    for token in tokens:
+        token = token.strip().lower()
+        if token and not _PUNCT_RE.match(token):
+            counts[token] += 1
+    return counts
+
+
+def _terms_text(counts):
+    """词频还原为空格分隔的词序列（词序不影响BM25）"""
+    return ' '.join(' '.join([term] * count) for term, count in counts.items())
+
+
+def _pack_terms(title_terms, body_terms):
+    """两列词频压缩保存，删除旧索引行时按同样的词序还原"""
+    return zlib.compress(json.dumps([title_terms, body_terms], ensure_ascii=False).encode('utf-8'))
+
+
+def _unpack_terms(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+class SearchIndex:
+    """线程安全的增量倒排索引"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.created = not os.path.exists(path)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # 词已由jieba切好、统一小写并以空格分隔，索引词与count_terms得到的查询词一一对应
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5("
+            f"title, body, content='', tokenize={_tokenizer_option()})"
+        )
+        self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS fts_vocab USING fts5vocab(fts, 'row')")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " doc_id INTEGER PRIMARY KEY,"
+            " article_key TEXT UNIQUE NOT NULL,"
+            " url TEXT, title TEXT, nickname TEXT, publish_time TEXT,"
+            " terms BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    # ---- 写入 ----
+
+    def _add(self, metadata, title_terms, body_terms):
+        article_key = article_key_from_metadata(metadata, metadata['url'])
+        previous = self._conn.execute(
+            "SELECT doc_id, terms FROM docs WHERE article_key = ?", (article_key,)
+        ).fetchone()
+        if previous:
+            # 无内容表删除一行时要提供写入时的词
+            old_title, old_body = _unpack_terms(previous[1])
+            self._conn.execute(
+                "INSERT INTO fts (fts, rowid, title, body) VALUES ('delete', ?, ?, ?)",
+                (previous[0], _terms_text(old_title), _terms_text(old_body))
+            )
+        cursor = self._conn.execute(
+            "INSERT INTO fts (title, body) VALUES (?, ?)",
+            (_terms_text(title_terms), _terms_text(body_terms))
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO docs (doc_id, article_key, url, title, nickname, publish_time, terms)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (cursor.lastrowid, article_key, metadata.get('url'), metadata.get('title'),
+             metadata.get('nickname'), str(metadata.get('publish_time') or ''),
+             _pack_terms(title_terms, body_terms))
+        )
+
+    def add(self, metadata, search_terms):
+        """登记一篇文章，search_terms 为 {'title': 词频, 'body': 词频}；重复登记时替换旧记录"""
+        with self._lock:
+            with self._conn:
+                self._add(metadata, search_terms['title'], search_terms['body'])
+
+    def rebuild(self, documents):
+        """清空后由 [(元数据, 检索词频)] 重建索引并合并为单个段，返回文章数"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT INTO fts (fts) VALUES ('delete-all')")
+                self._conn.execute("DELETE FROM docs")
+                for metadata, search_terms in documents:
+                    self._add(metadata, search_terms['title'], search_terms['body'])
+                self._conn.execute("INSERT INTO fts (fts) VALUES ('optimize')")
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    # ---- 查询 ----
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def _match_expression(self, terms):
+        """查询词 -> FTS5 OR 表达式；还有其他词时去掉常见词"""
+        n_docs = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        doc_counts = {}
+        for term in terms:
+            row = self._conn.execute("SELECT doc FROM fts_vocab WHERE term = ?", (term,)).fetchone()
+            if row:
+                doc_counts[term] = row[0]
+        found = [term for term in terms if term in doc_counts]
+        selective = [term for term in found if doc_counts[term] <= n_docs * COMMON_TERM_RATIO]
+        chosen = selective or found
+        return ' OR '.join(_quote(term) for term in chosen)
+
+    def search(self, query_terms, page=1, page_size=10):
+        """
+        按BM25检索，query_terms 为查询的检索词，
+        返回 {'total', 'page', 'pages', 'results': [...], 'elapsed_ms'}
+        """
+        start = time.perf_counter()
+        page = max(1, int(page))
+        page_size = max(1, int(page_size))
+        terms = list(dict.fromkeys(query_terms))
+        results = []
+        total = 0
+        with self._lock:
+            expression = self._match_expression(terms) if terms else ''
+            if expression:
+                total = self._conn.execute(
+                    "SELECT COUNT(*) FROM fts JOIN docs d ON d.doc_id = fts.rowid WHERE fts MATCH ?",
+                    (expression,)
+                ).fetchone()[0]
+                rows = self._conn.execute(
+                    "SELECT d.url, d.title, d.nickname, d.publish_time, bm25(fts, ?, ?) AS rank"
+                    " FROM fts JOIN docs d ON d.doc_id = fts.rowid WHERE fts MATCH ?"
+                    " ORDER BY rank LIMIT ? OFFSET ?",
+                    (TITLE_WEIGHT, BODY_WEIGHT, expression, page_size, (page - 1) * page_size)
+                ).fetchall()
+                # FTS5的bm25越小越相关，取反后得分越大越相关
+                results = [
+                    {'url': url, 'title': title, 'nickname': nickname,
+                     'publish_time': publish_time, 'score': round(-rank, 4)}
+                    for url, title, nickname, publish_time, rank in rows
+                ]
+
+        return {
+            'total': total,
+            'page': page,
+            'pages': max(1, (total + page_size - 1) // page_size),
+            'results': results,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,16 +1,19 @@
 #!/usr/bin/env python3
 """
 NAS微信文章爬虫服务 - 简化版
-监听单个urls.txt文件，处理完后自动清空
+监听单个urls.txt文件，读取新追加的URL后自动清空
 专为Debian NAS系统设计
 """
 
 import os
 import sys
 import time
+
+_IMPORT_START = time.perf_counter()
 import json
 import logging
 import threading
+import importlib.util
 import re
 from datetime import datetime
 from pathlib import Path
@@ -19,14 +22,15 @@ from typing import List
 # 检查并安装依赖
 def install_dependencies():
     """检查并安装必要的依赖"""
-    required = ['flask', 'requests', 'beautifulsoup4', 'html2text', 'jieba']
-    missing = []
-    
-    for pkg in required:
-        try:
-            __import__(pkg.replace('-', '_'))
-        except ImportError:
-            missing.append(pkg)
+    # 包名 -> 模块名；只查找模块是否存在，不执行导入，避免启动时加载jieba等大模块
+    required = {
+        'flask': 'flask',
+        'requests': 'requests',
+        'beautifulsoup4': 'bs4',
+        'html2text': 'html2text',
+        'jieba': 'jieba',
+    }
+    missing = [pkg for pkg, module in required.items() if importlib.util.find_spec(module) is None]
     
     if missing:
         print(f"📦 正在安装依赖: {', '.join(missing)}")
@@ -42,21 +46,50 @@ def install_dependencies():
 if not install_dependencies():
     sys.exit(1)
 
-from flask import Flask, render_template_string, jsonify
-from wechat_crawler import WeChatArticleAdvancedCrawler
+from flask import Flask, Response, render_template_string, jsonify, request
+from article_identity import canonical_article_url, dedupe_article_urls
+from article_index import ArticleIndex
+from job_queue import JobQueue
+from metrics import CrawlMetrics
+from url_inbox import URLInbox
 
 class SimpleNASService:
-    def __init__(self):
+    def __init__(self, config=None):
         self.config = {
             "urls_file": "urls.txt",
             "output_dir": "wechat_articles", 
             "log_file": "service.log",
             "web_port": 8080,
-            "check_interval": 2
+            "check_interval": 2,
+            "image_concurrency": 8,
+            "concurrency": 4,
+            "article_rate": 1.0,
+            "image_rate": 20.0,
+            "parser_backend": "html.parser",
+            "partial_parse": False,
+            "cpu_workers": 0,
+            "fast_start": True,
+            "max_queued": 10000,
+            "max_attempts": 3,
+            "max_retries": 3,
+            "storage": "files",
+            "idf_min_documents": 200,
+            "detect_duplicates": True,
+            "batch_size": 16
         }
+        # 覆盖默认配置（如测试时指向临时目录），需在打开任务队列和文件之前
+        if config:
+            self.config.update(config)
         
         self.setup_logging()
-        self.crawler = WeChatArticleAdvancedCrawler(output_dir=self.config['output_dir'])
+        # 爬虫和抓取引擎在首次使用时创建（预热线程或第一批任务），不阻塞Web界面启动
+        self._crawler = None
+        self._engine = None
+        # 已处理文章索引，提交URL去重时直接打开，不为此创建爬虫；爬虫创建时传入共用
+        self._article_index = None
+        self._init_lock = threading.Lock()
+        self.startup_timings = {'imports': round(time.perf_counter() - _IMPORT_START, 3)}
+        self.warmed_up = False
         self.stats = {
             'total_processed': 0,
             'success_count': 0,
@@ -64,6 +97,19 @@ class SimpleNASService:
             'service_start_time': datetime.now()
         }
         self.current_status = "等待文件更新..."
+        # 各处理阶段耗时和下载/重试/失败计数，爬虫创建前即可被 /api/metrics 读取
+        self.metrics = CrawlMetrics()
+        # 持久化任务队列，由唯一的处理线程消费；上次退出时处理中的任务重新排队
+        self.jobs = JobQueue(
+            os.path.join(self.config['output_dir'], '.index', 'jobs.sqlite3'),
+            max_pending=self.config['max_queued'],
+            max_attempts=self.config['max_attempts']
+        )
+        recovered = self.jobs.recover()
+        if recovered:
+            self.logger.info(f"♻️ 恢复 {recovered} 个中断的任务")
+        self._wake = threading.Event()
+        self._worker_thread = None
         
         # 确保文件存在
         if not os.path.exists(self.config['urls_file']):
@@ -72,6 +118,87 @@ class SimpleNASService:
         
         self.logger.info("🚀 服务初始化完成")
     
+    @property
+    def crawler(self):
+        self._ensure_engine()
+        return self._crawler
+
+    @property
+    def engine(self):
+        self._ensure_engine()
+        return self._engine
+
+    @property
+    def article_index(self):
+        """已处理文章索引；索引文件已存在时直接打开，还不存在时由爬虫从文章目录建立"""
+        with self._init_lock:
+            path = os.path.join(self.config['output_dir'], '.index', 'articles.sqlite3')
+            if self._crawler is None and self._article_index is None and os.path.exists(path):
+                self._article_index = ArticleIndex(path)
+            index = self._article_index
+        return index if index is not None else self.crawler.article_index
+
+    def _ensure_engine(self):
+        """创建爬虫和抓取引擎，导入较重的模块"""
+        with self._init_lock:
+            if self._engine is not None:
+                return
+            start = time.perf_counter()
+            from wechat_crawler import WeChatArticleAdvancedCrawler
+
+            crawler = WeChatArticleAdvancedCrawler(
+                output_dir=self.config['output_dir'],
+                image_concurrency=self.config['image_concurrency'],
+                parser_backend=self.config['parser_backend'],
+                partial_parse=self.config['partial_parse'],
+                rate_limits={
+                    'mp.weixin.qq.com': (self.config['article_rate'], 3),
+                    'mmbiz.qpic.cn': (self.config['image_rate'], 40),
+                },
+                # 文章页并发从1开始按响应情况自适应，最多到concurrency
+                adaptive_limits={
+                    'mp.weixin.qq.com': (1, self.config['concurrency']),
+                    'mmbiz.qpic.cn': (self.config['image_concurrency'], self.config['image_concurrency'] * 4),
+                },
+                max_retries=self.config['max_retries'],
+                storage=self.config['storage'],
+                idf_min_documents=self.config['idf_min_documents'],
+                detect_duplicates=self.config['detect_duplicates'],
+                metrics=self.metrics,
+                article_index=self._article_index
+            )
+            # cpu_workers > 0 时解析/分析/转换放到多进程流水线中，可用满多核
+            if self.config['cpu_workers'] > 0:
+                from crawl_pipeline import PipelineCrawlEngine
+                engine = PipelineCrawlEngine(
+                    crawler,
+                    fetch_workers=self.config['concurrency'],
+                    cpu_workers=self.config['cpu_workers'],
+                )
+            else:
+                from crawl_engine import AsyncCrawlEngine
+                engine = AsyncCrawlEngine(crawler, concurrency=self.config['concurrency'])
+            self._crawler = crawler
+            self._engine = engine
+            self.startup_timings['crawler_init'] = round(time.perf_counter() - start, 3)
+
+    def warm_up(self):
+        """创建爬虫并预加载jieba词典，记录各步骤耗时"""
+        try:
+            self._ensure_engine()
+            for step, elapsed in self.crawler.warm_up().items():
+                self.startup_timings[step] = round(elapsed, 3)
+            # 新建的检索索引、文档频率表和转载检测索引在这里读一遍正文建立，不拖慢第一篇文章的写入
+            start = time.perf_counter()
+            self.crawler.prepare_text_indexes()
+            self.startup_timings['text_indexes'] = round(time.perf_counter() - start, 3)
+            self.warmed_up = True
+            self.logger.info("⏱️ 启动耗时: " + ", ".join(
+                f"{step} {elapsed:.2f}s" for step, elapsed in self.startup_timings.items()
+            ))
+        except Exception as e:
+            self.logger.error(f"❌ 预热失败: {e}")
+
     def setup_logging(self):
         """设置日志"""
         logging.basicConfig(
@@ -96,113 +223,183 @@ class SimpleNASService:
             matches = re.findall(pattern, content, re.MULTILINE)
             urls.extend(matches)
         
-        # 去重并清理
-        unique_urls = []
-        for url in urls:
-            clean_url = url.split('?')[0] if '?' in url else url
-            if clean_url not in unique_urls:
-                unique_urls.append(clean_url)
-        
-        return unique_urls
+        # 规范化（保留 __biz/mid/idx/sn，去掉跟踪参数）后按文章键去重
+        urls = [canonical_article_url(url) for url in urls]
+        return dedupe_article_urls(urls, self.article_index.resolve_key)
     
-    def process_urls_file(self):
-        """处理urls.txt文件"""
+    def submit_text(self, content):
+        """从提交的文本中提取URL写入任务队列，返回 {'accepted', 'duplicates', 'rejected'}"""
+        return self.submit_urls(self.extract_urls(content))
+
+    def submit_urls(self, urls):
+        """URL写入任务队列；已在排队的文章算重复，队列已满时拒绝"""
+        result = self.jobs.submit(urls, self.article_index.resolve_key)
+        if result['accepted']:
+            self.logger.info(f"📥 收到 {len(result['accepted'])} 个URL")
+            self._wake.set()
+        if result['rejected']:
+            self.logger.warning(f"⚠️ 任务队列已满，拒绝 {len(result['rejected'])} 个URL")
+        return result
+
+    def start_worker(self):
+        """启动唯一的处理线程，批次依次处理，不会并发重复抓取"""
+        with self._init_lock:
+            if self._worker_thread is None:
+                self._worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
+                self._worker_thread.start()
+
+    def _worker_loop(self):
+        while True:
+            self._wake.clear()
+            jobs = self.jobs.claim(self.config['batch_size'])
+            if not jobs:
+                self._wake.wait(self.config['check_interval'])
+                continue
+            self.process_jobs(jobs)
+
+    def process_jobs(self, jobs):
+        """处理一批任务 [(任务ID, url)]，结果写回任务队列"""
         try:
-            # 读取文件内容
-            with open(self.config['urls_file'], 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-            
-            if not content:
-                return  # 文件为空，无需处理
-            
-            self.logger.info("📁 检测到URLs文件更新")
-            self.current_status = "正在提取URLs..."
-            
-            # 提取URL
-            urls = self.extract_urls(content)
-            
+            # 已抓取过的文章（任意URL形式）直接跳过，不再请求
+            article_index = self.article_index
+            job_ids = {}
+            skipped = 0
+            for job_id, url in jobs:
+                if url in article_index:
+                    self.jobs.complete(job_id)
+                    skipped += 1
+                else:
+                    job_ids[url] = job_id
+            if skipped:
+                self.logger.info(f"⏭️ 跳过 {skipped} 篇已抓取的文章")
+            urls = list(job_ids)
             if not urls:
-                self.logger.info("⚠️ 未找到有效的微信文章URL")
-                self.clear_urls_file()
+                self.current_status = f"✅ {skipped} 篇文章均已抓取过"
                 return
             
             self.logger.info(f"🔗 发现 {len(urls)} 个URL，开始处理...")
             self.current_status = f"正在处理 {len(urls)} 个URL..."
             
-            # 处理每个URL
-            success_count = 0
-            for i, url in enumerate(urls, 1):
-                self.current_status = f"正在处理 {i}/{len(urls)}: {url[:50]}..."
-                self.logger.info(f"🚀 [{i}/{len(urls)}] 处理: {url}")
-                
-                try:
-                    result = self.crawler.process_article(url)
+            # 多篇并行处理，请求速率由令牌桶控制（回调在事件循环线程中依次执行）
+            progress = {'done': 0, 'success': 0}
+
+            def on_result(url, result):
+                progress['done'] += 1
+                job_id = job_ids.pop(url, None)
+                if result:
+                    progress['success'] += 1
+                if job_id is not None:
                     if result:
-                        success_count += 1
-                        self.logger.info(f"✅ [{i}/{len(urls)}] 成功: {url}")
+                        self.jobs.complete(job_id)
                     else:
-                        self.logger.error(f"❌ [{i}/{len(urls)}] 失败: {url}")
-                except Exception as e:
-                    self.logger.error(f"❌ [{i}/{len(urls)}] 异常: {url} - {e}")
-                
-                # 添加延迟避免被封
-                time.sleep(1)
+                        self.jobs.fail(job_id, 'crawl failed')
+                done = progress['done']
+                self.current_status = f"正在处理 {done}/{len(urls)}: {url[:50]}..."
+                if result:
+                    self.logger.info(f"✅ [{done}/{len(urls)}] 成功: {url}")
+                else:
+                    self.logger.error(f"❌ [{done}/{len(urls)}] 失败: {url}")
+
+            try:
+                self.engine.crawl(urls, on_result=on_result)
+            except Exception as e:
+                self.logger.error(f"❌ 批次抓取异常: {e}")
+            # 没有回调结果的任务按失败处理，未达到最大尝试次数时重新排队
+            for job_id in job_ids.values():
+                self.jobs.fail(job_id, 'no result')
+            success_count = progress['success']
             
             # 更新统计
             self.stats['total_processed'] += len(urls)
             self.stats['success_count'] += success_count
             self.stats['last_processed'] = datetime.now()
             
-            # 清空文件
-            self.clear_urls_file()
-            
+            # 汇总报告由累计统计生成，耗时与文章总数无关，每批都刷新
+            if success_count:
+                self.crawler.generate_summary_report()
+
             self.current_status = f"✅ 完成处理 {len(urls)} 个URL，成功 {success_count} 个"
             self.logger.info(f"🎉 批次处理完成: {success_count}/{len(urls)} 成功")
             
         except Exception as e:
             self.current_status = f"❌ 处理出错: {str(e)}"
-            self.logger.error(f"❌ 处理URLs文件时出错: {e}")
-    
-    def clear_urls_file(self):
-        """清空URLs文件"""
-        try:
-            with open(self.config['urls_file'], 'w', encoding='utf-8') as f:
-                f.write("")
-            self.logger.info("🧹 URLs文件已清空")
-        except Exception as e:
-            self.logger.error(f"❌ 清空文件失败: {e}")
+            self.logger.error(f"❌ 处理URL时出错: {e}")
+
+class URLFileWatcher:
+    """
+    监听urls.txt：watchdog收到文件变化事件后立即读取新追加的内容，
+    未安装watchdog时退回定期检查。只读取新增字节，读完轮转为空文件
+    """
+
+    # 最后一次写入后等待的时间，避免读到正在写的行
+    SETTLE_SECONDS = 0.2
 
-class URLFileChecker:
     def __init__(self, service):
         self.service = service
-        self.last_size = 0
+        urls_file = service.config['urls_file']
+        self.inbox = URLInbox(
+            urls_file,
+            os.path.join(service.config['output_dir'], '.index', 'inbox_offset.json')
+        )
+        self._changed = threading.Event()
+        self._observer = None
         self.checking = False
-    
-    def check_file_not_empty(self):
-        """检查文件是否非空"""
+
+    def _start_observer(self):
         try:
-            urls_file = self.service.config['urls_file']
-            if os.path.exists(urls_file):
-                file_size = os.path.getsize(urls_file)
-                return file_size > 0
-            return False
-        except Exception as e:
-            self.service.logger.error(f"❌ 检查文件大小失败: {e}")
-            return False
-    
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            self.service.logger.info("⚠️ 未安装watchdog，改为定期检查文件")
+            return
+
+        target = os.path.abspath(self.inbox.path)
+        changed = self._changed
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                paths = {getattr(event, 'src_path', ''), getattr(event, 'dest_path', '')}
+                if target in {os.path.abspath(path) for path in paths if path}:
+                    changed.set()
+
+        self._observer = Observer()
+        self._observer.schedule(Handler(), os.path.dirname(target), recursive=False)
+        self._observer.start()
+
+    def check_once(self):
+        """
+        读取新追加的URL写入任务队列，然后把已读完的文件轮转为空文件。
+        写入队列后才提交读取位置；队列已满时放弃本次读取，返回False稍后重试
+        """
+        text = self.inbox.read_new(final=True)
+        text += self.inbox.rotate_if_drained()
+        if text.strip():
+            self.service.logger.info("📁 检测到URLs文件更新")
+            if self.service.submit_text(text)['rejected']:
+                self.inbox.rewind()
+                return False
+        self.inbox.commit()
+        return True
+
     def start_checking(self):
-        """开始定期检查文件"""
+        """开始监听文件"""
         self.checking = True
+        self._start_observer()
+        self._changed.set()  # 启动时先读一次，处理停机期间追加的内容
         while self.checking:
             try:
-                if self.check_file_not_empty():
-                    # 文件不为空，处理URLs
-                    threading.Thread(target=self.service.process_urls_file, daemon=True).start()
-                    # 等待处理完成后再继续检查
-                    time.sleep(5)
-                else:
-                    # 文件为空，正常等待
+                # 有事件时立即处理；没有watchdog时按检查间隔轮询
+                self._changed.wait(self.service.config['check_interval'])
+                if self._observer is not None and not self._changed.is_set():
+                    continue
+                # 等待连续写入结束
+                while self._changed.is_set():
+                    self._changed.clear()
+                    time.sleep(self.SETTLE_SECONDS)
+                if not self.check_once():
+                    # 任务队列已满，等待处理一段后重新读取
                     time.sleep(self.service.config['check_interval'])
+                    self._changed.set()
             except Exception as e:
                 self.service.logger.error(f"❌ 文件检查异常: {e}")
                 time.sleep(self.service.config['check_interval'])
@@ -210,6 +407,9 @@ class URLFileChecker:
     def stop_checking(self):
         """停止检查"""
         self.checking = False
+        self._changed.set()
+        if self._observer is not None:
+            self._observer.stop()
 
 def create_web_app(service):
     """创建Web界面"""
@@ -380,15 +580,102 @@ def create_web_app(service):
     def get_status():
         uptime = datetime.now() - service.stats['service_start_time']
         uptime_str = f"{uptime.days}天{uptime.seconds//3600}时{(uptime.seconds%3600)//60}分"
+        # 爬虫尚未创建时不触发创建，状态接口始终立即返回
+        crawler = service._crawler
         
         return jsonify({
             'total_processed': service.stats['total_processed'],
             'success_count': service.stats['success_count'],
             'current_status': service.current_status,
             'last_processed': service.stats['last_processed'].strftime('%Y-%m-%d %H:%M:%S') if service.stats['last_processed'] else None,
-            'uptime': uptime_str
+            'uptime': uptime_str,
+            'http_pool': crawler.http.get_stats() if crawler else None,
+            'html_cache': crawler.html_cache.get_stats() if crawler and crawler.html_cache else None,
+            'adaptive_limits': crawler.adaptive_limits.get_stats() if crawler else None,
+            'corpus': crawler.corpus.get_stats() if crawler and crawler.storage == 'corpus' else None,
+            'corpus_idf': crawler._corpus_idf.get_stats() if crawler and crawler._corpus_idf else None,
+            'near_duplicates': crawler._near_duplicates.get_stats() if crawler and crawler._near_duplicates else None,
+            'warmed_up': service.warmed_up,
+            'startup_timings': service.startup_timings,
+            'queue': service.jobs.counts(),
+            'metrics': service.metrics.get_stats()
         })
     
+    @app.route('/api/summary')
+    def get_summary():
+        """全库累计统计：总数、公众号和发布日期分布"""
+        summary = service.crawler.summary
+        return jsonify({
+            'totals': summary.totals(),
+            'nicknames': summary.top_nicknames(request.args.get('limit', 20, type=int)),
+            'dates': summary.recent_dates(request.args.get('days', 30, type=int))
+        })
+    
+    @app.route('/api/articles')
+    def get_articles():
+        """分页的文章列表，最新写入的在前"""
+        page = request.args.get('page', 1, type=int)
+        page_size = min(request.args.get('page_size', 50, type=int), 500)
+        articles, pages = service.crawler.summary.articles_page(page, page_size)
+        return jsonify({'page': page, 'pages': pages, 'page_size': page_size, 'articles': articles})
+    
+    @app.route('/api/search')
+    def search():
+        """全文检索：q 为查询词，按BM25排序分页返回"""
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': '缺少查询参数 q'}), 400
+        page = request.args.get('page', 1, type=int)
+        page_size = min(request.args.get('page_size', 10, type=int), 100)
+        result = service.crawler.search(query, page, page_size)
+        result['query'] = query
+        return jsonify(result)
+    
+    @app.route('/api/metrics')
+    def metrics():
+        """Prometheus文本格式的指标：各阶段耗时直方图、计数器，以及队列长度等瞬时值"""
+        uptime = (datetime.now() - service.stats['service_start_time']).total_seconds()
+        gauges = [
+            ('queue_jobs', '任务队列中各状态的任务数',
+             [({'state': state}, count) for state, count in service.jobs.counts().items()]),
+            ('uptime_seconds', '服务运行时长（秒）', [({}, uptime)]),
+        ]
+        # 爬虫尚未创建时不触发创建
+        crawler = service._crawler
+        if crawler:
+            gauges.append(('adaptive_concurrency_limit', '各主机当前的自适应并发上限',
+                           [({'host': host}, stats['limit'])
+                            for host, stats in crawler.adaptive_limits.get_stats().items()]))
+        return Response(service.metrics.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
+    
+    @app.route('/api/submit', methods=['POST'])
+    def submit():
+        """
+        提交URL：JSON {"urls": [...]} 或 {"text": "..."}，也可直接提交纯文本。
+        全部入队（或已在队列中）返回202，队列已满返回429
+        """
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            urls = data.get('urls') or []
+            if isinstance(urls, str):
+                urls = [urls]
+            text = "\n".join(str(url) for url in urls) + "\n" + str(data.get('text') or '')
+        else:
+            text = request.get_data(as_text=True)
+        
+        urls = service.extract_urls(text)
+        if not urls:
+            return jsonify({'error': '未找到微信文章URL'}), 400
+        
+        result = service.submit_urls(urls)
+        result['queue'] = service.jobs.counts()
+        if result['rejected']:
+            response = jsonify(result)
+            response.status_code = 429
+            response.headers['Retry-After'] = str(service.config['check_interval'])
+            return response
+        return jsonify(result), 202
+    
     return app
 
 def main():
@@ -404,13 +691,7 @@ def main():
         print(f"📁 输出目录: {os.path.abspath(service.config['output_dir'])}")
         print(f"🌐 Web端口: {service.config['web_port']}")
         
-        # 设置文件定期检查
-        file_checker = URLFileChecker(service)
-        checker_thread = threading.Thread(target=file_checker.start_checking, daemon=True)
-        checker_thread.start()
-        service.logger.info("👀 文件定期检查已启动")
-        
-        # 启动Web界面
+        # 先启动Web界面，爬虫和分词词典随后加载
         app = create_web_app(service)
         web_thread = threading.Thread(
             target=lambda: app.run(
@@ -422,7 +703,21 @@ def main():
             daemon=True
         )
         web_thread.start()
+        service.startup_timings['web_ui'] = round(time.perf_counter() - _IMPORT_START, 3)
         service.logger.info(f"🌐 Web界面已启动")
+
+        # 快速启动：后台预热jieba词典；否则预热完成后再开始检查文件
+        if service.config['fast_start']:
+            threading.Thread(target=service.warm_up, daemon=True).start()
+        else:
+            service.warm_up()
+        
+        # 唯一的处理线程 + 文件监听
+        service.start_worker()
+        file_checker = URLFileWatcher(service)
+        checker_thread = threading.Thread(target=file_checker.start_checking, daemon=True)
+        checker_thread.start()
+        service.logger.info("👀 文件监听已启动")
         
         print(f"\n✅ 服务启动成功！")
         print(f"📱 Web访问: http://你的NAS的IP:{service.config['web_port']}")
@@ -439,6 +734,8 @@ def main():
         except KeyboardInterrupt:
             print("\n👋 正在停止服务...")
             file_checker.stop_checking()
+            if hasattr(service._engine, 'close'):
+                service._engine.close()
             service.logger.info("服务已停止")
         
     except Exception as e:
@@ -0,0 +1,1038 @@
+#!/usr/bin/env python3
+"""
+爬虫核心离线测试
+使用 fixtures/ 下保存的页面，不需要网络
+"""
+
+import glob
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jieba
+import jieba.analyse
+from bs4 import BeautifulSoup
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from wechat_crawler import WeChatArticleAdvancedCrawler
+from article_identity import canonical_article_key as crawler_key, canonical_article_url
+from html_parsers import available_backends, parse_article_html
+from keyword_scoring import tfidf_keywords, weighted_keyword_scores
+from search_index import count_terms
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FIXTURE_URL = 'https://mp.weixin.qq.com/s?__biz=MzA3MDMwOTcwMg==&mid=2649004894&idx=1&sn=8f3c2b1a9d'
+
+
+def load_fixtures():
+    """读取全部测试页面 [(文件名, html)]"""
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            fixtures.append((os.path.basename(path), f.read()))
+    return fixtures
+
+
+def make_crawler():
+    return WeChatArticleAdvancedCrawler(output_dir=tempfile.mkdtemp(prefix='wechat_test_'))
+
+
+@contextmanager
+def local_server(respond):
+    """本机HTTP服务，respond(path) 返回 (状态码, 响应头, 正文字节)；产出服务地址"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, headers, data = respond(self.path)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_metadata_fast_path_parity():
+    """快速元数据提取与逐项DOM提取的结果（含字段顺序）完全一致"""
+    print("🔍 测试元数据快速路径一致性...")
+    crawler = make_crawler()
+
+    fixtures = load_fixtures()
+    assert fixtures, "fixtures/ 下没有测试页面"
+    for name, html in fixtures:
+        for url in (FIXTURE_URL, 'https://mp.weixin.qq.com/s/fixture'):
+            soup = BeautifulSoup(html, 'html.parser')
+            expected = crawler._extract_all_metadata_dom(soup, url)
+            actual = crawler.extract_all_metadata(soup, html, url)
+            # 抓取时间取自当前时钟，不参与比较
+            expected.pop('crawl_time')
+            actual.pop('crawl_time')
+            assert list(actual.items()) == list(expected.items()), f"{name}: {actual} != {expected}"
+        print(f"✅ {name}")
+
+
+def test_parser_backends_agree():
+    """各解析后端提取的元数据和正文与 html.parser 一致"""
+    print("🔍 测试解析后端一致性...")
+    crawler = make_crawler()
+
+    for name, html in load_fixtures():
+        expected = None
+        for backend in available_backends():
+            soup = parse_article_html(html, backend)
+            metadata = crawler.extract_all_metadata(soup, html, FIXTURE_URL)
+            metadata.pop('crawl_time')
+            result = (metadata, crawler.fetch_article_content(soup))
+            if expected is None:
+                expected = result
+            assert result == expected, f"{name}: {backend} 与 html.parser 结果不一致"
+        print(f"✅ {name}: {', '.join(available_backends())}")
+
+
+def test_partial_parse_identical():
+    """部分解析得到的元数据、纯文本和Markdown与完整解析逐字节一致"""
+    print("🔍 测试部分解析一致性...")
+    crawler = make_crawler()
+
+    for name, html in load_fixtures():
+        for backend in [b for b in available_backends() if b != 'selectolax']:
+            outputs = []
+            for partial in (False, True):
+                soup = parse_article_html(html, backend, partial)
+                metadata = crawler.extract_all_metadata(soup, html, FIXTURE_URL)
+                metadata.pop('crawl_time')
+                text_content, structured_content = crawler.fetch_article_content(soup)
+                content_div = soup.find('div', {'id': 'js_content'})
+                markdown = crawler.h.handle(str(content_div)) if content_div else None
+                outputs.append((metadata, text_content, structured_content, markdown))
+            assert outputs[0] == outputs[1], f"{name}: {backend} 部分解析结果与完整解析不一致"
+        print(f"✅ {name}")
+
+
+def legacy_keyword_scores(word_counts, structured_content, weights):
+    """逐词逐段 in/count 的原始计分方式，作为对照"""
+    keyword_scores = {}
+    for word, count in word_counts.items():
+        score = 0
+        for section in ('title', 'subtitle', 'strong'):
+            for text in structured_content[section]:
+                if word in text:
+                    score += weights[section] * text.count(word)
+        score += weights['normal'] * count
+        if score > 0:
+            keyword_scores[word] = score
+    return keyword_scores
+
+
+def test_indexed_keyword_scores():
+    """倒排表计分与逐段计分的全部得分一致（含重叠子串和顺序）"""
+    print("🔍 测试关键词加权计分...")
+    crawler = make_crawler()
+    weights = crawler.keyword_weights
+
+    cases = [(
+        Counter({'哈哈': 3, '哈哈哈': 1, 'aa': 2, '微信': 5, '文章': 1}),
+        {'title': ['哈哈哈哈哈 微信文章'], 'subtitle': ['aaaa', '微信微信'],
+         'strong': ['哈哈', 'aaa 微信'], 'normal': []},
+    )]
+    for name, html in load_fixtures():
+        soup = parse_article_html(html)
+        text_content, structured_content = crawler.fetch_article_content(soup)
+        if text_content:
+            words = [w for w in jieba.cut(text_content) if len(w) > 1]
+            cases.append((Counter(words), structured_content))
+
+    for word_counts, structured_content in cases:
+        expected = legacy_keyword_scores(word_counts, structured_content, weights)
+        actual = weighted_keyword_scores(word_counts, structured_content, weights)
+        assert list(actual.items()) == list(expected.items()), f"{actual} != {expected}"
+    print(f"✅ {len(cases)} 组用例一致")
+
+
+def test_single_pass_tfidf():
+    """复用分词结果的TF-IDF与 jieba.analyse.extract_tags 结果一致"""
+    print("🔍 测试单次分词TF-IDF...")
+    crawler = make_crawler()
+
+    texts = ['微信公众号文章抓取，The crawler and the parser；微信 文章 微信']
+    for name, html in load_fixtures():
+        text_content, _ = crawler.fetch_article_content(parse_article_html(html))
+        if text_content:
+            texts.append(text_content)
+
+    for text in texts:
+        for top_k in (5, 20):
+            expected = jieba.analyse.extract_tags(text, topK=top_k, withWeight=True)
+            actual = tfidf_keywords(crawler.tokenize(text), top_k)
+            assert actual == expected, f"{actual} != {expected}"
+    print(f"✅ {len(texts)} 段文本一致")
+
+
+def _read_article_outputs(output_dir):
+    """读取输出目录下全部文章文件，抓取时间和各阶段耗时不参与比较"""
+    outputs = {}
+    for path in sorted(glob.glob(os.path.join(output_dir, '*', '*'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        if path.endswith('_metadata.json'):
+            metadata = json.loads(content)
+            metadata.pop('timings', None)
+            content = json.dumps(metadata, ensure_ascii=False, indent=2)
+        lines = [line for line in content.splitlines()
+                 if '抓取时间' not in line and '"crawl_time"' not in line]
+        outputs[os.path.relpath(path, output_dir)] = lines
+    return outputs
+
+
+def test_pipeline_matches_process_article():
+    """流水线引擎写出的文件与逐篇 process_article 完全一致"""
+    print("🔍 测试流水线抓取...")
+    from crawl_pipeline import PipelineCrawlEngine
+
+    urls = []
+    crawlers = []
+    for _ in range(2):
+        crawler = WeChatArticleAdvancedCrawler(
+            output_dir=tempfile.mkdtemp(prefix='wechat_test_'), offline=True
+        )
+        for index, (name, html) in enumerate(load_fixtures()):
+            url = f'https://mp.weixin.qq.com/s/fixture{index}'
+            crawler.html_cache.put(crawler_key(url), html)
+            if len(crawlers) == 0:
+                urls.append(url)
+        crawlers.append(crawler)
+    urls.append('https://mp.weixin.qq.com/s/not_cached')
+
+    serial = [crawlers[0].process_article(url) for url in urls]
+    engine = PipelineCrawlEngine(crawlers[1], fetch_workers=2, cpu_workers=2, queue_size=2)
+    try:
+        pipelined = engine.crawl(urls)
+    finally:
+        engine.close()
+
+    assert [url for url, _ in pipelined] == urls
+    assert [m is None for _, m in pipelined] == [m is None for m in serial]
+    expected = _read_article_outputs(crawlers[0].output_dir)
+    actual = _read_article_outputs(crawlers[1].output_dir)
+    assert expected and actual == expected, "流水线输出与 process_article 不一致"
+    print(f"✅ {len(expected)} 个文件一致")
+
+
+def test_article_index():
+    """写出文章即登记索引；重启后仍可查询，删除索引后可从目录重建"""
+    print("🔍 测试已处理文章索引...")
+    crawler = make_crawler()
+    crawler.offline = True
+    name, html = load_fixtures()[0]
+    crawler.html_cache.put(crawler_key(FIXTURE_URL), html)
+
+    assert FIXTURE_URL not in crawler.article_index
+    assert crawler.process_article(FIXTURE_URL)
+    assert FIXTURE_URL in crawler.article_index
+
+    reopened = WeChatArticleAdvancedCrawler(output_dir=crawler.output_dir)
+    assert reopened.get_processed_urls() == {FIXTURE_URL}
+
+    # 删除索引文件后首次使用时自动从文章目录重建
+    reopened.article_index.close()
+    crawler.article_index.close()
+    os.remove(crawler.article_index.path)
+    rebuilt = WeChatArticleAdvancedCrawler(output_dir=crawler.output_dir)
+    assert FIXTURE_URL in rebuilt.article_index
+    assert rebuilt.rebuild_article_index() == 1
+    print("✅ 索引登记、持久化和重建正常")
+
+
+def test_canonical_article_dedup():
+    """短链接抓取后记住其长链接身份，各种URL形式的重复提交都被跳过"""
+    print("🔍 测试文章规范键去重...")
+    crawler = make_crawler()
+    crawler.offline = True
+    short_url = 'https://mp.weixin.qq.com/s/AbCdEf123'
+    html = dict(load_fixtures())['modern_article.html']
+    crawler.html_cache.put(crawler_key(short_url), html)
+
+    metadata = crawler.process_article(short_url)
+    assert metadata and all(metadata.get(name) for name in ('biz', 'mid', 'sn'))
+    biz = metadata['biz'].split('&')[0].split('#')[0]
+    long_url = (f"https://mp.weixin.qq.com/s?__biz={biz}&amp;mid={metadata['mid']}"
+                f"&amp;idx={metadata.get('idx', '1')}&amp;sn={metadata['sn']}&amp;chksm=ff01&scene=21#wechat_redirect")
+    assert long_url in crawler.article_index
+    assert canonical_article_url(long_url) in crawler.article_index
+
+    other = 'https://mp.weixin.qq.com/s?__biz=MzI0&mid=1&idx=2&sn=abc'
+    urls_file = os.path.join(crawler.output_dir, 'urls.txt')
+    with open(urls_file, 'w', encoding='utf-8') as f:
+        f.write('\n'.join([short_url, long_url, other, other + '&scene=21', short_url + '?from=timeline']))
+    assert crawler.read_urls_from_file(urls_file) == [other]
+
+    # 重新打开索引后映射依然有效
+    reopened = WeChatArticleAdvancedCrawler(output_dir=crawler.output_dir)
+    assert reopened.article_index.resolve_key(short_url) == crawler_key(long_url)
+    print("✅ 长短链接与跟踪参数去重正常")
+
+
+def test_adaptive_backoff():
+    """验证页和5xx触发退避重试且不进入缓存，并发上限随响应增减"""
+    print("🔍 测试自适应并发与退避...")
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from adaptive_limit import AdaptiveConcurrency, HostAdaptiveLimits, SIGNAL_OK, SIGNAL_THROTTLED
+
+    article = dict(load_fixtures())['modern_article.html']
+    responses = [
+        (200, '<html><body><p>当前环境异常，完成验证后即可继续访问。</p></body></html>'),
+        (503, 'busy'),
+        (200, article),
+    ]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, body = responses.pop(0) if responses else (404, '')
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        crawler = make_crawler()
+        crawler.adaptive_limits = HostAdaptiveLimits({'127.0.0.1': (2, 4)}, base_delay=0.01)
+        url = f'http://127.0.0.1:{server.server_port}/s/adaptive'
+        assert crawler.fetch_article_html(url) == article
+        assert crawler.html_cache.get(crawler_key(url)) == article
+        stats = crawler.adaptive_limits.get_stats()['127.0.0.1']
+        assert stats['throttled'] == 2 and stats['ok'] == 1 and stats['in_flight'] == 0
+        # 不存在的页面不重试
+        assert crawler.fetch_article_html(url + '_missing') is None and not responses
+        assert crawler.adaptive_limits.get_stats()['127.0.0.1']['fatal'] == 1
+    finally:
+        server.shutdown()
+
+    controller = AdaptiveConcurrency(initial=2, maximum=4, base_delay=0.01)
+    for _ in range(10):
+        controller.acquire()
+        controller.release(SIGNAL_OK)
+    assert controller.get_stats()['limit'] == 4
+    controller.acquire()
+    controller.acquire()
+    controller.release(SIGNAL_THROTTLED)
+    controller.release(SIGNAL_THROTTLED)  # 同一次过载只减一次
+    assert controller.get_stats()['limit'] == 2 and controller.reserve() > 0
+    print("✅ 退避重试与并发调整正常")
+
+
+def test_atomic_article_write():
+    """写文章中途出错时保留原文件，不留下临时文件"""
+    print("🔍 测试原子写文章...")
+    crawler = make_crawler()
+    crawler.offline = True
+    url = 'https://mp.weixin.qq.com/s/atomic'
+    crawler.html_cache.put(crawler_key(url), dict(load_fixtures())['modern_article.html'])
+    metadata = crawler.process_article(url)
+    assert metadata
+    before = _read_article_outputs(crawler.output_dir)
+    markdown_path = [path for path in before if path.endswith('.md')][0]
+    assert ''.join(crawler.iter_markdown_sections(metadata, 'x')) == crawler.generate_full_markdown(metadata, 'x')
+
+    def broken_sections(metadata, markdown_content):
+        yield "# 写到一半\n"
+        raise IOError("磁盘已满")
+
+    crawler.iter_markdown_sections = broken_sections
+    try:
+        crawler.write_article(metadata, '新内容', '新文本')
+        assert False, "应当抛出异常"
+    except IOError:
+        pass
+    after = _read_article_outputs(crawler.output_dir)
+    assert after[markdown_path] == before[markdown_path], "Markdown文件被写坏"
+    leftovers = [name for _, _, names in os.walk(crawler.output_dir) for name in names if name.endswith('.tmp')]
+    assert not leftovers, f"残留临时文件: {leftovers}"
+    print("✅ 中途失败时原文件完整")
+
+
+def test_corpus_storage():
+    """语料库模式：不建文章目录，按URL随机读取与逐文件模式内容一致，残缺尾部在重新打开时截掉"""
+    print("🔍 测试语料库存储...")
+    from article_corpus import ArticleCorpus
+
+    files_crawler = make_crawler()
+    corpus_crawler = WeChatArticleAdvancedCrawler(
+        output_dir=tempfile.mkdtemp(prefix='wechat_test_'), storage='corpus'
+    )
+    urls = []
+    for index, (name, html) in enumerate(load_fixtures()):
+        url = f'https://mp.weixin.qq.com/s/corpus{index}'
+        for crawler in (files_crawler, corpus_crawler):
+            crawler.offline = True
+            crawler.html_cache.put(crawler_key(url), html)
+            crawler.process_article(url)
+        urls.append(url)
+
+    entries = {name for name in os.listdir(corpus_crawler.output_dir) if not name.startswith(('.', '_'))}
+    assert not entries, f"语料库模式不应创建文章目录: {entries}"
+    expected = {lines[0]: lines for path, lines in _read_article_outputs(files_crawler.output_dir).items()
+                if path.endswith('.md')}
+    corpus = corpus_crawler.corpus
+    for url in urls:
+        record = corpus.get(url)
+        lines = [line for line in record['markdown'].splitlines() if '抓取时间' not in line]
+        assert expected[lines[0]] == lines
+        assert corpus.get(record['article_key'])['text'] == record['text']
+    assert len(corpus) == len(urls) and corpus.get('https://mp.weixin.qq.com/s/missing') is None
+
+    # 写到一半退出：未登记的尾部在重新打开时被截掉，之后继续追加
+    segment = corpus.segment_path(1)
+    size = os.path.getsize(segment)
+    with open(segment, 'ab') as f:
+        f.write(b'\x1f\x8b partial')
+    corpus.close()
+    reopened = ArticleCorpus(os.path.dirname(segment), segment_max_bytes=1)
+    assert os.path.getsize(segment) == size
+    reopened.append({'url': 'https://mp.weixin.qq.com/s/extra', 'title': 'extra'}, '# extra', 'extra')
+    assert reopened.get_stats()['segments'] == 2
+    assert [record['metadata']['url'] for record in reopened.iter_records()][-1].endswith('/extra')
+
+    corpus_crawler._corpus = reopened
+    assert corpus_crawler.rebuild_article_index() == len(urls) + 1
+
+    # 导出的文件名与逐文件模式相同
+    export_dir = tempfile.mkdtemp(prefix='wechat_export_')
+    exported = reopened.export(urls[0], export_dir)
+    safe = files_crawler.get_safe_title(reopened.get(urls[0])['metadata']['title'])
+    assert os.path.basename(exported) == f'{safe}.md'
+    assert os.path.exists(os.path.join(files_crawler.output_dir, safe, f'{safe}.md'))
+    title = '第1期：测试, 导出! 文件名?'
+    reopened.append({'url': 'https://mp.weixin.qq.com/s/punct', 'title': title}, '# punct', 'punct')
+    exported = reopened.export('https://mp.weixin.qq.com/s/punct', export_dir)
+    assert os.path.basename(exported) == f'{files_crawler.get_safe_title(title)}.md'
+    print(f"✅ {len(urls)} 篇文章写入 {reopened.get_stats()['segments']} 个分段，随机读取一致")
+
+
+def test_archive_summary():
+    """全库统计随写入累计，重复写入不重复计数，重建结果与累计一致"""
+    print("🔍 测试全库汇总统计...")
+    crawler = make_crawler()
+    crawler.offline = True
+    metadata_list = []
+    for index, (name, html) in enumerate(load_fixtures()):
+        url = f'https://mp.weixin.qq.com/s/summary{index}'
+        crawler.html_cache.put(crawler_key(url), html)
+        metadata_list.append(crawler.process_article(url))
+    # 重新处理同一篇文章
+    crawler.process_article('https://mp.weixin.qq.com/s/summary0')
+
+    summary = crawler.summary
+    totals = summary.totals()
+    assert totals['articles'] == len(metadata_list)
+    assert totals['chars'] == sum(meta['content_length'] for meta in metadata_list)
+    assert sum(count for _, count in summary.top_nicknames(100)) == len(metadata_list)
+    assert Counter(meta['nickname'] for meta in metadata_list) == Counter(dict(summary.top_nicknames(100)))
+
+    first_page, pages = summary.articles_page(1, 2)
+    assert len(first_page) == min(2, len(metadata_list)) and pages == (len(metadata_list) + 1) // 2
+    assert first_page[0]['url'] == 'https://mp.weixin.qq.com/s/summary0'
+
+    report_path = crawler.generate_summary_report(page_size=2)
+    with open(report_path, 'r', encoding='utf-8') as f:
+        assert f"总计抓取文章数: {len(metadata_list)}" in f.read()
+
+    accumulated = (totals, summary.top_nicknames(100), summary.recent_dates(100))
+    assert crawler.rebuild_summary() == len(metadata_list)
+    assert (summary.totals(), summary.top_nicknames(100), summary.recent_dates(100)) == accumulated
+    print(f"✅ {totals['articles']} 篇文章，{len(summary.top_nicknames(100))} 个公众号")
+
+
+def test_search_index():
+    """检索索引随写入增量更新，按BM25排序分页，重复写入不重复计数，重建结果一致"""
+    print("🔍 测试全文检索...")
+    crawler = make_crawler()
+    crawler.offline = True
+    fixtures = load_fixtures()
+    for index, (name, html) in enumerate(fixtures):
+        url = f'https://mp.weixin.qq.com/s/search{index}'
+        crawler.html_cache.put(crawler_key(url), html)
+        metadata = crawler.process_article(url)
+        assert '_search_terms' not in metadata
+    crawler.process_article('https://mp.weixin.qq.com/s/search0')
+    assert len(crawler.search_index) == len(fixtures)
+
+    # 用某篇文章标题中的词检索，该文章应排在第一
+    title = crawler.summary.articles_page(1, 1)[0][0]['title']
+    query = max(crawler.tokenize(title), key=len)
+    found = crawler.search(query)
+    assert found['total'] >= 1 and found['results'][0]['title'] == title
+    assert crawler.search('zzqxnonexistent')['total'] == 0
+
+    paged = crawler.search(query, page=1, page_size=1)
+    assert len(paged['results']) == 1 and paged['pages'] == found['total']
+
+    # 重新写入同一篇文章时旧索引行被删除，文档频率不重复计数，重建前后命中和得分完全一致
+    index = crawler.search_index
+    assert index._conn.execute("SELECT COUNT(*) FROM fts").fetchone()[0] == len(fixtures)
+    assert index._conn.execute("SELECT MAX(doc) FROM fts_vocab").fetchone()[0] <= len(fixtures)
+    incremental = crawler.search(query)['results']
+    assert crawler.rebuild_search_index() == len(fixtures)
+    assert crawler.search(query)['results'] == incremental
+
+    # 含标点的词（c++、node.js、it's）建索引和查询时都是一个词
+    punctuated = {'title': count_terms(['C++', '入门']), 'body': count_terms(['node.js', "it's", '语言'])}
+    index.add({'url': 'https://mp.weixin.qq.com/s/punctuated', 'title': 'C++入门'}, punctuated)
+    for word in ('c++', 'node.js', "it's"):
+        hits = index.search(count_terms([word]))['results']
+        assert [item['url'] for item in hits] == ['https://mp.weixin.qq.com/s/punctuated'], word
+
+    # 无内容表不保存词序列；重新登记时按保存的词频删除旧行，旧词不再命中
+    assert index._conn.execute("SELECT title, body FROM fts LIMIT 1").fetchone() == (None, None)
+    index.add({'url': 'https://mp.weixin.qq.com/s/punctuated', 'title': 'Rust入门'},
+              {'title': count_terms(['Rust', '入门']), 'body': count_terms(['语言'])})
+    assert index.search(count_terms(['c++']))['total'] == 0
+    assert index.search(count_terms(['rust']))['results'][0]['url'].endswith('/punctuated')
+    assert index._conn.execute("SELECT doc FROM fts_vocab WHERE term = 'node.js'").fetchone() is None
+    index._conn.execute("INSERT INTO fts (fts) VALUES ('integrity-check')")
+    print(f"✅ 查询 '{query}' 命中 {found['total']} 篇，耗时 {found['elapsed_ms']} ms")
+
+
+def test_corpus_idf():
+    """文档频率随写入增量累计，只读映射即时可见，文章数足够后TF-IDF改用本库IDF，重建结果一致"""
+    print("🔍 测试本库文档频率...")
+    from corpus_idf import CorpusIDF
+    crawler = make_crawler()
+    crawler.offline = True
+    crawler.idf_min_documents = 3
+    fixtures = load_fixtures()
+    assert crawler.tfidf_source() is None
+
+    reader = None
+    for index, (name, html) in enumerate(fixtures):
+        url = f'https://mp.weixin.qq.com/s/idf{index}'
+        crawler.html_cache.put(crawler_key(url), html)
+        crawler.process_article(url)
+        if reader is None:
+            reader = CorpusIDF.open_existing(os.path.join(crawler.output_dir, '.index', 'idf'))
+    crawler.process_article('https://mp.weixin.qq.com/s/idf0')
+    table = crawler.corpus_idf
+    assert table.documents == len(fixtures)
+
+    # 只读方与写入方映射同一文件，刷新后看到全部词和计数
+    reader.refresh()
+    assert reader.documents == len(fixtures)
+    assert reader.get_stats()['terms'] == table.get_stats()['terms']
+    terms = list(table._vocab)
+    assert all(reader.document_frequency(term) == table.document_frequency(term) for term in terms)
+
+    # 出现在更多文章中的词IDF更低
+    common = max(terms, key=table.document_frequency)
+    rare = min(terms, key=table.document_frequency)
+    assert table.idf(common) < table.idf(rare)
+
+    source = crawler.tfidf_source()
+    assert source is not None
+    tokens = crawler.tokenize(fixtures[0][1])
+    ranking = tfidf_keywords(tokens, 20, source)
+    assert ranking and ranking == sorted(ranking, key=lambda item: item[1], reverse=True)
+
+    before = {term: table.document_frequency(term) for term in terms}
+    assert crawler.rebuild_corpus_idf() == len(fixtures)
+    assert {term: table.document_frequency(term) for term in terms} == before
+    reader.refresh()
+    assert reader.document_frequency(common) == before[common]
+    reader.close()
+    print(f"✅ {table.documents} 篇文章，{table.get_stats()['terms']} 个词")
+
+
+def test_near_duplicate_reposts():
+    """转载文章在分词和下载图片前识别为近似重复，只登记为原文的别名，跳过的工作量计入统计"""
+    print("🔍 测试转载检测...")
+    from article_identity import article_key_from_metadata
+    from near_duplicates import simhash
+    crawler = make_crawler()
+    crawler.offline = True
+    html = dict(load_fixtures())['modern_article.html']
+    body = ''.join(f"<p>第{i}段：提示词里写清主体、风格、构图和光线，第{i}次修改时只说明需要改动的部分。</p>"
+                   for i in range(12))
+    original_html = html.replace('<blockquote>', body + '<blockquote>')
+    # 另一个公众号的转载：文章键不同，正文开头多一句转载说明
+    repost_html = (original_html.replace('MzA3MDMwOTcwMg==', 'MzkyOTk5OTk5OQ==')
+                   .replace('2649004894', '2650000001')
+                   .replace('<section><p>', '<section><p>本文转载自AI小小将。</p><p>'))
+
+    original_url = 'https://mp.weixin.qq.com/s/original'
+    repost_url = 'https://mp.weixin.qq.com/s/repost'
+    crawler.html_cache.put(crawler_key(original_url), original_html)
+    crawler.html_cache.put(crawler_key(repost_url), repost_html)
+
+    original = crawler.process_article(original_url)
+    assert original['simhash'] and 'duplicate_of' not in original
+    dirs_before = sorted(os.listdir(crawler.output_dir))
+
+    original_key = article_key_from_metadata(original, original_url)
+    repost = crawler.process_article(repost_url)
+    duplicate_of = repost['duplicate_of']
+    assert article_key_from_metadata(repost, repost_url) != original_key
+    assert duplicate_of['article_key'] == original_key
+    assert duplicate_of['url'] == original_url and duplicate_of['distance'] <= 3
+    assert 'keyword_analysis' not in repost and 'image_count' not in repost
+    assert sorted(os.listdir(crawler.output_dir)) == dirs_before
+    assert repost_url in crawler.article_index
+    assert crawler.article_index.resolve_key(repost_url) == original_key
+    assert crawler.article_index.resolve_key(repost['link']) == original_key
+
+    stats = crawler.near_duplicates.get_stats()
+    assert stats['duplicates'] == 1 and stats['images_skipped'] == 2
+    assert stats['chars_skipped'] == repost['content_length']
+
+    # 重新处理原文不算转载；内容不同的文章不会命中
+    again = crawler.process_article(original_url)
+    assert 'duplicate_of' not in again and again['simhash'] == original['simhash']
+    other = simhash(''.join(f"完全不同的内容第{i}行，讲的是数据库索引和查询优化。" for i in range(20)))
+    assert crawler.find_near_duplicate({'url': 'https://mp.weixin.qq.com/s/other'}, other) is None
+
+    assert crawler.rebuild_near_duplicates() == 1
+
+    # 转载没有元数据文件：重建文章索引或索引丢失后，转载仍登记为原文的别名，不会再次抓取
+    assert crawler.rebuild_article_index() == 2
+    assert repost_url in crawler.article_index
+    assert crawler.article_index.resolve_key(repost['link']) == original_key
+    crawler.article_index.close()
+    os.remove(os.path.join(crawler.output_dir, '.index', 'articles.sqlite3'))
+    reopened = WeChatArticleAdvancedCrawler(output_dir=crawler.output_dir)
+    assert repost_url in reopened.article_index
+    assert reopened.article_index.resolve_key(repost_url) == original_key
+    assert reopened.article_index.resolve_key(repost['link']) == original_key
+    print(f"✅ 转载与原文海明距离 {duplicate_of['distance']}，跳过 {stats['images_skipped']} 张图片")
+
+
+def test_stage_metrics():
+    """每篇文章的各阶段耗时写入元数据并计入直方图，计数器与实际处理一致，按Prometheus格式输出"""
+    print("🔍 测试各阶段耗时指标...")
+    crawler = make_crawler()
+    crawler.offline = True
+    fixtures = load_fixtures()
+    for index, (name, html) in enumerate(fixtures):
+        url = f'https://mp.weixin.qq.com/s/metrics{index}'
+        crawler.html_cache.put(crawler_key(url), html)
+        metadata = crawler.process_article(url)
+        timings = metadata['timings']
+        assert list(timings)[:4] == ['fetch', 'parse', 'metadata', 'content']
+        assert all(seconds >= 0 for seconds in timings.values())
+        with open(os.path.join(crawler.get_article_dir(metadata),
+                               f"{crawler.get_safe_title(metadata['title'])}_metadata.json"),
+                  'r', encoding='utf-8') as f:
+            assert json.load(f)['timings'] == timings
+    assert crawler.process_article('https://mp.weixin.qq.com/s/not_cached') is None
+
+    stats = crawler.metrics.get_stats()
+    counters = stats['counters']
+    assert counters['articles_processed'] == len(fixtures) and counters['articles_failed'] == 1
+    assert counters['html_cache_hits'] == len(fixtures)
+    assert stats['stages']['parse']['count'] == len(fixtures)
+    assert stats['stages']['write']['count'] == len(fixtures)
+
+    text = crawler.metrics.render([('queue_jobs', '任务数', [({'state': 'queued'}, 3)])])
+    samples = {}
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    parse_buckets = [value for name, value in samples.items()
+                     if name.startswith('wechat_crawler_stage_seconds_bucket{stage="parse"')]
+    assert parse_buckets == sorted(parse_buckets) and parse_buckets[-1] == len(fixtures)
+    assert samples['wechat_crawler_stage_seconds_count{stage="write"}'] == len(fixtures)
+    assert samples['wechat_crawler_articles_total{result="failed"}'] == 1
+    assert samples['wechat_crawler_queue_jobs{state="queued"}'] == 3
+    assert '# TYPE wechat_crawler_stage_seconds histogram' in text
+    print(f"✅ {len(samples)} 个指标样本")
+
+
+def test_threaded_markdown_conversion():
+    """多个线程同时转换Markdown，各自的结果与单线程转换一致"""
+    print("🔍 测试多线程Markdown转换...")
+    crawler = make_crawler()
+    pages = []
+    for name, html in load_fixtures():
+        content_div = BeautifulSoup(html, 'html.parser').find('div', {'id': 'js_content'})
+        if content_div:
+            pages.append(str(content_div))
+    expected = [crawler.h.handle(page) for page in pages]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for _ in range(5):
+            jobs = [page for page in pages for _ in range(4)]
+            results = list(executor.map(lambda page: crawler.h.handle(page), jobs))
+            assert results == [markdown for markdown in expected for _ in range(4)]
+    print(f"✅ {len(pages)} 个页面 × 4 线程 × 5 轮结果一致")
+
+
+def test_text_indexes_single_pass():
+    """已有文章的库新建检索索引、文档频率表和转载检测索引时只读一遍正文，在启动步骤中完成，写文章时不读全库"""
+    print("🔍 测试检索索引与文档频率一次建立...")
+    import shutil
+    crawler = make_crawler()
+    crawler.offline = True
+    fixtures = load_fixtures()
+    for index, (name, html) in enumerate(fixtures):
+        url = f'https://mp.weixin.qq.com/s/textindex{index}'
+        crawler.html_cache.put(crawler_key(url), html)
+        crawler.process_article(url)
+    fingerprinted = len(crawler.near_duplicates)
+    crawler.search_index.close()
+    crawler.corpus_idf.close()
+    crawler.near_duplicates.close()
+    os.remove(os.path.join(crawler.output_dir, '.index', 'search.sqlite3'))
+    os.remove(os.path.join(crawler.output_dir, '.index', 'near_duplicates.sqlite3'))
+    shutil.rmtree(os.path.join(crawler.output_dir, '.index', 'idf'))
+
+    upgraded = WeChatArticleAdvancedCrawler(output_dir=crawler.output_dir, offline=True)
+    passes = []
+    archive_texts = upgraded._archive_texts
+
+    def counting_archive_texts():
+        passes.append(1)
+        return archive_texts()
+
+    upgraded._archive_texts = counting_archive_texts
+    # 写入路径上只增量登记，不读全库
+    url = f'https://mp.weixin.qq.com/s/textindex{len(fixtures)}'
+    page = dict(fixtures)['modern_article.html'].replace('8f3c2b1a9d', '8f3c2b1a9e').replace('</h1>', '（续）</h1>', 1)
+    upgraded.html_cache.put(crawler_key(url), page)
+    assert upgraded.process_article(url).get('simhash')
+    assert not passes and upgraded.corpus_idf.documents == 1
+
+    assert upgraded.prepare_text_indexes() == len(fixtures) + 1
+    assert len(passes) == 1
+    assert len(upgraded.search_index) == upgraded.corpus_idf.documents == len(fixtures) + 1
+    assert len(upgraded.near_duplicates) == fingerprinted + 1
+    assert upgraded.prepare_text_indexes() == 0 and len(passes) == 1
+
+    # 只缺转载检测索引时只计算指纹，不重新分词
+    upgraded.near_duplicates.close()
+    os.remove(os.path.join(upgraded.output_dir, '.index', 'near_duplicates.sqlite3'))
+    upgraded._near_duplicates = None
+    upgraded.tokenize = None
+    assert upgraded.prepare_text_indexes() == fingerprinted + 1 and len(passes) == 2
+    assert len(upgraded.near_duplicates) == fingerprinted + 1
+    print(f"✅ {len(fixtures) + 1} 篇文章读一遍正文建立三个索引")
+
+
+def test_unfingerprintable_body():
+    """正文只有表情和标点时没有指纹：文章照常写出，不做转载检测，重建指纹时跳过"""
+    print("🔍 测试无指纹正文...")
+    crawler = make_crawler()
+    crawler.offline = True
+    body = '<p>' + '！？…… 😀🎉👍 ——' * 40 + '</p>'
+    html = ('<html><head><meta charset="utf-8"></head><body><h1 id="activity-name">表情包</h1>'
+            f'<div id="js_content">{body}</div></body></html>')
+    url = 'https://mp.weixin.qq.com/s/emoji_only'
+    crawler.html_cache.put(crawler_key(url), html)
+
+    metadata = crawler.process_article(url)
+    assert metadata and metadata['content_length'] >= 200
+    assert 'simhash' not in metadata and 'duplicate_of' not in metadata
+    assert crawler.rebuild_near_duplicates() == 0
+    print("✅ 无指纹文章正常写出")
+
+
+def test_shared_session_reuse():
+    """同一线程的多次抓取复用同一个Session和keep-alive连接"""
+    print("🔍 测试连接复用...")
+    article = dict(load_fixtures())['modern_article.html'].encode('utf-8')
+    crawler = WeChatArticleAdvancedCrawler(output_dir=tempfile.mkdtemp(prefix='wechat_test_'),
+                                           html_cache_max_bytes=0)
+    with local_server(lambda path: (200, {'Content-Type': 'text/html; charset=utf-8'}, article)) as base:
+        session = crawler.http._session()
+        for index in range(3):
+            assert crawler.fetch_article_html(f'{base}/s/session{index}')
+            assert crawler.http._session() is session
+    stats = crawler.http.get_stats()
+    assert stats['requests'] == 3 and stats['handshakes'] == 1 and stats['reused'] == 2
+    print(f"✅ 3 次请求 1 次建连，复用率 {stats['reuse_rate']:.0%}")
+
+
+def test_concurrent_image_order():
+    """图片并发下载、乱序完成，Markdown中的图片引用仍按正文顺序排列"""
+    print("🔍 测试并发图片下载顺序...")
+    import re
+    import time
+    count = 6
+
+    def respond(path):
+        index = int(path.rsplit('/', 1)[1].split('.')[0])
+        # 越靠前的图片返回越慢，完成顺序与文档顺序相反
+        time.sleep((count - index) * 0.03)
+        return 200, {'Content-Type': 'image/png'}, f'image-{index}'.encode() * 50
+
+    crawler = make_crawler()
+    crawler.image_concurrency = count
+    with local_server(respond) as base:
+        html = '<div id="js_content">' + ''.join(
+            f'<p>第{index}张</p><img data-src="{base}/img/{index}.png">' for index in range(count)
+        ) + '</div>'
+        content_div = BeautifulSoup(html, 'html.parser').find('div', {'id': 'js_content'})
+        article_dir = os.path.join(crawler.output_dir, 'order')
+        os.makedirs(article_dir)
+        records = crawler.download_article_images(content_div, article_dir)
+
+    assert [record['url'] for record in records] == [f'{base}/img/{index}.png' for index in range(count)]
+    expected = [crawler._image_reference(crawler.image_store.lookup(record['url']), article_dir)
+                for record in records]
+    assert all(expected) and len(set(expected)) == count
+    markdown = crawler.h.handle(str(content_div))
+    assert re.findall(r'!\[\]\(([^)]+)\)', markdown) == expected
+    assert [int(n) for n in re.findall(r'第(\d+)张', markdown)] == list(range(count))
+    print(f"✅ {count} 张图片并发下载，引用顺序与正文一致")
+
+
+def test_token_bucket_rate():
+    """令牌桶：先用完桶内令牌，之后按速率顺延；空闲时令牌恢复但不超过容量；按主机选桶"""
+    print("🔍 测试令牌桶限速...")
+    from rate_limit import HostRateLimiter, TokenBucket
+    now = [100.0]
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=lambda: now[0])
+
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # 令牌用完后每个请求比前一个多等 1/rate 秒
+    assert [bucket.reserve() for _ in range(3)] == [0.5, 1.0, 1.5]
+    # 1秒后补回2个令牌，仍欠2个
+    now[0] += 1.0
+    assert bucket.reserve() == 1.0
+    # 长时间空闲后最多攒满容量
+    now[0] += 60
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.0, 0.5]
+
+    # 请求方按返回的时间等待后立即发下一个：10秒内放行 容量 + 2个/秒 × 10秒
+    now[0] += 60
+    start = now[0]
+    sent = 0
+    while True:
+        now[0] += bucket.reserve()
+        if now[0] > start + 10:
+            break
+        sent += 1
+    assert sent == 3 + 20
+
+    limiter = HostRateLimiter({'mp.weixin.qq.com': (1.0, 1), 'qpic.cn': (5.0, 5)})
+    assert limiter.bucket_for('https://mp.weixin.qq.com/s/abc') is limiter.buckets['mp.weixin.qq.com']
+    assert limiter.bucket_for('https://mmbiz.qpic.cn/a.png') is limiter.buckets['qpic.cn']
+    assert limiter.bucket_for('https://example.com/') is None
+    print("✅ 令牌桶速率与容量正确")
+
+
+def test_engine_throttles_cache_refetch():
+    """缓存中是验证页时重新联网抓取，仍要取文章页主机的令牌"""
+    print("🔍 测试缓存验证页重新抓取限速...")
+    from crawl_engine import AsyncCrawlEngine
+    from rate_limit import HostRateLimiter, TokenBucket
+    article = dict(load_fixtures())['script_only.html']
+    crawler = make_crawler()
+    limiter = HostRateLimiter({})
+    bucket = limiter.buckets['127.0.0.1'] = TokenBucket(rate=1.0, capacity=10, clock=lambda: 0.0)
+    crawler.rate_limiter = crawler.http.rate_limiter = limiter
+
+    with local_server(lambda path: (200, {'Content-Type': 'text/html; charset=utf-8'},
+                                    article.encode('utf-8'))) as base:
+        cached_url, verification_url, fresh_url = (f'{base}/s/{name}' for name in ('cached', 'verify', 'fresh'))
+        crawler.html_cache.put(crawler_key(cached_url), article)
+        crawler.html_cache.put(crawler_key(verification_url),
+                               '<html><body><p>当前环境异常，完成验证后即可继续访问。</p></body></html>')
+        results = AsyncCrawlEngine(crawler, concurrency=3).crawl([cached_url, verification_url, fresh_url])
+
+    assert all(metadata for _, metadata in results)
+    # 真正命中缓存的不取令牌，验证页重新抓取和未缓存的各取一个
+    assert bucket._tokens == 8
+    assert crawler.http.get_stats()['requests'] == 2
+    print("✅ 缓存验证页的重新抓取经过限速")
+
+
+def test_content_addressed_images():
+    """相同内容的图片来自不同URL（Content-Type也不同）时只存一份，两篇文章引用同一路径"""
+    print("🔍 测试内容寻址图片库...")
+    data = b'\x89PNG same image bytes' * 100
+    types = {'/a/logo.png': 'image/png', '/b/logo.jpg': 'image/jpeg'}
+    crawler = make_crawler()
+    with local_server(lambda path: (200, {'Content-Type': types[path.split('?')[0]]}, data)) as base:
+        refs = []
+        for name, path in zip(('first', 'second'), types):
+            article_dir = os.path.join(crawler.output_dir, name)
+            os.makedirs(article_dir)
+            refs.append(crawler.download_wechat_image(base + path, article_dir))
+        # 再次引用已入库的URL不再下载
+        requests_before = crawler.http.get_stats()['requests']
+        assert crawler.download_wechat_image(base + '/a/logo.png?timestamp=1', article_dir) == refs[1]
+        assert crawler.http.get_stats()['requests'] == requests_before
+
+    images_dir = os.path.join(crawler.output_dir, '_images')
+    files = [os.path.relpath(os.path.join(root, name), images_dir)
+             for root, dirs, names in os.walk(images_dir) if '.tmp' not in root
+             for name in names if name != 'url_index.jsonl']
+    assert len(files) == 1, files
+    assert refs[0] == refs[1] and refs[0].endswith(files[0].replace(os.sep, '/'))
+    assert os.path.basename(files[0]).split('.')[0] == hashlib.sha256(data).hexdigest()
+    stats = crawler.image_store.stats
+    assert stats['stored'] == 1 and stats['content_duplicates'] == 1 and stats['url_hits'] == 1
+    print(f"✅ 2 个URL共用 {files[0]}")
+
+
+def test_html_cache_lru():
+    """HTML缓存：读写内容一致，超出容量时淘汰最久未访问的条目，读取会刷新访问顺序，重开后顺序保留"""
+    print("🔍 测试HTML缓存...")
+    import random
+    from html_cache import HTMLCache
+    root = tempfile.mkdtemp(prefix='wechat_cache_')
+    rng = random.Random(5)
+    pages = {f'key{index}': '<html><body>' + ''.join(rng.choice('甲乙丙丁戊己庚辛壬癸')
+                                                     for _ in range(3000)) + '</body></html>'
+             for index in range(4)}
+
+    cache = HTMLCache(root, max_bytes=10 ** 9)
+    cache.put('key0', pages['key0'])
+    entry_size = cache.get_stats()['bytes']
+    cache.max_bytes = int(entry_size * 3.5)
+    for key in ('key1', 'key2'):
+        cache.put(key, pages[key])
+    assert cache.get('key0') == pages['key0']  # 读取后key0成为最近使用
+    cache.put('key3', pages['key3'])
+
+    assert 'key1' not in cache and cache.get('key1') is None
+    assert all(cache.get(key) == pages[key] for key in ('key0', 'key2', 'key3'))
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1 and stats['entries'] == 3 and stats['bytes'] <= cache.max_bytes
+    assert len([name for name in os.listdir(root) if name.endswith('.html.gz')]) == 3
+
+    # 重新打开后按文件时间恢复顺序：最久未访问的key2先被淘汰
+    for key in ('key0', 'key3'):
+        os.utime(os.path.join(root, cache._filename(key)), (2_000_000_000, 2_000_000_000))
+    reopened = HTMLCache(root, max_bytes=cache.max_bytes)
+    reopened.put('key1', pages['key1'])
+    assert 'key2' not in reopened and all(key in reopened for key in ('key0', 'key1', 'key3'))
+
+    # 验证页不进入缓存，旧版本缓存的验证页不会被当作命中
+    verification = '<html><body><p>当前环境异常，完成验证后即可继续访问。</p></body></html>'
+    crawler = make_crawler()
+    crawler.max_retries = 2
+    crawler.adaptive_limits.base_delay = 0.01
+    with local_server(lambda path: (200, {'Content-Type': 'text/html; charset=utf-8'},
+                                    verification.encode('utf-8'))) as base:
+        url = f'{base}/s/verify'
+        assert crawler.fetch_article_html(url) is None
+        assert crawler_key(url) not in crawler.html_cache
+        crawler.html_cache.put(crawler_key(url), verification)
+        crawler.offline = True
+        assert crawler.fetch_article_html(url) is None
+    assert crawler.metrics.get_stats()['counters']['html_cache_hits'] == 0
+    print(f"✅ 单条约 {entry_size} 字节，容量 {cache.max_bytes} 字节时保留 3 条")
+
+
+def test_request_error_signals():
+    """只有超时和连接失败算过载：其他请求错误不重试、不降低并发上限，data:图片不下载"""
+    print("🔍 测试请求错误分类...")
+    from adaptive_limit import HostAdaptiveLimits
+
+    crawler = make_crawler()
+    crawler.max_retries = 3
+    crawler.adaptive_limits = HostAdaptiveLimits({'127.0.0.1': (2, 4)}, base_delay=0.01)
+    counters = crawler.metrics.get_stats()['counters']
+
+    # data: 地址请求时抛出 InvalidSchema，不重试
+    assert crawler.get_with_backoff('data:image/png;base64,iVBORw0KGgo=') is None
+    # 重定向循环（TooManyRedirects）同样不重试，并发上限不变
+    with local_server(lambda path: (302, {'Location': path}, b'')) as base:
+        assert crawler.get_with_backoff(f'{base}/loop') is None
+    stats = crawler.adaptive_limits.get_stats()['127.0.0.1']
+    counters = crawler.metrics.get_stats()['counters']
+    assert stats['limit'] == 2 and stats['fatal'] == 1 and stats['throttled'] == 0
+    assert counters.get('retries', 0) == 0 and counters['request_failures'] == 2
+
+    # 连接失败仍按过载退避重试
+    with local_server(lambda path: (200, {}, b'')) as base:
+        closed = base
+    assert crawler.get_with_backoff(f'{closed}/gone') is None
+    stats = crawler.adaptive_limits.get_stats()['127.0.0.1']
+    assert stats['throttled'] == 3 and stats['limit'] == 1
+    assert crawler.metrics.get_stats()['counters']['retries'] == 2
+
+    # 懒加载占位的 data: 图片跳过，有真实地址时取真实地址
+    content = BeautifulSoup(
+        '<div><img src="data:image/svg+xml,%3Csvg%3E%3C/svg%3E">'
+        '<img data-src="https://mmbiz.qpic.cn/a/640" src="data:image/gif;base64,R0lGOD">'
+        '<img src="blob:https://mp.weixin.qq.com/1"></div>', 'html.parser')
+    assert crawler.content_image_urls(content) == ['https://mmbiz.qpic.cn/a/640']
+    print("✅ 请求错误分类正常")
+
+
+def main():
+    print("="*50)
+    print("🧪 爬虫核心离线测试")
+    print("="*50)
+
+    tests = [
+        ("元数据快速路径", test_metadata_fast_path_parity),
+        ("解析后端一致性", test_parser_backends_agree),
+        ("部分解析一致性", test_partial_parse_identical),
+        ("关键词加权计分", test_indexed_keyword_scores),
+        ("单次分词TF-IDF", test_single_pass_tfidf),
+        ("流水线抓取", test_pipeline_matches_process_article),
+        ("已处理文章索引", test_article_index),
+        ("文章规范键去重", test_canonical_article_dedup),
+        ("自适应并发与退避", test_adaptive_backoff),
+        ("原子写文章", test_atomic_article_write),
+        ("语料库存储", test_corpus_storage),
+        ("全库汇总统计", test_archive_summary),
+        ("全文检索", test_search_index),
+        ("检索索引与文档频率一次建立", test_text_indexes_single_pass),
+        ("本库文档频率", test_corpus_idf),
+        ("转载检测", test_near_duplicate_reposts),
+        ("无指纹正文", test_unfingerprintable_body),
+        ("各阶段耗时指标", test_stage_metrics),
+        ("多线程Markdown转换", test_threaded_markdown_conversion),
+        ("连接复用", test_shared_session_reuse),
+        ("并发图片下载顺序", test_concurrent_image_order),
+        ("令牌桶限速", test_token_bucket_rate),
+        ("缓存验证页重新抓取限速", test_engine_throttles_cache_refetch),
+        ("内容寻址图片库", test_content_addressed_images),
+        ("HTML缓存", test_html_cache_lru),
+        ("请求错误分类", test_request_error_signals),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"\n{'='*20} {test_name} {'='*20}")
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test_name} 失败: {e}")
+        except Exception as e:
+            print(f"❌ {test_name} 出现异常: {e}")
+
+    print("\n" + "="*50)
+    print(f"🎯 测试结果: {passed}/{len(tests)} 通过")
+    print("="*50)
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,8 +6,21 @@ NAS服务测试脚本
 
 import sys
 import os
+import tempfile
 import time
 
+
+def make_service(tmp_dir):
+    """输出目录、URL文件和日志都放在临时目录下的服务，不写入真实的任务队列和文章目录"""
+    sys.path.append('.')
+    from simple_nas_service import SimpleNASService
+    return SimpleNASService(config={
+        'output_dir': os.path.join(tmp_dir, 'wechat_articles'),
+        'urls_file': os.path.join(tmp_dir, 'urls.txt'),
+        'log_file': os.path.join(tmp_dir, 'service.log'),
+    })
+
+
 def test_dependencies():
     """测试依赖包"""
     print("🔍 测试Python依赖包...")
@@ -60,10 +73,8 @@ def test_url_extraction():
     print("\n🔗 测试URL提取功能...")
     
     try:
-        sys.path.append('.')
-        from simple_nas_service import SimpleNASService
-        
-        service = SimpleNASService()
+        tmp = tempfile.TemporaryDirectory(prefix='service_test_')
+        service = make_service(tmp.name)
         
         test_content = """
         这是一些测试内容
@@ -73,6 +84,8 @@ def test_url_extraction():
         """
         
         urls = service.extract_urls(test_content)
+        service.jobs.close()
+        tmp.cleanup()
         
         if len(urls) >= 2:
             print("✅ URL提取功能正常")
@@ -87,6 +100,193 @@ def test_url_extraction():
         print(f"❌ URL提取测试失败: {e}")
         return False
 
+def test_fast_startup():
+    """测试快速启动：状态接口不触发爬虫创建，预热后记录各步骤耗时"""
+    print("\n⏱️ 测试快速启动...")
+    
+    try:
+        from simple_nas_service import create_web_app
+        
+        tmp = tempfile.TemporaryDirectory(prefix='service_test_')
+        service = make_service(tmp.name)
+        client = create_web_app(service).test_client()
+        
+        status = client.get('/api/status').get_json()
+        if status['warmed_up'] or service._crawler is not None:
+            print("❌ 状态查询提前创建了爬虫")
+            return False
+        
+        service.warm_up()
+        timings = client.get('/api/status').get_json()['startup_timings']
+        service.jobs.close()
+        tmp.cleanup()
+        if service.warmed_up and 'crawler_init' in timings and 'jieba_dict' in timings:
+            print("✅ 快速启动正常")
+            for step, elapsed in timings.items():
+                print(f"   {step}: {elapsed:.3f}s")
+            return True
+        else:
+            print("❌ 预热未完成")
+            return False
+            
+    except Exception as e:
+        print(f"❌ 快速启动测试失败: {e}")
+        return False
+
+def test_url_inbox():
+    """测试收件箱增量读取：只读新增内容，提交后偏移量持久化，轮转不丢追加的URL"""
+    print("\n📥 测试URL收件箱...")
+    
+    try:
+        sys.path.append('.')
+        from url_inbox import URLInbox
+        
+        tmp_dir = tempfile.mkdtemp(prefix='inbox_test_')
+        urls_file = os.path.join(tmp_dir, 'urls.txt')
+        state_file = os.path.join(tmp_dir, 'state', 'offset.json')
+        with open(urls_file, 'w', encoding='utf-8') as f:
+            f.write("https://mp.weixin.qq.com/s/a\nhttps://mp.weixin.qq.com/s/b")
+        
+        inbox = URLInbox(urls_file, state_file)
+        uncommitted = inbox.read_new()
+        # 未提交就退出：重新打开后再读一遍
+        inbox = URLInbox(urls_file, state_file)
+        first = inbox.read_new()
+        inbox.commit()
+        # 重新打开后从持久化的位置继续，未写完的行此时才读取
+        inbox = URLInbox(urls_file, state_file)
+        rest = inbox.read_new(final=True)
+        with open(urls_file, 'a', encoding='utf-8') as f:
+            f.write("\nhttps://mp.weixin.qq.com/s/c\n")
+        appended = inbox.read_new()
+        inbox.commit()
+        
+        # 模拟轮转中途退出：旧文件中还有未读内容
+        with open(urls_file, 'a', encoding='utf-8') as f:
+            f.write("https://mp.weixin.qq.com/s/d\n")
+        os.replace(urls_file, urls_file + '.rotating')
+        open(urls_file, 'w').close()
+        inbox = URLInbox(urls_file, state_file)
+        recovered = inbox.read_new()
+        inbox.commit()
+        
+        ok = (uncommitted == first == "https://mp.weixin.qq.com/s/a\n"
+              and rest == "https://mp.weixin.qq.com/s/b"
+              and appended == "\nhttps://mp.weixin.qq.com/s/c\n"
+              and recovered == "https://mp.weixin.qq.com/s/d\n")
+        
+        inbox = URLInbox(urls_file, state_file)
+        with open(urls_file, 'a', encoding='utf-8') as f:
+            f.write("https://mp.weixin.qq.com/s/e\n")
+        ok = ok and not os.path.exists(urls_file + '.rotating')
+        ok = ok and inbox.read_new() == "https://mp.weixin.qq.com/s/e\n"
+        inbox.commit()
+        ok = ok and inbox.rotate_if_drained() == "" and os.path.getsize(urls_file) == 0
+        inbox.commit()
+        ok = ok and inbox.offset == 0
+        
+        if ok:
+            print("✅ 收件箱增量读取正常")
+            return True
+        else:
+            print("❌ 收件箱读取结果异常")
+            return False
+            
+    except Exception as e:
+        print(f"❌ 收件箱测试失败: {e}")
+        return False
+
+def test_job_queue():
+    """测试任务队列：重启后恢复处理中的任务，失败重试，队列满时拒绝；提交接口"""
+    print("\n🗂️ 测试任务队列...")
+    
+    try:
+        sys.path.append('.')
+        from job_queue import JobQueue
+        from simple_nas_service import create_web_app
+        
+        db_path = os.path.join(tempfile.mkdtemp(prefix='jobs_test_'), 'jobs.sqlite3')
+        jobs = JobQueue(db_path, max_pending=2, max_attempts=2)
+        submitted = jobs.submit([
+            "https://mp.weixin.qq.com/s/a",
+            "https://mp.weixin.qq.com/s/a",
+            "https://mp.weixin.qq.com/s/b",
+            "https://mp.weixin.qq.com/s/c",
+        ])
+        claimed = jobs.claim(1)
+        jobs.close()
+        
+        # 模拟处理中途退出：重新打开后处理中的任务回到队列
+        jobs = JobQueue(db_path, max_pending=2, max_attempts=2)
+        recovered = jobs.recover()
+        first_id, _ = jobs.claim(1)[0]
+        retry_state = jobs.fail(first_id, 'timeout')
+        ok = (len(submitted['accepted']) == 2 and len(submitted['duplicates']) == 1
+              and submitted['rejected'] == ["https://mp.weixin.qq.com/s/c"]
+              and claimed[0][1] == "https://mp.weixin.qq.com/s/a"
+              and recovered == 1 and retry_state == 'failed')
+        jobs.close()
+        
+        # 提交接口写入临时目录下的任务队列，不会留下真实服务启动后要抓取的任务
+        tmp = tempfile.TemporaryDirectory(prefix='service_test_')
+        # 已有文章索引时提交只打开索引去重，不创建爬虫
+        from article_index import ArticleIndex
+        ArticleIndex(os.path.join(tmp.name, 'wechat_articles', '.index', 'articles.sqlite3')).close()
+        service = make_service(tmp.name)
+        client = create_web_app(service).test_client()
+        url = "https://mp.weixin.qq.com/s/job_queue_test"
+        response = client.post('/api/submit', json={'urls': [url]})
+        queued = response.get_json()
+        ok = ok and response.status_code == 202 and queued['accepted'] == [url]
+        ok = ok and service._crawler is None
+        ok = ok and client.post('/api/submit', data="没有链接").status_code == 400
+        service.jobs.max_pending = 0
+        full = client.post('/api/submit', data="https://mp.weixin.qq.com/s/job_queue_full")
+        ok = ok and full.status_code == 429 and 'queue' in client.get('/api/status').get_json()
+        service.jobs.close()
+        tmp.cleanup()
+        
+        if ok:
+            print("✅ 任务队列正常")
+            return True
+        else:
+            print("❌ 任务队列结果异常")
+            return False
+            
+    except Exception as e:
+        print(f"❌ 任务队列测试失败: {e}")
+        return False
+
+def test_metrics_endpoint():
+    """测试指标接口：Prometheus文本格式，爬虫未创建时也可读取"""
+    print("\n📈 测试指标接口...")
+    
+    try:
+        from simple_nas_service import create_web_app
+        
+        tmp = tempfile.TemporaryDirectory(prefix='service_test_')
+        service = make_service(tmp.name)
+        client = create_web_app(service).test_client()
+        response = client.get('/api/metrics')
+        text = response.get_data(as_text=True)
+        ok = (response.status_code == 200 and response.content_type.startswith('text/plain')
+              and '# TYPE wechat_crawler_stage_seconds histogram' in text
+              and 'wechat_crawler_queue_jobs{state="queued"}' in text
+              and service._crawler is None)
+        service.jobs.close()
+        tmp.cleanup()
+        
+        if ok:
+            print("✅ 指标接口正常")
+            return True
+        else:
+            print("❌ 指标接口结果异常")
+            return False
+            
+    except Exception as e:
+        print(f"❌ 指标接口测试失败: {e}")
+        return False
+
 def test_directories():
     """测试目录创建"""
     print("\n📂 测试目录创建...")
@@ -143,6 +343,10 @@ def main():
         ("文件权限检查", test_file_access), 
         ("目录操作测试", test_directories),
         ("URL提取测试", test_url_extraction),
+        ("快速启动测试", test_fast_startup),
+        ("URL收件箱测试", test_url_inbox),
+        ("任务队列测试", test_job_queue),
+        ("指标接口测试", test_metrics_endpoint),
         ("网络连接测试", test_network)
     ]
     
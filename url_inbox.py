@@ -0,0 +1,109 @@
+"""
+URL收件箱文件的增量读取
+记录已读取到的字节位置并持久化，每次只读取新追加的完整行；
+读完后把文件换成新的空文件（改名轮转而非截断），轮转瞬间追加到旧文件的内容也会被读出，
+任何时刻写入的URL都不会被清掉。读取位置在调用方保存好URL后再提交，中途退出不丢内容
+"""
+
+import json
+import os
+import threading
+
+
+class URLInbox:
+    """单个urls.txt的增量读取器，线程安全"""
+
+    def __init__(self, path, state_path):
+        self.path = path
+        self.state_path = state_path
+        os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+        self._rotating_path = path + '.rotating'
+        self._lock = threading.Lock()
+        # offset 为已提交（持久化）的位置，_read_offset 为已读取但尚未提交的位置
+        self.offset = self._load_offset()
+        self._read_offset = self.offset
+        self._rotating = False
+
+    def _load_offset(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if state.get('path') != os.path.abspath(self.path):
+            return 0
+        return int(state.get('offset', 0))
+
+    def _save_offset(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'path': os.path.abspath(self.path), 'offset': self.offset}, f)
+        os.replace(tmp_path, self.state_path)
+
+    @staticmethod
+    def _read_lines_from(path, offset, final=False):
+        """读取offset之后的完整行，返回 (文本, 新offset)；final为True时连同末尾不完整的行"""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        if not final:
+            end = data.rfind(b'\n') + 1
+            data = data[:end]
+        return data.decode('utf-8', errors='replace'), offset + len(data)
+
+    def read_new(self, final=False):
+        """
+        读取上次之后新追加的完整行；文件被改短（用户重写）时从头读取。
+        final为True时末尾没有换行的最后一行也一并读取（写入已停止时使用）。
+        读取位置在 commit() 后才持久化，提交前退出会在重启后重新读取
+        """
+        with self._lock:
+            # 上次轮转后未提交就退出：先读完旧文件剩余内容
+            recovered = ''
+            if os.path.exists(self._rotating_path) and not self._rotating:
+                recovered, _ = self._read_lines_from(self._rotating_path, self.offset, final=True)
+                self._rotating = True
+                self._read_offset = 0
+
+            if not os.path.exists(self.path):
+                return recovered
+            if os.path.getsize(self.path) < self._read_offset:
+                self._read_offset = 0
+            text, self._read_offset = self._read_lines_from(self.path, self._read_offset, final)
+            return recovered + text
+
+    def rotate_if_drained(self):
+        """
+        文件已全部读完并提交时换成新的空文件，返回轮转期间追加到旧文件的内容，
+        调用方处理后同样需要 commit()。末尾还有未写完的行时不轮转，等写完后再读
+        """
+        with self._lock:
+            if self._rotating or self._read_offset != self.offset or self.offset == 0:
+                return ''
+            if not os.path.exists(self.path) or os.path.getsize(self.path) != self.offset:
+                return ''
+
+            os.replace(self.path, self._rotating_path)
+            open(self.path, 'a', encoding='utf-8').close()
+
+            text, _ = self._read_lines_from(self._rotating_path, self.offset, final=True)
+            self._rotating = True
+            self._read_offset = 0
+            return text
+
+    def commit(self):
+        """读取到的内容已交给调用方保存后，持久化读取位置并删除轮转出的旧文件"""
+        with self._lock:
+            if self._rotating:
+                if os.path.exists(self._rotating_path):
+                    os.remove(self._rotating_path)
+                self._rotating = False
+            self.offset = self._read_offset
+            self._save_offset()
+
+    def rewind(self):
+        """放弃未提交的读取（调用方暂时无法接收），下次从已提交的位置重新读取"""
+        with self._lock:
+            self._read_offset = self.offset
+            # 已轮转时旧文件还在，下次读取按中途退出的情形从旧文件恢复
+            self._rotating = False
@@ -1,31 +1,131 @@
 import os
 import re
-import requests
-from bs4 import BeautifulSoup
-import html2text
 from datetime import datetime
 import time
-import json
+import threading
 from collections import Counter
-import jieba
-import jieba.analyse
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from bs4 import BeautifulSoup
+
+from http_pool import PooledSession
+from image_store import ImageStore
+from html_cache import HTMLCache
+from article_identity import article_key_from_metadata, canonical_article_key, dedupe_article_urls, safe_title
+from article_index import ArticleIndex, iter_archive_metadata
+from metadata_scanner import scan_script_vars
+from keyword_scoring import tfidf_keywords, weighted_keyword_scores
+from html_parsers import parse_article_html, release_tree, resolve_backend
+from atomic_write import write_json_atomic, write_text_atomic
+from search_index import count_terms
+from near_duplicates import MIN_CHARS, simhash
+from metrics import CrawlMetrics
+from rate_limit import HostRateLimiter
+from adaptive_limit import (HostAdaptiveLimits, SIGNAL_FATAL, SIGNAL_OK, SIGNAL_THROTTLED,
+                            backoff_delay, classify_status, is_verification_page)
+
+# 重建转载检测索引时登记指纹用到的元数据字段（文章键由 biz/mid/idx/sn 或URL得到）
+_FINGERPRINT_FIELDS = ('url', 'title', 'biz', 'mid', 'idx', 'sn')
+
+# 带有 http/https 以外协议的图片地址（data:、blob: 等）
+_NON_HTTP_SCHEME_RE = re.compile(r'(?!https?:)[a-z][a-z0-9+.\-]*:', re.IGNORECASE)
+
+
+def new_html2text():
+    """新建一个html2text转换器（HTML2Text是有状态的HTMLParser，同一实例不能并发使用）"""
+    import html2text
+    converter = html2text.HTML2Text()
+    converter.ignore_links = False
+    converter.bypass_tables = False
+    return converter
 
 
 class WeChatArticleAdvancedCrawler:
-    def __init__(self, output_dir='wechat_articles'):
+    def __init__(self, output_dir='wechat_articles', pool_sizes=None, image_concurrency=8,
+                 rate_limits=None, html_cache_max_bytes=512 * 1024 * 1024, offline=False,
+                 parser_backend='html.parser', partial_parse=False, adaptive_limits=None, max_retries=3,
+                 storage='files', idf_min_documents=200, detect_duplicates=True, metrics=None,
+                 article_index=None):
         self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
 
-        # 初始化html2text转换器
-        self.h = html2text.HTML2Text()
-        self.h.ignore_links = False
-        self.h.bypass_tables = False
+        # 全局内容寻址图片库，所有文章共享
+        self.image_store = ImageStore(os.path.join(self.output_dir, '_images'))
+
+        # 原始HTML缓存：重新处理时不再访问网络；offline为True时只读缓存
+        self.html_cache = None
+        if html_cache_max_bytes:
+            self.html_cache = HTMLCache(os.path.join(self.output_dir, '.cache', 'html'),
+                                        max_bytes=html_cache_max_bytes)
+        self.offline = offline
+
+        # HTML解析后端：html.parser / lxml / selectolax / auto
+        self.parser_backend = resolve_backend(parser_backend)
+        # 部分解析：只为元数据标签、标题、公众号名称、发布时间和正文建树
+        self.partial_parse = partial_parse
+
+        # 单篇文章内同时下载的图片数
+        self.image_concurrency = max(1, int(image_concurrency))
+
+        # html2text转换器有解析状态，不能多线程共用：每个线程首次转换时各建一个
+        self._h_local = threading.local()
+
+        # 已处理文章索引，首次使用时打开（解析工作进程不需要）；也可传入调用方已打开的索引共用
+        self._article_index = article_index
+        self._article_index_lock = threading.Lock()
+
+        # 存储方式：files 每篇文章一个目录；corpus 追加到压缩分段语料库，图片仍在 _images
+        if storage not in ('files', 'corpus'):
+            raise ValueError(f"未知的存储方式: {storage}，可选: files, corpus")
+        self.storage = storage
+        self._corpus = None
+        self._corpus_lock = threading.Lock()
+
+        # 全库累计统计，首次使用时打开
+        self._summary = None
+        self._summary_lock = threading.Lock()
+
+        # 全文检索倒排索引，首次使用时打开
+        self._search_index = None
+        self._search_index_lock = threading.Lock()
+        # 检索索引和文档频率表都由正文分词得到，新建后在 prepare_text_indexes 中一起建立
+        self._text_indexes_pending_path = os.path.join(self.output_dir, '.index', 'text_indexes.pending')
+
+        # 本库文章的文档频率表：主进程写入，解析时（含工作进程）只读映射；
+        # 文章数达到idf_min_documents后TF-IDF改用本库IDF，之前仍用jieba自带的IDF表
+        self.idf_min_documents = max(1, int(idf_min_documents))
+        self._corpus_idf = None
+        self._corpus_idf_reader = None
+        self._corpus_idf_lock = threading.Lock()
+
+        # 近似重复检测：转载文章在分词和下载图片前识别，只登记为原文的别名
+        self.detect_duplicates = detect_duplicates
+        self._near_duplicates = None
+        self._near_duplicates_reader = None
+        self._near_duplicates_lock = threading.Lock()
+        # 新建的转载检测索引同样留下待建标记，在 prepare_text_indexes 读正文的同一遍中计算指纹
+        self._near_duplicates_pending_path = os.path.join(self.output_dir, '.index', 'near_duplicates.pending')
+
+        # 各阶段耗时直方图和下载/重试/失败计数，服务可传入共享实例
+        self.metrics = metrics if metrics is not None else CrawlMetrics()
 
         # 请求头
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Referer': 'https://mp.weixin.qq.com/'
         }
+
+        # 按主机的令牌桶限速，替代固定的sleep间隔
+        self.rate_limiter = HostRateLimiter(rate_limits)
+
+        # 按主机的自适应并发：响应正常时逐步提高，限流/超时/验证页时减半并退避
+        self.adaptive_limits = HostAdaptiveLimits(adaptive_limits)
+        # 单个URL遇到限流信号时的最多尝试次数
+        self.max_retries = max(1, int(max_retries))
+
+        # 文章页与图片共享的keep-alive连接池
+        self.http = PooledSession(headers=self.headers, pool_sizes=pool_sizes,
+                                  rate_limiter=self.rate_limiter)
         
         # 关键词权重配置
         self.keyword_weights = {
@@ -35,12 +135,452 @@ class WeChatArticleAdvancedCrawler:
             'normal': 1.0      # 普通文本权重
         }
 
+    @property
+    def h(self):
+        """当前线程的html2text转换器；jieba、html2text 等较重的模块都在首次使用时才导入"""
+        converter = getattr(self._h_local, 'converter', None)
+        if converter is None:
+            converter = self._h_local.converter = new_html2text()
+        return converter
+
+    @property
+    def article_index(self):
+        """已处理文章索引；首次创建时从现有文章目录导入"""
+        with self._article_index_lock:
+            if self._article_index is None:
+                index = ArticleIndex(os.path.join(self.output_dir, '.index', 'articles.sqlite3'))
+                if index.created:
+                    count = index.rebuild(self.output_dir, self._corpus_metadata(),
+                                          self._recorded_duplicates())
+                    if count:
+                        print(f"已从现有文章目录建立索引: {count} 篇")
+                self._article_index = index
+            return self._article_index
+
+    @property
+    def corpus(self):
+        """合并存储的语料库，首次使用时打开"""
+        with self._corpus_lock:
+            if self._corpus is None:
+                from article_corpus import ArticleCorpus
+                self._corpus = ArticleCorpus(os.path.join(self.output_dir, '_corpus'))
+            return self._corpus
+
+    @property
+    def summary(self):
+        """全库汇总统计；首次创建时从现有文章累计"""
+        with self._summary_lock:
+            if self._summary is None:
+                from archive_summary import ArchiveSummary
+                summary = ArchiveSummary(os.path.join(self.output_dir, '.index', 'summary.sqlite3'))
+                if summary.created:
+                    summary.rebuild(self._archive_records())
+                self._summary = summary
+            return self._summary
+
+    @property
+    def search_index(self):
+        """全文检索倒排索引；新建时只留下待建标记，由 prepare_text_indexes 对现有文章建立"""
+        with self._search_index_lock:
+            if self._search_index is None:
+                from search_index import SearchIndex
+                index = SearchIndex(os.path.join(self.output_dir, '.index', 'search.sqlite3'))
+                if index.created:
+                    self._mark_text_indexes_pending()
+                self._search_index = index
+            return self._search_index
+
+    @property
+    def corpus_idf(self):
+        """可写的文档频率表；新建时只留下待建标记，由 prepare_text_indexes 统计现有文章"""
+        with self._corpus_idf_lock:
+            if self._corpus_idf is None:
+                from corpus_idf import CorpusIDF
+                table = CorpusIDF(os.path.join(self.output_dir, '.index', 'idf'))
+                if table.created:
+                    self._mark_text_indexes_pending()
+                self._corpus_idf = table
+            return self._corpus_idf
+
+    def _mark_text_indexes_pending(self):
+        # 标记写在磁盘上，建立完成前退出的话下次启动继续
+        open(self._text_indexes_pending_path, 'a').close()
+
+    def prepare_text_indexes(self):
+        """
+        启动时调用：检索索引、文档频率表或转载检测索引是新建的时，对现有文章读一遍正文同时建立，
+        返回文章数。写文章时只做增量登记，不在写入路径上分词全库或计算全库指纹
+        """
+        # 打开各索引，新建的会留下待建标记
+        self.search_index
+        self.corpus_idf
+        if self.detect_duplicates:
+            self.near_duplicates
+        search = os.path.exists(self._text_indexes_pending_path)
+        fingerprints = self.detect_duplicates and os.path.exists(self._near_duplicates_pending_path)
+        if not (search or fingerprints):
+            return 0
+        count = self.rebuild_text_indexes(search=search, fingerprints=fingerprints)
+        if count:
+            built = (['检索索引和文档频率表'] if search else []) + (['正文指纹'] if fingerprints else [])
+            print(f"已为现有文章建立{'和'.join(built)}: {count} 篇")
+        return count
+
+    def rebuild_text_indexes(self, search=True, fingerprints=False):
+        """
+        对全部文章只读一遍正文，返回文章数：search为True时只分词一次，同时重建检索索引和文档频率表；
+        fingerprints为True时同时重新计算正文指纹
+        """
+        count = 0
+        found = []
+
+        def texts():
+            for metadata, text_content in self._archive_texts():
+                if fingerprints:
+                    fingerprint = self._fingerprint(text_content)
+                    if fingerprint is not None:
+                        # 只保留登记指纹用到的字段，全库的元数据不常驻内存
+                        found.append(({name: metadata.get(name) for name in _FINGERPRINT_FIELDS}, fingerprint))
+                yield metadata, text_content
+
+        if search:
+            search_index, corpus_idf = self.search_index, self.corpus_idf
+            corpus_idf.rebuild(())
+
+            def documents():
+                for metadata, text_content in texts():
+                    search_terms = self.search_terms(metadata, self.tokenize(text_content))
+                    corpus_idf.add_document(article_key_from_metadata(metadata, metadata['url']),
+                                            search_terms['body'].keys())
+                    yield metadata, search_terms
+
+            count = search_index.rebuild(documents())
+            corpus_idf.flush()
+            if os.path.exists(self._text_indexes_pending_path):
+                os.remove(self._text_indexes_pending_path)
+        else:
+            for _ in texts():
+                pass
+
+        if fingerprints:
+            fingerprinted = self.near_duplicates.rebuild(found)
+            count = count if search else fingerprinted
+            if os.path.exists(self._near_duplicates_pending_path):
+                os.remove(self._near_duplicates_pending_path)
+        return count
+
+    def _idf_documents(self):
+        for metadata, search_terms in self._archive_documents():
+            yield article_key_from_metadata(metadata, metadata['url']), search_terms['body'].keys()
+
+    def rebuild_corpus_idf(self):
+        """对全部文章重新分词并重新统计文档频率，返回文章数"""
+        return self.corpus_idf.rebuild(self._idf_documents())
+
+    def tfidf_source(self):
+        """
+        TF-IDF使用的IDF来源：本库文章数足够时为本库文档频率表，否则为None（jieba自带IDF表）。
+        不触发统计：只读取已有的表，工作进程里随主进程写入自动看到新计数
+        """
+        with self._corpus_idf_lock:
+            table = self._corpus_idf
+            if table is None:
+                if self._corpus_idf_reader is None:
+                    from corpus_idf import CorpusIDF
+                    self._corpus_idf_reader = CorpusIDF.open_existing(os.path.join(self.output_dir, '.index', 'idf'))
+                table = self._corpus_idf_reader
+                if table is not None:
+                    table.refresh()
+        if table is None or table.documents < self.idf_min_documents:
+            return None
+        import jieba.analyse
+        from corpus_idf import CorpusTFIDF
+        return CorpusTFIDF(table, jieba.analyse.default_tfidf.stop_words)
+
+    @property
+    def near_duplicates(self):
+        """正文SimHash索引；新建时只留下待建标记，由 prepare_text_indexes 为现有文章计算指纹"""
+        with self._near_duplicates_lock:
+            if self._near_duplicates is None:
+                from near_duplicates import NearDuplicateIndex
+                index = NearDuplicateIndex(os.path.join(self.output_dir, '.index', 'near_duplicates.sqlite3'))
+                if index.created:
+                    open(self._near_duplicates_pending_path, 'a').close()
+                self._near_duplicates = index
+            return self._near_duplicates
+
+    @staticmethod
+    def _fingerprint(text_content):
+        """正文指纹，正文过短或没有指纹时为None"""
+        return simhash(text_content) if len(text_content) >= MIN_CHARS else None
+
+    def _archive_fingerprints(self):
+        """全部已写出文章的 (元数据, 正文指纹)，正文过短或没有指纹的文章不参与"""
+        for metadata, text_content in self._archive_texts():
+            fingerprint = self._fingerprint(text_content)
+            if fingerprint is not None:
+                yield metadata, fingerprint
+
+    def rebuild_near_duplicates(self):
+        """重新计算全部文章的正文指纹，返回文章数"""
+        count = self.near_duplicates.rebuild(self._archive_fingerprints())
+        if os.path.exists(self._near_duplicates_pending_path):
+            os.remove(self._near_duplicates_pending_path)
+        return count
+
+    def find_near_duplicate(self, metadata, fingerprint):
+        """
+        已写出文章中与该指纹最相近的一篇（同一篇文章除外），没有时返回None。
+        不触发建索引：只查询已有的索引，解析工作进程也可调用
+        """
+        with self._near_duplicates_lock:
+            index = self._near_duplicates
+            if index is None:
+                if self._near_duplicates_reader is None:
+                    from near_duplicates import NearDuplicateIndex
+                    self._near_duplicates_reader = NearDuplicateIndex.open_existing(
+                        os.path.join(self.output_dir, '.index', 'near_duplicates.sqlite3'))
+                index = self._near_duplicates_reader
+        if index is None:
+            return None
+        return index.find(fingerprint, exclude_key=article_key_from_metadata(metadata, metadata['url']))
+
+    def _recorded_duplicates(self):
+        """转载检测索引中记录的全部转载；索引不存在时为空（不为此计算指纹）"""
+        with self._near_duplicates_lock:
+            index = self._near_duplicates
+        if index is not None:
+            return index.duplicates()
+        from near_duplicates import NearDuplicateIndex
+        index = NearDuplicateIndex.open_existing(os.path.join(self.output_dir, '.index', 'near_duplicates.sqlite3'))
+        if index is None:
+            return []
+        try:
+            return index.duplicates()
+        finally:
+            index.close()
+
+    def record_duplicate(self, metadata, text_content):
+        """把转载文章登记为原文的别名：URL和文章自身的键都指向原文，不写出文件"""
+        original = metadata['duplicate_of']
+        self.article_index.add(metadata['url'], original['article_key'], metadata['title'])
+        own_key = article_key_from_metadata(metadata, metadata['url'])
+        if own_key != original['article_key']:
+            self.article_index.add_alias(own_key, original['article_key'])
+        # 在分词前识别时正文未分词，写出前才识别时已分过词
+        chars_skipped = 0 if 'keyword_analysis' in metadata else len(text_content)
+        self.near_duplicates.record_duplicate(metadata, original, chars_skipped)
+        self._observe_article(metadata)
+        print(f"\n转载文章，已登记为别名: {metadata['url']} -> {original['url']} (海明距离 {original['distance']})")
+
+    def _archive_texts(self):
+        """逐篇读取已写出文章的 (元数据, 正文)，包括文章目录和语料库"""
+        for metadata, article_dir in iter_archive_metadata(self.output_dir):
+            text_path = os.path.join(self.output_dir, article_dir, f"{article_dir}_content.txt")
+            try:
+                with open(text_path, 'r', encoding='utf-8') as f:
+                    text_content = f.read()
+            except OSError:
+                text_content = ''
+            yield metadata, text_content
+        if os.path.exists(os.path.join(self.output_dir, '_corpus')):
+            for record in self.corpus.iter_records():
+                yield record['metadata'], record['text']
+
+    def _archive_documents(self):
+        """逐篇读取已写出文章的正文并分词，产出 (元数据, 检索词频)"""
+        for metadata, text_content in self._archive_texts():
+            yield metadata, self.search_terms(metadata, self.tokenize(text_content))
+
+    def search(self, query, page=1, page_size=10):
+        """按BM25检索全部已写出的文章，查询用与正文相同的jieba分词"""
+        return self.search_index.search(count_terms(self.tokenize(query)), page, page_size)
+
+    def rebuild_search_index(self):
+        """对全部文章重新分词并重建检索索引，返回文章数"""
+        return self.search_index.rebuild(self._archive_documents())
+
+    def _archive_records(self):
+        """全部已写出文章的 (元数据, 文章目录)，包括文章目录和语料库"""
+        records = list(iter_archive_metadata(self.output_dir))
+        records += [(metadata, None) for metadata in self._corpus_metadata()]
+        return records
+
+    def _corpus_metadata(self):
+        """语料库中全部文章的元数据（未使用过语料库时为空）"""
+        if not os.path.exists(os.path.join(self.output_dir, '_corpus')):
+            return []
+        return [record['metadata'] for record in self.corpus.iter_records()]
+
+    def warm_up(self):
+        """
+        预热分词：导入jieba并从缓存模型加载词典，再加载TF-IDF的IDF表，
+        避免第一篇文章承担数秒的加载时间。返回各步骤耗时（秒）
+        """
+        timings = {}
+        start = time.perf_counter()
+        import jieba
+        timings['jieba_import'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        jieba.initialize()
+        timings['jieba_dict'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        import jieba.analyse
+        timings['jieba_idf'] = time.perf_counter() - start
+
+        # 转换器按线程创建，这里只导入模块，预热线程建的实例别的线程用不上
+        start = time.perf_counter()
+        import html2text
+        timings['html2text'] = time.perf_counter() - start
+        return timings
+
     def get_safe_title(self, title):
-        safe_title = re.sub(r'[\\/*?:"<>|]', '', title)[:50]
-        return safe_title.strip()
+        return safe_title(title)
 
     def extract_all_metadata(self, soup, response_text, url):
-        """全面提取文章元数据"""
+        """全面提取文章元数据；提供原始HTML时走单次扫描的快速路径"""
+        if response_text:
+            return self._extract_all_metadata_fast(soup, response_text, url)
+        return self._extract_all_metadata_dom(soup, url)
+
+    def _extract_all_metadata_fast(self, soup, html, url):
+        """
+        快速路径：脚本变量由一次预编译扫描得到；DOM查找只在原始HTML中
+        出现对应标记时才执行，结果与 _extract_all_metadata_dom 完全一致
+        """
+        script_vars = scan_script_vars(html)
+        metadata = {
+            'url': url,
+            'crawl_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+        # 1. 公众号名称：DOM元素优先，其次脚本变量
+        nickname = None
+        if 'rich_media_meta_nickname' in html:
+            nickname_elem = soup.find('span', class_='rich_media_meta rich_media_meta_nickname')
+            if nickname_elem:
+                nickname = nickname_elem.get_text().strip()
+        if not nickname and 'js_name' in html:
+            js_name = soup.find('a', id='js_name')
+            if js_name:
+                nickname = js_name.get_text().strip()
+        if not nickname and 'profile_nickname' in html:
+            profile_nickname = soup.find('strong', class_='profile_nickname')
+            if profile_nickname:
+                nickname = profile_nickname.get_text().strip()
+        if not nickname and 'author' in html:
+            meta_author = soup.find('meta', {'name': 'author'})
+            if meta_author:
+                nickname = meta_author.get('content', '')
+        if not nickname:
+            for found in script_vars:
+                if 'nickname' in found:
+                    nickname = found['nickname']
+                    break
+                if 'user_name' in found:
+                    nickname = found['user_name']
+                    break
+        metadata['nickname'] = nickname or '未知公众号'
+
+        # 2. 文章标题
+        title = None
+        if 'activity-name' in html:
+            title_elem = soup.find('h1', {'id': 'activity-name'})
+            if title_elem:
+                title = title_elem.get_text().strip()
+        if not title and 'rich_media_title' in html:
+            title_elem = soup.find('h1', class_='rich_media_title')
+            if title_elem:
+                title = title_elem.get_text().strip()
+        if not title and 'og:title' in html:
+            og_title = soup.find('meta', {'property': 'og:title'})
+            if og_title:
+                title = og_title.get('content', '')
+        if not title:
+            for found in script_vars:
+                if 'msg_title' in found:
+                    title = found['msg_title']
+                    break
+        metadata['title'] = title or '无标题'
+
+        # 3. 文章链接
+        metadata['link'] = url
+
+        # 4. 发布时间
+        publish_time = None
+        if 'publish_time' in html:
+            time_elem = soup.find('em', id='publish_time')
+            if time_elem:
+                publish_time = time_elem.get_text().strip()
+        if not publish_time and 'og:article:published_time' in html:
+            meta_time = soup.find('meta', {'property': 'og:article:published_time'})
+            if meta_time:
+                publish_time = meta_time.get('content', '')
+        if not publish_time:
+            for found in script_vars:
+                for rule in ('publish_time', 'ct', 'createTime', 'svr_time'):
+                    if rule in found:
+                        publish_time = found[rule]
+                        break
+                if publish_time:
+                    break
+        if not publish_time:
+            for found in script_vars:
+                if 'ct_timestamp' in found:
+                    timestamp = int(found['ct_timestamp'])
+                    publish_time = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+                    break
+        self._apply_publish_time(metadata, publish_time)
+
+        # 5. 文章ID等信息：后出现的script覆盖先出现的
+        for found in script_vars:
+            for rule in ('mid', 'sn', 'idx', 'biz', 'comment_id', 'appmsgid'):
+                if rule in found:
+                    metadata[rule] = found[rule]
+        self._apply_url_ids(metadata, url)
+
+        return metadata
+
+    def _apply_publish_time(self, metadata, publish_time):
+        """写入发布时间并推导发布日期，缺失时使用当前时间"""
+        if publish_time:
+            metadata['publish_time'] = publish_time
+            # 提取日期部分
+            try:
+                if re.match(r'\d{4}-\d{2}-\d{2}', publish_time):
+                    metadata['publish_date'] = publish_time.split(' ')[0]
+                elif re.match(r'\d{10}', publish_time):
+                    # 如果是时间戳
+                    metadata['publish_date'] = datetime.fromtimestamp(int(publish_time)).strftime('%Y-%m-%d')
+                else:
+                    metadata['publish_date'] = publish_time
+            except:
+                metadata['publish_date'] = publish_time
+        else:
+            metadata['publish_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            metadata['publish_date'] = datetime.now().strftime('%Y-%m-%d')
+
+    def _apply_url_ids(self, metadata, url):
+        """页面中缺失的 mid/sn/biz 从URL参数补齐"""
+        if 'mid=' in url:
+            mid_match = re.search(r'mid=(\d+)', url)
+            if mid_match and 'mid' not in metadata:
+                metadata['mid'] = mid_match.group(1)
+        
+        if 'sn=' in url:
+            sn_match = re.search(r'sn=([a-zA-Z0-9]+)', url)
+            if sn_match and 'sn' not in metadata:
+                metadata['sn'] = sn_match.group(1)
+        
+        if '__biz=' in url:
+            biz_match = re.search(r'__biz=([^&]+)', url)
+            if biz_match and 'biz' not in metadata:
+                metadata['biz'] = biz_match.group(1)
+
+    def _extract_all_metadata_dom(self, soup, url):
+        """逐项查找DOM和脚本的完整提取（无原始HTML时使用）"""
         metadata = {
             'url': url,
             'crawl_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -169,22 +709,7 @@ class WeChatArticleAdvancedCrawler:
                         publish_time = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
                         break
         
-        if publish_time:
-            metadata['publish_time'] = publish_time
-            # 提取日期部分
-            try:
-                if re.match(r'\d{4}-\d{2}-\d{2}', publish_time):
-                    metadata['publish_date'] = publish_time.split(' ')[0]
-                elif re.match(r'\d{10}', publish_time):
-                    # 如果是时间戳
-                    metadata['publish_date'] = datetime.fromtimestamp(int(publish_time)).strftime('%Y-%m-%d')
-                else:
-                    metadata['publish_date'] = publish_time
-            except:
-                metadata['publish_date'] = publish_time
-        else:
-            metadata['publish_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            metadata['publish_date'] = datetime.now().strftime('%Y-%m-%d')
+        self._apply_publish_time(metadata, publish_time)
         
         # 5. 提取其他有用信息
         # 提取文章ID相关信息
@@ -222,20 +747,7 @@ class WeChatArticleAdvancedCrawler:
                     metadata['appmsgid'] = appmsg_match.group(1)
         
         # 从URL中提取参数
-        if 'mid=' in url:
-            mid_match = re.search(r'mid=(\d+)', url)
-            if mid_match and 'mid' not in metadata:
-                metadata['mid'] = mid_match.group(1)
-        
-        if 'sn=' in url:
-            sn_match = re.search(r'sn=([a-zA-Z0-9]+)', url)
-            if sn_match and 'sn' not in metadata:
-                metadata['sn'] = sn_match.group(1)
-        
-        if '__biz=' in url:
-            biz_match = re.search(r'__biz=([^&]+)', url)
-            if biz_match and 'biz' not in metadata:
-                metadata['biz'] = biz_match.group(1)
+        self._apply_url_ids(metadata, url)
         
         return metadata
     
@@ -278,116 +790,178 @@ class WeChatArticleAdvancedCrawler:
         
         return text_content, structured_content
     
-    def analyze_keywords(self, text_content, structured_content, top_k=20):
-        """分析关键词并计算加权得分"""
-        # 使用jieba进行中文分词
-        words = jieba.cut(text_content)
+    def tokenize(self, text_content):
+        """jieba分词，结果供词频、加权得分和TF-IDF共用"""
+        import jieba
+        return list(jieba.cut(text_content))
+
+    def search_terms(self, metadata, tokens):
+        """全文检索用的标题词频和正文词频；正文直接使用已有的分词结果"""
+        return {
+            'title': count_terms(self.tokenize(metadata.get('title') or '')),
+            'body': count_terms(tokens),
+        }
+
+    def analyze_keywords(self, text_content, structured_content, top_k=20, tokens=None):
+        """分析关键词并计算加权得分；tokens为已有的分词结果时不再分词"""
+        # 使用jieba进行中文分词，全文只分一次
+        if tokens is None:
+            tokens = self.tokenize(text_content)
         
         # 统计词频
         word_counts = Counter()
-        for word in words:
+        for word in tokens:
             # 过滤掉单字和标点符号
             if len(word) > 1 and not re.match(r'^[^\w]+$', word):
                 word_counts[word] += 1
         
-        # 计算加权得分
-        keyword_scores = {}
+        # 计算加权得分：标题/副标题/加粗文本中的出现次数经倒排表一次统计
+        keyword_scores = weighted_keyword_scores(word_counts, structured_content, self.keyword_weights)
         
-        # 为不同位置的关键词赋予不同权重
-        for word, count in word_counts.items():
-            score = 0
-            
-            # 检查关键词在不同位置出现的次数
-            for title_text in structured_content['title']:
-                if word in title_text:
-                    score += self.keyword_weights['title'] * title_text.count(word)
-            
-            for subtitle_text in structured_content['subtitle']:
-                if word in subtitle_text:
-                    score += self.keyword_weights['subtitle'] * subtitle_text.count(word)
-            
-            for strong_text in structured_content['strong']:
-                if word in strong_text:
-                    score += self.keyword_weights['strong'] * strong_text.count(word)
-            
-            # 普通文本中的得分
-            score += self.keyword_weights['normal'] * count
-            
-            if score > 0:
-                keyword_scores[word] = score
-        
-        # 获取TF-IDF关键词
+        # 获取TF-IDF关键词：复用上面的分词结果，查本库或jieba的IDF表
         try:
-            tfidf_keywords = jieba.analyse.extract_tags(text_content, topK=top_k, withWeight=True)
+            tfidf_ranking = tfidf_keywords(tokens, top_k, self.tfidf_source())
         except:
-            tfidf_keywords = []
+            tfidf_ranking = []
         
         # 合并结果
         analysis_result = {
             'keyword_counts': dict(word_counts.most_common(top_k)),
             'keyword_scores': dict(sorted(keyword_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]),
-            'tfidf_keywords': {word: weight for word, weight in tfidf_keywords},
+            'tfidf_keywords': {word: weight for word, weight in tfidf_ranking},
             'total_words': sum(word_counts.values()),
             'unique_words': len(word_counts)
         }
         
         return analysis_result
 
-    def download_wechat_image(self, img_url, article_image_dir):
-        """下载并保存微信公众号图片"""
+    def download_wechat_image(self, img_url, article_dir):
+        """下载微信公众号图片到全局图片库，返回相对文章目录的引用路径"""
+        source_url = img_url
         try:
-            # 微信图片特殊处理
-            if 'mmbiz.qpic.cn' in img_url:
-                if not img_url.startswith(('http://', 'https://')):
-                    img_url = 'https://' + img_url
-
-                # 提取图片格式参数
-                fmt_match = re.search(r'wx_fmt=([^&]+)', img_url)
-                fmt = fmt_match.group(1) if fmt_match else 'jpeg'
-
-                # 构造高质量图片URL
-                if '/0?' in img_url:
-                    img_url = img_url.replace('/0?', '/640?')
-                elif '?' not in img_url:
-                    img_url += '?wx_fmt=' + fmt
-
-                # 添加时间戳防止缓存
-                img_url += f'&timestamp={int(time.time())}'
-
-            headers = self.headers.copy()
-            response = requests.get(img_url, headers=headers, stream=True, timeout=10)
-
-            if response.status_code == 200:
-                # 确定文件扩展名
-                content_type = response.headers.get('Content-Type', '')
-                if 'jpeg' in content_type or 'jpg' in content_type:
-                    ext = '.jpg'
-                elif 'png' in content_type:
-                    ext = '.png'
-                elif 'gif' in content_type:
-                    ext = '.gif'
-                else:
-                    ext = '.jpg'  # 默认
-
-                # 生成图片文件名
-                img_name = f'{int(time.time() * 1000)}{ext}'
-                img_path = os.path.join(article_image_dir, img_name)
-
-                with open(img_path, 'wb') as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-
-                return img_name
+            with self.image_store.url_lock(source_url):
+                # 已入库的图片直接引用，不再下载
+                stored_name = self.image_store.lookup(source_url)
+                if stored_name:
+                    self.image_store.record_hit()
+                elif not self.offline:
+                    stored_name = self._fetch_image_to_store(img_url)
+            if stored_name:
+                return self._image_reference(stored_name, article_dir)
 
         except Exception as e:
             print(f"下载微信图片失败: {img_url}, 错误: {str(e)[:100]}")
         return None
 
+    def _fetch_image_to_store(self, img_url):
+        """流式下载图片并写入图片库，返回库内文件名"""
+        source_url = img_url
+
+        # 微信图片特殊处理
+        if 'mmbiz.qpic.cn' in img_url:
+            if not img_url.startswith(('http://', 'https://')):
+                img_url = 'https://' + img_url
+
+            # 提取图片格式参数
+            fmt_match = re.search(r'wx_fmt=([^&]+)', img_url)
+            fmt = fmt_match.group(1) if fmt_match else 'jpeg'
+
+            # 构造高质量图片URL
+            if '/0?' in img_url:
+                img_url = img_url.replace('/0?', '/640?')
+            elif '?' not in img_url:
+                img_url += '?wx_fmt=' + fmt
+
+            # 添加时间戳防止缓存
+            img_url += f'&timestamp={int(time.time())}'
+
+        response = self.get_with_backoff(img_url, stream=True, timeout=10)
+        if response is None:
+            return None
+
+        with response:
+
+            # 确定文件扩展名
+            content_type = response.headers.get('Content-Type', '')
+            if 'jpeg' in content_type or 'jpg' in content_type:
+                ext = '.jpg'
+            elif 'png' in content_type:
+                ext = '.png'
+            elif 'gif' in content_type:
+                ext = '.gif'
+            else:
+                ext = '.jpg'  # 默认
+
+            # 边下载边计算内容哈希，相同内容只落盘一次
+            return self.image_store.store_stream(
+                source_url, self._count_bytes(response.iter_content(self.image_store.chunk_size)), ext
+            )
+
+    def _count_bytes(self, chunks, counter='image_bytes'):
+        """透传下载的数据块，结束时把总字节数计入指标"""
+        total = 0
+        try:
+            for chunk in chunks:
+                total += len(chunk)
+                yield chunk
+        finally:
+            self.metrics.inc(counter, total)
+
+    def _image_reference(self, stored_name, article_dir):
+        """图片库文件相对文章目录的路径，用于Markdown引用"""
+        rel_path = os.path.relpath(self.image_store.path(stored_name), article_dir)
+        return rel_path.replace(os.sep, '/')
+
+    def _timed_image_download(self, img_url, article_dir):
+        """下载单张图片并记录耗时"""
+        start = time.perf_counter()
+        cached = self.image_store.lookup(img_url) is not None
+        img_ref = self.download_wechat_image(img_url, article_dir)
+        return img_ref, cached, time.perf_counter() - start
+
+    def download_image_urls(self, image_urls, article_dir):
+        """并发下载一组图片，返回与输入顺序一致的下载记录 [{url, file, cached, elapsed}]"""
+        if not image_urls:
+            return []
+
+        workers = min(self.image_concurrency, len(image_urls))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self._timed_image_download, img_url, article_dir)
+                for img_url in image_urls
+            ]
+            results = [future.result() for future in futures]
+
+        for img_ref, cached, _ in results:
+            self.metrics.inc('images_failed' if not img_ref else 'images_cached' if cached else 'images_downloaded')
+        return [
+            {'url': img_url, 'file': img_ref, 'cached': cached, 'elapsed': round(elapsed, 3)}
+            for img_url, (img_ref, cached, elapsed) in zip(image_urls, results)
+        ]
+
+    def download_article_images(self, content_div, article_dir):
+        """并发下载正文图片，按文档顺序回写img['src']，返回每张图片的下载记录"""
+        targets = []
+        for img in content_div.find_all('img'):
+            img_url = self.extract_real_image_url(img)
+            if img_url:
+                targets.append((img, img_url))
+
+        image_timings = self.download_image_urls([img_url for _, img_url in targets], article_dir)
+
+        # 下载可乱序完成，但回写严格按文档顺序进行
+        for (img, _), item in zip(targets, image_timings):
+            if item['file']:
+                img['src'] = item['file']
+        return image_timings
+
     def extract_real_image_url(self, img_element):
         """提取真实的图片URL"""
         for attr in ['data-src', 'src', 'data-original', 'data-wx-src']:
             img_url = img_element.get(attr)
             if img_url:
+                if _NON_HTTP_SCHEME_RE.match(img_url):
+                    continue  # data:/blob: 等内联或占位图片没有可下载的地址
                 if 'mmbiz.qpic.cn' in img_url:
                     if not img_url.startswith(('http://', 'https://')):
                         img_url = 'https://' + img_url
@@ -400,108 +974,328 @@ class WeChatArticleAdvancedCrawler:
                     return img_url
         return None
 
-    def process_article(self, url):
-        """处理单篇文章，提取所有数据"""
+    def has_cached_html(self, url):
+        """页面是否已在HTML缓存中"""
+        return self.html_cache is not None and canonical_article_key(url) in self.html_cache
+
+    def fetch_article_html(self, url, throttle=True):
+        """获取文章HTML（优先读缓存），失败返回None"""
+        cache_key = canonical_article_key(url)
+        if self.html_cache is not None:
+            html = self.html_cache.get(cache_key)
+            # 旧版本可能缓存过验证页，此时重新抓取覆盖
+            if html is not None and not is_verification_page(html):
+                print(f"命中HTML缓存: {url}")
+                self.metrics.inc('html_cache_hits')
+                return html
+
+        if self.offline:
+            print(f"离线模式下缓存未命中，跳过: {url}")
+            return None
+
+        response = self.get_with_backoff(url, throttle=throttle, check_page=True, timeout=15)
+        if response is None:
+            print(f"无法获取文章: {url}")
+            return None
+        self.metrics.inc('article_bytes', len(response.content))
+
+        # 只缓存正常文章页，验证页和错误页不会进入缓存
+        if self.html_cache is not None:
+            self.html_cache.put(cache_key, response.text)
+        return response.text
+
+    def get_with_backoff(self, url, throttle=True, check_page=False, **kwargs):
+        """
+        按主机自适应并发发起GET请求，遇到429/5xx/403、超时、连接失败或验证页时退避重试，
+        成功返回response，重试用尽或不可重试的错误返回None。
+        check_page为True时按文本检查验证页（文章页），图片请求不读取正文
+        """
+        controller = self.adaptive_limits.controller_for(url)
+        for attempt in range(1, self.max_retries + 1):
+            if controller:
+                controller.acquire()
+            response = None
+            try:
+                # 首次请求的令牌可能已由调用方取得，重试时重新取令牌
+                response = self.http.get(url, throttle=throttle or attempt > 1, **kwargs)
+                signal = classify_status(response.status_code)
+                reason = f"状态码 {response.status_code}"
+                if signal == SIGNAL_OK and check_page:
+                    response.encoding = 'utf-8'
+                    if is_verification_page(response.text, response.url):
+                        signal, reason = SIGNAL_THROTTLED, "触发验证页"
+            except (requests.Timeout, requests.ConnectionError) as e:
+                signal, reason = SIGNAL_THROTTLED, f"请求异常 {str(e)[:80]}"
+            except requests.RequestException as e:
+                # 地址无效、重定向过多等错误重试也不会成功，不计入主机的过载信号
+                signal, reason = SIGNAL_FATAL, f"请求错误 {str(e)[:80]}"
+            except Exception:
+                if controller:
+                    controller.release(SIGNAL_FATAL)
+                raise
+            if controller:
+                controller.release(signal)
+
+            if signal == SIGNAL_OK:
+                return response
+            if response is not None:
+                response.close()
+            if signal == SIGNAL_FATAL or attempt == self.max_retries:
+                print(f"请求失败: {url}, {reason}")
+                self.metrics.inc('request_failures')
+                return None
+            print(f"请求受限: {url}, {reason}，第{attempt}次重试")
+            self.metrics.inc('retries')
+            # 有并发控制器时下次acquire会等待退避结束，否则在这里退避
+            if not controller:
+                time.sleep(backoff_delay(attempt, self.adaptive_limits.base_delay,
+                                         self.adaptive_limits.max_delay))
+        return None
+
+    def analyze_page(self, url, html):
+        """
+        解析页面并完成元数据、正文和关键词分析（CPU密集部分）
+        返回 (metadata, text_content, content_div)，content_div 可能为None。
+        各阶段耗时（秒）记录在 metadata['timings']
+        """
+        timings = {}
+        stage_start = time.perf_counter()
+
+        def lap(stage):
+            nonlocal stage_start
+            now = time.perf_counter()
+            timings[stage] = round(now - stage_start, 4)
+            stage_start = now
+
+        soup = parse_article_html(html, self.parser_backend, self.partial_parse)
+        lap('parse')
+
+        # 提取所有元数据
+        metadata = self.extract_all_metadata(soup, html, url)
+        metadata['timings'] = timings
+        lap('metadata')
+        
+        print(f"\n文章信息:")
+        print(f"  公众号: {metadata['nickname']}")
+        print(f"  标题: {metadata['title']}")
+        print(f"  发布时间: {metadata['publish_time']}")
+        
+        # 获取文章内容
+        text_content, structured_content = self.fetch_article_content(soup)
+        metadata['content_length'] = len(text_content)
+        lap('content')
+
+        # 转载检测：与已写出文章正文近似重复时不再分词，也不返回正文（不下载图片）
+        if self.detect_duplicates and len(text_content) >= MIN_CHARS:
+            # 正文几乎全是表情或标点时去掉后不足一个4-gram，没有指纹，不做检测
+            fingerprint = simhash(text_content)
+            original = None
+            if fingerprint is not None:
+                metadata['simhash'] = format(fingerprint, '016x')
+                original = self.find_near_duplicate(metadata, fingerprint)
+            lap('dedup')
+            if original:
+                content_div = soup.find('div', {'id': 'js_content'})
+                original['images_skipped'] = len(self.content_image_urls(content_div)) if content_div else 0
+                metadata['duplicate_of'] = original
+                release_tree(soup)
+                return metadata, text_content, None
+        
+        # 分析关键词；同一次分词结果也用于全文检索，写出文章时登记后移除
+        if text_content:
+            print(f"\n正在分析关键词...")
+            tokens = self.tokenize(text_content)
+            lap('tokenize')
+            keyword_analysis = self.analyze_keywords(text_content, structured_content, tokens=tokens)
+            metadata['keyword_analysis'] = keyword_analysis
+            metadata['_search_terms'] = self.search_terms(metadata, tokens)
+            lap('keywords')
+            
+            print(f"  总词数: {keyword_analysis['total_words']}")
+            print(f"  独特词数: {keyword_analysis['unique_words']}")
+            print(f"  Top 5 关键词 (按得分):")
+            for i, (word, score) in enumerate(list(keyword_analysis['keyword_scores'].items())[:5], 1):
+                print(f"    {i}. {word}: {score:.2f}")
+
+        content_div = soup.find('div', {'id': 'js_content'})
+        if content_div is None:
+            release_tree(soup)
+        return metadata, text_content, content_div
+
+    def get_article_dir(self, metadata):
+        """文章输出目录，不存在时创建；语料库模式下不建文章目录，图片引用相对输出目录"""
+        if self.storage == 'corpus':
+            return self.output_dir
+        article_dir = os.path.join(self.output_dir, self.get_safe_title(metadata['title']))
+        os.makedirs(article_dir, exist_ok=True)
+        return article_dir
+
+    def content_image_urls(self, content_div):
+        """正文中需要下载的图片URL，按文档顺序"""
+        urls = []
+        for img in content_div.find_all('img'):
+            img_url = self.extract_real_image_url(img)
+            if img_url:
+                urls.append(img_url)
+        return urls
+
+    def render_content_markdown(self, content_html, image_refs):
+        """
+        把正文HTML片段转换为Markdown，image_refs 按文档顺序对应需下载的图片，
+        非空的引用替换img['src']；供流水线在工作进程中使用
+        """
+        content_div = BeautifulSoup(content_html, 'html.parser')
+        refs = iter(image_refs)
+        for img in content_div.find_all('img'):
+            if self.extract_real_image_url(img):
+                img_ref = next(refs, None)
+                if img_ref:
+                    img['src'] = img_ref
+        return self.h.handle(str(content_div))
+
+    def write_article(self, metadata, markdown_content, text_content):
+        """
+        流式写出文章的全部文件：每个文件先写临时文件再原子改名，读取方不会看到写了一半的文章。
+        元数据JSON最后写出并登记索引，有元数据文件即表示该文章的其余文件均已完整。
+        写出耗时只计入指标，不在元数据中
+        """
+        write_start = time.perf_counter()
+
+        # 并发处理时转载和原文可能同时在途，写出前再查一次
+        if 'duplicate_of' not in metadata and metadata.get('simhash'):
+            original = self.near_duplicates.find(int(metadata['simhash'], 16),
+                                                 exclude_key=article_key_from_metadata(metadata, metadata['url']))
+            if original:
+                metadata['duplicate_of'] = original
+        if 'duplicate_of' in metadata:
+            metadata.pop('_search_terms', None)
+            return self.record_duplicate(metadata, text_content)
+
+        # 分析阶段的检索词频不写入元数据文件；没有时（如直接调用）从正文重新分词
+        search_terms = metadata.pop('_search_terms', None)
+        if search_terms is None:
+            search_terms = self.search_terms(metadata, self.tokenize(text_content))
+
+        if self.storage == 'corpus':
+            self._append_to_corpus(metadata, markdown_content, text_content, search_terms)
+            return self._observe_article(metadata, time.perf_counter() - write_start)
+
+        safe_title = self.get_safe_title(metadata['title'])
+        article_dir = self.get_article_dir(metadata)
+        
+        # 保存纯文本内容
+        text_path = os.path.join(article_dir, f"{safe_title}_content.txt")
+        write_text_atomic(text_path, text_content)
+        print(f"纯文本内容已保存: {text_path}")
+        
+        # 保存关键词分析结果
+        if 'keyword_analysis' in metadata:
+            keywords_path = os.path.join(article_dir, f"{safe_title}_keywords.json")
+            write_json_atomic(keywords_path, metadata['keyword_analysis'])
+            print(f"关键词分析已保存: {keywords_path}")
+
+        # 逐段生成并写入Markdown文件
+        markdown_path = os.path.join(article_dir, f"{safe_title}.md")
+        write_text_atomic(markdown_path, self.iter_markdown_sections(metadata, markdown_content))
+        print(f"\nMarkdown文件已保存: {markdown_path}")
+        
+        # 保存完整的元数据JSON：直接序列化一次，无法序列化的值转为字符串
+        metadata_path = os.path.join(article_dir, f"{safe_title}_metadata.json")
+        write_json_atomic(metadata_path, metadata)
+        print(f"元数据已保存: {metadata_path}")
+
+        # 登记到已处理索引并更新全库统计
+        self.article_index.add(
+            metadata['url'], article_key_from_metadata(metadata, metadata['url']),
+            metadata['title'], os.path.basename(article_dir)
+        )
+        self.summary.record(metadata, os.path.basename(article_dir))
+        self.search_index.add(metadata, search_terms)
+        self.corpus_idf.add_document(article_key_from_metadata(metadata, metadata['url']),
+                                     search_terms['body'].keys())
+        if metadata.get('simhash'):
+            self.near_duplicates.add(metadata, int(metadata['simhash'], 16))
+        self._observe_article(metadata, time.perf_counter() - write_start)
+
+    def _observe_article(self, metadata, write_seconds=None):
+        """把一篇已完成文章的各阶段耗时计入直方图"""
+        self.metrics.observe_timings(metadata.get('timings') or {})
+        if write_seconds is not None:
+            self.metrics.observe('write', write_seconds)
+        self.metrics.inc('articles_duplicate' if 'duplicate_of' in metadata else 'articles_processed')
+
+    def _append_to_corpus(self, metadata, markdown_content, text_content, search_terms):
+        """语料库模式：整篇文章压缩为一条记录追加到当前分段，关键词已在元数据中不再单独保存"""
+        full_markdown = ''.join(self.iter_markdown_sections(metadata, markdown_content))
+        article_key = self.corpus.append(metadata, full_markdown, text_content)
+        print(f"\n文章已写入语料库: {article_key}")
+        self.article_index.add(metadata['url'], article_key, metadata['title'])
+        self.summary.record(metadata)
+        self.search_index.add(metadata, search_terms)
+        self.corpus_idf.add_document(article_key, search_terms['body'].keys())
+        if metadata.get('simhash'):
+            self.near_duplicates.add(metadata, int(metadata['simhash'], 16))
+
+    def process_article(self, url, html=None, fetch_seconds=None):
+        """
+        处理单篇文章，提取所有数据；html为已获取的页面时跳过下载，
+        fetch_seconds 为调用方获取页面的耗时，与其余各阶段耗时一起记入 metadata['timings']
+        """
         try:
             print(f"\n{'='*50}")
             print(f"开始处理文章: {url}")
             print(f"{'='*50}")
 
             # 获取文章HTML
-            response = requests.get(url, headers=self.headers)
-            response.encoding = 'utf-8'
-            if response.status_code != 200:
-                print(f"无法获取文章: {url}, 状态码: {response.status_code}")
-                return None
+            if html is None:
+                fetch_start = time.perf_counter()
+                html = self.fetch_article_html(url)
+                if html is None:
+                    self.metrics.inc('articles_failed')
+                    return None
+                fetch_seconds = time.perf_counter() - fetch_start
 
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # 提取所有元数据
-            metadata = self.extract_all_metadata(soup, response.text, url)
-            
-            print(f"\n文章信息:")
-            print(f"  公众号: {metadata['nickname']}")
-            print(f"  标题: {metadata['title']}")
-            print(f"  发布时间: {metadata['publish_time']}")
-            
-            # 获取文章内容
-            text_content, structured_content = self.fetch_article_content(soup)
-            metadata['content_length'] = len(text_content)
-            
-            # 分析关键词
-            if text_content:
-                print(f"\n正在分析关键词...")
-                keyword_analysis = self.analyze_keywords(text_content, structured_content)
-                metadata['keyword_analysis'] = keyword_analysis
-                
-                print(f"  总词数: {keyword_analysis['total_words']}")
-                print(f"  独特词数: {keyword_analysis['unique_words']}")
-                print(f"  Top 5 关键词 (按得分):")
-                for i, (word, score) in enumerate(list(keyword_analysis['keyword_scores'].items())[:5], 1):
-                    print(f"    {i}. {word}: {score:.2f}")
+            metadata, text_content, content_div = self.analyze_page(url, html)
+            if fetch_seconds is not None:
+                metadata['timings'] = {'fetch': round(fetch_seconds, 4), **metadata['timings']}
+            if 'duplicate_of' in metadata:
+                self.record_duplicate(metadata, text_content)
+                return metadata
             
             # 创建文章目录
-            safe_title = self.get_safe_title(metadata['title'])
-            article_dir = os.path.join(self.output_dir, safe_title)
-            os.makedirs(article_dir, exist_ok=True)
+            article_dir = self.get_article_dir(metadata)
             
-            # 创建图片目录
-            article_image_dir = os.path.join(article_dir, 'images')
-            os.makedirs(article_image_dir, exist_ok=True)
-
             # 处理文章内容div
-            content_div = soup.find('div', {'id': 'js_content'})
             if content_div:
-                # 下载并替换图片链接
-                img_count = 0
-                for img in content_div.find_all('img'):
-                    img_url = self.extract_real_image_url(img)
-                    if img_url:
-                        img_filename = self.download_wechat_image(img_url, article_image_dir)
-                        if img_filename:
-                            img_count += 1
-                            img['src'] = f'images/{img_filename}'
-                
-                print(f"\n共处理 {img_count} 张图片")
+                # 并发下载并替换图片链接
+                download_start = time.perf_counter()
+                image_timings = self.download_article_images(content_div, article_dir)
+                img_count = sum(1 for item in image_timings if item['file'])
+
+                download_seconds = time.perf_counter() - download_start
+                print(f"\n共处理 {img_count} 张图片，耗时 {download_seconds:.2f} 秒")
                 metadata['image_count'] = img_count
+                metadata['image_timings'] = image_timings
+                metadata['timings']['images'] = round(download_seconds, 4)
 
-                # 转换为Markdown格式
+                # 转换为Markdown格式；序列化正文后即释放整棵解析树
+                convert_start = time.perf_counter()
                 html_content = str(content_div)
+                release_tree(content_div)
+                content_div = None
                 markdown_content = self.h.handle(html_content)
+                del html_content
+                metadata['timings']['html2text'] = round(time.perf_counter() - convert_start, 4)
             else:
                 markdown_content = "未找到文章内容"
                 metadata['image_count'] = 0
 
-            # 生成完整的Markdown文档
-            full_markdown = self.generate_full_markdown(metadata, markdown_content, text_content)
-            
-            # 保存Markdown文件
-            markdown_path = os.path.join(article_dir, f"{safe_title}.md")
-            with open(markdown_path, 'w', encoding='utf-8') as f:
-                f.write(full_markdown)
-            print(f"\nMarkdown文件已保存: {markdown_path}")
-            
-            # 保存纯文本内容
-            text_path = os.path.join(article_dir, f"{safe_title}_content.txt")
-            with open(text_path, 'w', encoding='utf-8') as f:
-                f.write(text_content)
-            print(f"纯文本内容已保存: {text_path}")
-            
-            # 保存完整的元数据JSON
-            metadata_path = os.path.join(article_dir, f"{safe_title}_metadata.json")
-            # 确保metadata可以JSON序列化
-            json_metadata = json.loads(json.dumps(metadata, ensure_ascii=False, default=str))
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(json_metadata, f, ensure_ascii=False, indent=2)
-            print(f"元数据已保存: {metadata_path}")
-            
-            # 保存关键词分析结果
-            if 'keyword_analysis' in metadata:
-                keywords_path = os.path.join(article_dir, f"{safe_title}_keywords.json")
-                with open(keywords_path, 'w', encoding='utf-8') as f:
-                    json.dump(metadata['keyword_analysis'], f, ensure_ascii=False, indent=2)
-                print(f"关键词分析已保存: {keywords_path}")
+            self.write_article(metadata, markdown_content, text_content)
             
+            http_stats = self.http.get_stats()
+            print(f"\n连接统计: 请求 {http_stats['requests']} 次, "
+                  f"新建连接 {http_stats['handshakes']} 次, 复用 {http_stats['reused']} 次")
+
             print(f"\n{'='*50}")
             print(f"文章处理完成!")
             print(f"{'='*50}")
@@ -512,83 +1306,86 @@ class WeChatArticleAdvancedCrawler:
             print(f"\n处理文章 {url} 时出错: {e}")
             import traceback
             traceback.print_exc()
+            self.metrics.inc('articles_failed')
             return None
     
     def generate_full_markdown(self, metadata, markdown_content, text_content_preview=""):
         """生成完整的Markdown文档"""
-        md = f"# {metadata['title']}\n\n"
+        return ''.join(self.iter_markdown_sections(metadata, markdown_content))
+
+    def iter_markdown_sections(self, metadata, markdown_content):
+        """按顺序逐段生成Markdown文档内容，写文件时边生成边写，不拼接整篇文档"""
+        yield f"# {metadata['title']}\n\n"
         
         # 文章信息表格
-        md += "## 文章信息\n\n"
-        md += "| 项目 | 内容 |\n"
-        md += "|------|------|\n"
-        md += f"| 公众号名称 | {metadata['nickname']} |\n"
-        md += f"| 文章标题 | {metadata['title']} |\n"
-        md += f"| 发布时间 | {metadata['publish_time']} |\n"
-        md += f"| 发布日期 | {metadata['publish_date']} |\n"
-        md += f"| 文章链接 | [点击查看]({metadata['link']}) |\n"
+        yield "## 文章信息\n\n"
+        yield "| 项目 | 内容 |\n"
+        yield "|------|------|\n"
+        yield f"| 公众号名称 | {metadata['nickname']} |\n"
+        yield f"| 文章标题 | {metadata['title']} |\n"
+        yield f"| 发布时间 | {metadata['publish_time']} |\n"
+        yield f"| 发布日期 | {metadata['publish_date']} |\n"
+        yield f"| 文章链接 | [点击查看]({metadata['link']}) |\n"
         
         if 'biz' in metadata:
-            md += f"| 公众号ID | {metadata.get('biz', 'N/A')} |\n"
+            yield f"| 公众号ID | {metadata.get('biz', 'N/A')} |\n"
         if 'mid' in metadata:
-            md += f"| 文章MID | {metadata.get('mid', 'N/A')} |\n"
+            yield f"| 文章MID | {metadata.get('mid', 'N/A')} |\n"
         if 'sn' in metadata:
-            md += f"| 文章SN | {metadata.get('sn', 'N/A')} |\n"
+            yield f"| 文章SN | {metadata.get('sn', 'N/A')} |\n"
         if 'idx' in metadata:
-            md += f"| 文章索引 | {metadata.get('idx', 'N/A')} |\n"
+            yield f"| 文章索引 | {metadata.get('idx', 'N/A')} |\n"
         
-        md += f"| 内容长度 | {metadata.get('content_length', 0)} 字符 |\n"
-        md += f"| 图片数量 | {metadata.get('image_count', 0)} 张 |\n"
-        md += f"| 抓取时间 | {metadata['crawl_time']} |\n"
-        md += "\n"
+        yield f"| 内容长度 | {metadata.get('content_length', 0)} 字符 |\n"
+        yield f"| 图片数量 | {metadata.get('image_count', 0)} 张 |\n"
+        yield f"| 抓取时间 | {metadata['crawl_time']} |\n"
+        yield "\n"
         
         # 关键词分析
         if 'keyword_analysis' in metadata:
             analysis = metadata['keyword_analysis']
-            md += "## 关键词分析\n\n"
+            yield "## 关键词分析\n\n"
             
-            md += "### 统计信息\n"
-            md += f"- 总词数: {analysis['total_words']}\n"
-            md += f"- 独特词数: {analysis['unique_words']}\n\n"
+            yield "### 统计信息\n"
+            yield f"- 总词数: {analysis['total_words']}\n"
+            yield f"- 独特词数: {analysis['unique_words']}\n\n"
             
-            md += "### Top 10 关键词（按加权得分）\n\n"
-            md += "| 排名 | 关键词 | 得分 |\n"
-            md += "|------|--------|------|\n"
+            yield "### Top 10 关键词（按加权得分）\n\n"
+            yield "| 排名 | 关键词 | 得分 |\n"
+            yield "|------|--------|------|\n"
             for i, (word, score) in enumerate(list(analysis['keyword_scores'].items())[:10], 1):
-                md += f"| {i} | {word} | {score:.2f} |\n"
-            md += "\n"
+                yield f"| {i} | {word} | {score:.2f} |\n"
+            yield "\n"
             
-            md += "### Top 10 关键词（按出现次数）\n\n"
-            md += "| 排名 | 关键词 | 次数 |\n"
-            md += "|------|--------|------|\n"
+            yield "### Top 10 关键词（按出现次数）\n\n"
+            yield "| 排名 | 关键词 | 次数 |\n"
+            yield "|------|--------|------|\n"
             for i, (word, count) in enumerate(list(analysis['keyword_counts'].items())[:10], 1):
-                md += f"| {i} | {word} | {count} |\n"
-            md += "\n"
+                yield f"| {i} | {word} | {count} |\n"
+            yield "\n"
             
             if analysis.get('tfidf_keywords'):
-                md += "### TF-IDF 关键词\n\n"
-                md += "| 排名 | 关键词 | 权重 |\n"
-                md += "|------|--------|------|\n"
+                yield "### TF-IDF 关键词\n\n"
+                yield "| 排名 | 关键词 | 权重 |\n"
+                yield "|------|--------|------|\n"
                 for i, (word, weight) in enumerate(list(analysis['tfidf_keywords'].items())[:10], 1):
-                    md += f"| {i} | {word} | {weight:.4f} |\n"
-                md += "\n"
+                    yield f"| {i} | {word} | {weight:.4f} |\n"
+                yield "\n"
         
-        md += "---\n\n"
-        md += "## 文章内容\n\n"
-        md += markdown_content
+        yield "---\n\n"
+        yield "## 文章内容\n\n"
+        yield markdown_content
         
         # 评论区
-        md += "\n\n---\n\n"
-        md += "## 评论区\n\n"
+        yield "\n\n---\n\n"
+        yield "## 评论区\n\n"
         if metadata.get('comment_id'):
-            md += f"评论ID: {metadata['comment_id']}\n\n"
-            md += "注：微信公众号评论需要通过特殊接口获取完整内容。\n"
+            yield f"评论ID: {metadata['comment_id']}\n\n"
+            yield "注：微信公众号评论需要通过特殊接口获取完整内容。\n"
         else:
-            md += "暂无评论或评论已关闭\n"
-        
-        return md
+            yield "暂无评论或评论已关闭\n"
 
-    def read_urls_from_file(self, file_path='urls.txt'):
+    def read_urls_from_file(self, file_path='urls.txt', skip_processed=True):
         """从文本文件读取URL列表，自动去重并跳过已抓取的文章"""
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
@@ -596,17 +1393,20 @@ class WeChatArticleAdvancedCrawler:
         except FileNotFoundError:
             return []
         
-        # 去重
-        unique_urls = list(dict.fromkeys(all_urls))
+        # 按文章规范键去重：长短链接、带跟踪参数的链接视为同一篇
+        unique_urls = dedupe_article_urls(all_urls, self.article_index.resolve_key)
         if len(unique_urls) < len(all_urls):
             print(f"发现重复URL，已去重：{len(all_urls)} -> {len(unique_urls)}")
+
+        # 重新处理（如离线重跑）时保留全部URL，也不改写文件
+        if not skip_processed:
+            return unique_urls
         
         # 检查已抓取的文章
-        processed_urls = self.get_processed_urls()
         new_urls = []
         
         for url in unique_urls:
-            if url in processed_urls:
+            if url in self.article_index:
                 print(f"跳过已抓取: {url}")
             else:
                 new_urls.append(url)
@@ -621,74 +1421,115 @@ class WeChatArticleAdvancedCrawler:
         return new_urls
     
     def get_processed_urls(self):
-        """获取已经处理过的URL列表"""
-        processed_urls = set()
-        
-        # 检查每个子目录的metadata.json文件
-        if os.path.exists(self.output_dir):
-            for item in os.listdir(self.output_dir):
-                item_path = os.path.join(self.output_dir, item)
-                if os.path.isdir(item_path):
-                    # 查找metadata.json文件
-                    metadata_files = [f for f in os.listdir(item_path) if f.endswith('_metadata.json')]
-                    for metadata_file in metadata_files:
-                        metadata_path = os.path.join(item_path, metadata_file)
-                        try:
-                            with open(metadata_path, 'r', encoding='utf-8') as f:
-                                metadata = json.load(f)
-                                if 'url' in metadata:
-                                    processed_urls.add(metadata['url'])
-                        except:
-                            continue
-        
-        return processed_urls
+        """获取已经处理过的URL集合（来自持久化索引）"""
+        return self.article_index.urls()
+
+    def rebuild_article_index(self):
+        """遍历文章目录的元数据JSON重建索引，识别过的转载重新登记为别名，返回文章数"""
+        return self.article_index.rebuild(self.output_dir, self._corpus_metadata(),
+                                          self._recorded_duplicates())
     
-    def generate_summary_report(self, all_metadata):
-        """生成汇总报告"""
-        if not all_metadata:
-            return
-        
+    def rebuild_summary(self):
+        """读取全部文章元数据重新累计全库统计，返回文章数"""
+        return self.summary.rebuild(self._archive_records())
+
+    def generate_summary_report(self, all_metadata=None, page=1, page_size=100):
+        """
+        由全库累计统计生成汇总报告，不再只统计本次抓取的文章；
+        all_metadata 为本次抓取结果，仅用于显示本次数量。文章列表只输出第page页
+        """
         report_path = os.path.join(self.output_dir, 'summary_report.md')
-        
-        with open(report_path, 'w', encoding='utf-8') as f:
-            f.write("# 微信文章抓取汇总报告\n\n")
-            f.write(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            f.write(f"总计抓取文章数: {len(all_metadata)}\n\n")
-            
-            f.write("## 文章列表\n\n")
-            f.write("| 序号 | 公众号 | 标题 | 发布时间 | 词数 | 图片数 |\n")
-            f.write("|------|--------|------|----------|------|--------|\n")
-            
-            for i, meta in enumerate(all_metadata, 1):
-                f.write(f"| {i} | {meta['nickname']} | {meta['title'][:30]}{'...' if len(meta['title']) > 30 else ''} | ")
-                f.write(f"{meta['publish_time']} | {meta.get('content_length', 0)} | {meta.get('image_count', 0)} |\n")
-            
-            f.write("\n## 公众号统计\n\n")
-            nickname_counts = Counter(meta['nickname'] for meta in all_metadata)
-            f.write("| 公众号 | 文章数 |\n")
-            f.write("|--------|--------|\n")
-            for nickname, count in nickname_counts.most_common():
-                f.write(f"| {nickname} | {count} |\n")
-        
+        run_count = None if all_metadata is None else len(all_metadata)
+        write_text_atomic(report_path, self.summary.iter_report_sections(page, page_size, run_count))
         print(f"\n汇总报告已生成: {report_path}")
+        return report_path
 
 
 if __name__ == "__main__":
-    crawler = WeChatArticleAdvancedCrawler()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='微信公众号文章抓取')
+    parser.add_argument('urls_file', nargs='?', default='urls.txt', help='URL列表文件，每行一个URL')
+    parser.add_argument('--offline', action='store_true',
+                        help='只使用已缓存的HTML和图片重新处理文章，不访问网络')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='解析/分析/转换使用的进程数，0 表示在线程中处理')
+    parser.add_argument('--storage', choices=['files', 'corpus'], default='files',
+                        help='files: 每篇文章一个目录；corpus: 追加到压缩分段语料库')
+    parser.add_argument('--rebuild-summary', action='store_true',
+                        help='读取全部文章元数据重建全库汇总统计和报告后退出')
+    parser.add_argument('--summary-page', type=int, default=1,
+                        help='汇总报告中输出的文章列表页码 (每页100篇，最新在前)')
+    parser.add_argument('--rebuild-search', action='store_true',
+                        help='对全部文章重新分词并重建全文检索索引后退出')
+    parser.add_argument('--rebuild-idf', action='store_true',
+                        help='对全部文章重新分词并重新统计TF-IDF使用的文档频率后退出')
+    parser.add_argument('--rebuild-duplicates', action='store_true',
+                        help='重新计算全部文章的正文指纹（转载检测）后退出')
+    parser.add_argument('--search', metavar='QUERY',
+                        help='在已抓取的文章中检索并输出前10条结果后退出')
+    parser.add_argument('--rebuild-index', action='store_true',
+                        help='从现有文章目录重建已处理文章索引后退出')
+    args = parser.parse_args()
+
+    crawler = WeChatArticleAdvancedCrawler(offline=args.offline, storage=args.storage)
+
+    if args.rebuild_index:
+        print(f"已重建文章索引: {crawler.rebuild_article_index()} 篇")
+        exit()
+
+    if args.rebuild_search:
+        print(f"已重建检索索引: {crawler.rebuild_search_index()} 篇")
+        exit()
+
+    if args.rebuild_idf:
+        print(f"已重新统计文档频率: {crawler.rebuild_corpus_idf()} 篇")
+        exit()
+
+    if args.rebuild_duplicates:
+        print(f"已重新计算正文指纹: {crawler.rebuild_near_duplicates()} 篇")
+        exit()
+
+    if args.search:
+        found = crawler.search(args.search)
+        print(f"共 {found['total']} 篇，耗时 {found['elapsed_ms']} ms")
+        for rank, item in enumerate(found['results'], 1):
+            print(f"{rank}. [{item['score']:.2f}] {item['nickname']} | {item['title']} | {item['url']}")
+        exit()
+
+    if args.rebuild_summary:
+        print(f"已重建汇总统计: {crawler.rebuild_summary()} 篇")
+        crawler.generate_summary_report(page=args.summary_page)
+        exit()
     
+    crawler.prepare_text_indexes()
+
     try:
-        article_urls = crawler.read_urls_from_file('urls.txt')
+        article_urls = crawler.read_urls_from_file(args.urls_file, skip_processed=not args.offline)
         print(f"从文件读取到 {len(article_urls)} 个URL")
     except FileNotFoundError:
         print("未找到urls.txt文件，请创建该文件并每行放入一个URL")
         exit()
     
-    all_metadata = []
-    for url in article_urls:
-        metadata = crawler.process_article(url)
-        if metadata:
-            all_metadata.append(metadata)
-        time.sleep(2)  # 添加延迟避免被封
+    # 多篇文章并行抓取，由按主机的令牌桶控制请求速率
+    if args.workers > 0:
+        from crawl_pipeline import PipelineCrawlEngine
+        engine = PipelineCrawlEngine(crawler, fetch_workers=4, cpu_workers=args.workers)
+        try:
+            all_metadata = [metadata for _, metadata in engine.crawl(article_urls) if metadata]
+        finally:
+            engine.close()
+    else:
+        from crawl_engine import AsyncCrawlEngine
+        engine = AsyncCrawlEngine(crawler, concurrency=4)
+        all_metadata = [metadata for _, metadata in engine.crawl(article_urls) if metadata]
+
+    if crawler.html_cache is not None:
+        cache_stats = crawler.html_cache.get_stats()
+        print(f"\nHTML缓存: 命中 {cache_stats['hits']} 次, 未命中 {cache_stats['misses']} 次")
+
+    for host, stats in crawler.adaptive_limits.get_stats().items():
+        print(f"{host}: 并发上限 {stats['limit']}, 正常 {stats['ok']} 次, 受限 {stats['throttled']} 次")
     
     # 生成汇总报告
-    crawler.generate_summary_report(all_metadata)
\ No newline at end of file
+    crawler.generate_summary_report(all_metadata, page=args.summary_page)
\ No newline at end of file